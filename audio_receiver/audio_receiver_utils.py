@@ -1,12 +1,121 @@
 import os
+import tempfile
+import time
+from typing import NamedTuple, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
 from dotenv import load_dotenv
 from yandex_music import ClientAsync, Track
 
+from cache import TTLCache
+from disk_cache import DiskCache, hit_ratio
+from frequency import FrequencySketch
+from limits import EndpointLimits, TokenBucket, UpstreamLimiter
+from metrics import Counter, Gauge
+from mp3_index import Mp3Index, build_index, id3v2_size
+from single_flight import SharedDownload, SingleFlight
+
 load_dotenv()
 YANDEX_MUSIC_TOKEN = os.getenv('YANDEX_MUSIC_API_TOKEN')
 if not YANDEX_MUSIC_TOKEN:
     raise ValueError("Не найден YANDEX_MUSIC_API_TOKEN в .env файле")
+# Кэш ответов поиска: время жизни и число запросов (0 — без кэша)
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv('SEARCH_CACHE_TTL_SECONDS', '600'))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '2000'))
+# Кэш объектов треков (метаданные для /info, /cover и /stream)
+TRACK_CACHE_TTL_SECONDS = float(os.getenv('TRACK_CACHE_TTL_SECONDS', '1800'))
+TRACK_CACHE_MAX_ENTRIES = int(os.getenv('TRACK_CACHE_MAX_ENTRIES', '5000'))
+# Пул соединений для скачивания аудио по прямым ссылкам и размер куска при проксировании
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv('UPSTREAM_MAX_CONNECTIONS', '20'))
+UPSTREAM_TIMEOUT_SECONDS = float(os.getenv('UPSTREAM_TIMEOUT_SECONDS', '30'))
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', str(64 * 1024)))
+# Кэш download info и прямых ссылок: ссылка живет DIRECT_LINK_TTL_SECONDS (или до срока
+# из самой ссылки) минус запас, download info — как объект трека
+DIRECT_LINK_TTL_SECONDS = float(os.getenv('DIRECT_LINK_TTL_SECONDS', '300'))
+DIRECT_LINK_EXPIRY_MARGIN_SECONDS = float(os.getenv('DIRECT_LINK_EXPIRY_MARGIN_SECONDS', '30'))
+# Политики выбора варианта файла (параметр quality у /stream): best — наибольший
+# битрейт, circle — наименьший битрейт не ниже CIRCLE_TARGET_KBPS среди CIRCLE_CODECS
+# (кружок все равно перекодируется в AAC и длится не больше минуты)
+QUALITY_POLICIES = ("best", "circle")
+DEFAULT_QUALITY = os.getenv('DEFAULT_QUALITY', 'best')
+if DEFAULT_QUALITY not in QUALITY_POLICIES:
+    raise ValueError(f"DEFAULT_QUALITY={DEFAULT_QUALITY!r}, допустимые значения: {', '.join(QUALITY_POLICIES)}")
+CIRCLE_TARGET_KBPS = int(os.getenv('CIRCLE_TARGET_KBPS', '128'))
+CIRCLE_CODECS = tuple(codec.strip() for codec in os.getenv('CIRCLE_CODECS', 'mp3,aac').split(','))
+AUDIO_MEDIA_TYPES = {"mp3": "audio/mpeg", "aac": "audio/aac"}
+# Сколько байт начала файла читается для индекса времени -> смещения
+INDEX_HEAD_BYTES = int(os.getenv('INDEX_HEAD_BYTES', str(16 * 1024)))
+# Дисковый кэш аудио и обложек: каталог и бюджеты в байтах (0 — без кэша)
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'audio_receiver_cache'))
+AUDIO_CACHE_MAX_BYTES = int(os.getenv('AUDIO_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+COVER_CACHE_MAX_BYTES = int(os.getenv('COVER_CACHE_MAX_BYTES', str(100 * 1024 ** 2)))
+# Счетчиков в строке частотного фильтра допуска в кэш аудио (0 — чистый LRU);
+# нужно в несколько раз больше, чем различных треков в кэше
+AUDIO_CACHE_SKETCH_WIDTH = int(os.getenv('AUDIO_CACHE_SKETCH_WIDTH', '4096'))
+# Как часто (в секундах) индексы дисковых кэшей сохраняются на диск
+CACHE_INDEX_SAVE_INTERVAL_SECONDS = float(os.getenv('CACHE_INDEX_SAVE_INTERVAL_SECONDS', '30'))
+# Допуск запросов к Яндекс Музыке и CDN: общая частота (токенов в секунду и запас),
+# для каждого класса эндпоинтов — одновременных запросов и бюджет ожидания (секунды),
+# после которого отвечается 503. Поток приоритетнее метаданных, метаданные — поиска:
+# метаданные не трогают последние UPSTREAM_PRIORITY_RESERVE токенов, поиск — вдвое больше
+UPSTREAM_RATE_PER_SECOND = float(os.getenv('UPSTREAM_RATE_PER_SECOND', '20'))
+UPSTREAM_BURST = float(os.getenv('UPSTREAM_BURST', '40'))
+UPSTREAM_PRIORITY_RESERVE = float(os.getenv('UPSTREAM_PRIORITY_RESERVE', '10'))
+STREAM_CONCURRENCY = int(os.getenv('STREAM_CONCURRENCY', '16'))
+STREAM_WAIT_BUDGET_SECONDS = float(os.getenv('STREAM_WAIT_BUDGET_SECONDS', '2'))
+META_CONCURRENCY = int(os.getenv('META_CONCURRENCY', '8'))
+META_WAIT_BUDGET_SECONDS = float(os.getenv('META_WAIT_BUDGET_SECONDS', '1'))
+SEARCH_CONCURRENCY = int(os.getenv('SEARCH_CONCURRENCY', '4'))
+SEARCH_WAIT_BUDGET_SECONDS = float(os.getenv('SEARCH_WAIT_BUDGET_SECONDS', '0.5'))
 client = None
+http_client: Optional[httpx.AsyncClient] = None
+search_cache = TTLCache("search", SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL_SECONDS)
+track_cache = TTLCache("track", TRACK_CACHE_MAX_ENTRIES, TRACK_CACHE_TTL_SECONDS)
+# Индекс файла не меняется, пока жив трек, поэтому живет столько же
+index_cache = TTLCache("mp3_index", TRACK_CACHE_MAX_ENTRIES, TRACK_CACHE_TTL_SECONDS)
+download_info_cache = TTLCache("download_info", TRACK_CACHE_MAX_ENTRIES, TRACK_CACHE_TTL_SECONDS)
+direct_link_cache = TTLCache("direct_link", TRACK_CACHE_MAX_ENTRIES, DIRECT_LINK_TTL_SECONDS)
+audio_cache = DiskCache(
+    "audio",
+    os.path.join(CACHE_DIR, "audio"),
+    AUDIO_CACHE_MAX_BYTES,
+    sketch=FrequencySketch(AUDIO_CACHE_SKETCH_WIDTH) if AUDIO_CACHE_SKETCH_WIDTH > 0 else None
+)
+cover_cache = DiskCache("cover", os.path.join(CACHE_DIR, "covers"), COVER_CACHE_MAX_BYTES)
+# Одновременные промахи кэшей по одному ключу делят один запрос к источнику
+metadata_flights = SingleFlight("metadata")
+cover_flights = SingleFlight("cover")
+# Аудио, которое сейчас пишется в дисковый кэш, по ключу кэша
+audio_downloads: dict[str, SharedDownload] = {}
+
+
+def create_upstream_limiter() -> UpstreamLimiter:
+    return UpstreamLimiter(
+        TokenBucket(UPSTREAM_RATE_PER_SECOND, UPSTREAM_BURST),
+        {
+            "stream": EndpointLimits(STREAM_CONCURRENCY, STREAM_WAIT_BUDGET_SECONDS, 0),
+            "meta": EndpointLimits(META_CONCURRENCY, META_WAIT_BUDGET_SECONDS, UPSTREAM_PRIORITY_RESERVE),
+            "search": EndpointLimits(SEARCH_CONCURRENCY, SEARCH_WAIT_BUDGET_SECONDS, 2 * UPSTREAM_PRIORITY_RESERVE),
+        }
+    )
+
+
+upstream_limiter = create_upstream_limiter()
+
+stream_bytes = Counter(
+    "audio_receiver_stream_bytes_total", "Байт аудио, отданных /stream, по политике качества и источнику"
+)
+round_trips_avoided = Counter(
+    "audio_receiver_upstream_round_trips_avoided_total",
+    "Запросы к Яндекс Музыке, которых не понадобилось благодаря кэшу ссылок"
+)
+Gauge("audio_receiver_audio_cache_hit_ratio", "Доля попаданий дискового кэша аудио",
+      function=lambda: hit_ratio("audio"))
+Gauge("audio_receiver_cover_cache_hit_ratio", "Доля попаданий дискового кэша обложек",
+      function=lambda: hit_ratio("cover"))
+Gauge("audio_receiver_audio_cache_bytes", "Занято дисковым кэшем аудио, байт",
+      function=lambda: audio_cache.total_bytes)
 
 
 async def init_client():
@@ -14,25 +123,344 @@ async def init_client():
     client = await ClientAsync(YANDEX_MUSIC_TOKEN).init()
 
 
+async def init_http_client(transport: Optional[httpx.AsyncBaseTransport] = None):
+    """
+    Создает общий HTTP-клиент для прямых ссылок на аудио.
+
+    Args:
+        transport: Транспорт httpx (для тестов).
+    """
+    global http_client
+    http_client = httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(UPSTREAM_TIMEOUT_SECONDS, connect=10),
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_CONNECTIONS
+        ),
+        follow_redirects=True
+    )
+
+
+async def close_http_client():
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+
 async def find_tracks_by_name(search_query: str):
-    found_tracks = await client.search(search_query, type_='track')
-    return found_tracks.tracks.results if found_tracks.tracks is not None else None
+    async with upstream_limiter.slot("search"):
+        found_tracks = await client.search(search_query, type_='track')
+    if found_tracks.tracks is None:
+        return None
+    # Найденные треки почти всегда запрашиваются следующими (/info, /cover, /stream)
+    for track in found_tracks.tracks.results:
+        track_cache.set(str(track.id), track)
+    return found_tracks.tracks.results
 
 
-async def get_track_info(track_id: int | str):
-    tracks = await client.tracks(track_id)
+async def _fetch_track_info(track_id: int | str):
+    async with upstream_limiter.slot("meta"):
+        tracks = await client.tracks(track_id)
+    track_cache.set(str(track_id), tracks[0])
     return tracks[0]
 
 
+async def get_track_info(track_id: int | str):
+    track = track_cache.get(str(track_id))
+    if track is not None:
+        return track
+    return await metadata_flights.run(("track", str(track_id)), lambda: _fetch_track_info(track_id))
+
+
 async def get_track_cover(track: Track):
-    cover = await track.download_cover_bytes_async(size='200x200')
+    async with upstream_limiter.slot("meta"):
+        cover = await track.download_cover_bytes_async(size='200x200')
     return cover
 
 
-async def get_track_bytes(track: Track):
-    download_info_list = await track.get_download_info_async()
+def direct_link_ttl(direct_link: str) -> float:
+    """
+    Сколько хранить прямую ссылку: до срока из параметра expires/exp
+    ссылки (unix-время), но не дольше DIRECT_LINK_TTL_SECONDS, с запасом
+    DIRECT_LINK_EXPIRY_MARGIN_SECONDS.
+
+    Args:
+        direct_link: Прямая ссылка.
+
+    Returns:
+        float: Время жизни записи в секундах (0 — не кэшировать).
+    """
+    ttl = DIRECT_LINK_TTL_SECONDS
+    query = parse_qs(urlsplit(direct_link).query)
+    for name in ("expires", "exp"):
+        value = query.get(name, [""])[0]
+        if value.isdigit():
+            ttl = min(ttl, int(value) - time.time())
+            break
+    return max(ttl - DIRECT_LINK_EXPIRY_MARGIN_SECONDS, 0.0)
+
+
+class TrackLink(NamedTuple):
+    """Прямая ссылка на выбранный вариант файла трека."""
+    url: str
+    codec: str
+    bitrate: int
+
+
+def _link_key(track: Track, download_info) -> tuple:
+    return str(track.id), download_info.codec, download_info.bitrate_in_kbps
+
+
+def select_download_info(download_info_list: list, quality: str):
+    """
+    Выбирает вариант файла по политике качества.
+
+    Args:
+        download_info_list: Варианты из get_download_info_async.
+        quality: Политика из QUALITY_POLICIES.
+
+    Returns:
+        DownloadInfo: Выбранный вариант.
+    """
+    if quality == "circle":
+        preferred = [info for info in download_info_list if info.codec in CIRCLE_CODECS] or download_info_list
+        enough = [info for info in preferred if info.bitrate_in_kbps >= CIRCLE_TARGET_KBPS]
+        if enough:
+            return min(enough, key=lambda info: (
+                info.bitrate_in_kbps,
+                CIRCLE_CODECS.index(info.codec) if info.codec in CIRCLE_CODECS else len(CIRCLE_CODECS)
+            ))
+        return max(preferred, key=lambda info: info.bitrate_in_kbps)
+    return max(download_info_list, key=lambda info: (info.bitrate_in_kbps, info.codec == "mp3"))
+
+
+async def _fetch_download_info(track: Track):
+    async with upstream_limiter.slot("stream"):
+        return await track.get_download_info_async()
+
+
+async def _fetch_direct_link(download_info) -> Optional[str]:
+    async with upstream_limiter.slot("stream"):
+        return await download_info.get_direct_link_async()
+
+
+async def get_track_link(track: Track, quality: str = DEFAULT_QUALITY) -> Optional[TrackLink]:
+    """
+    Прямая ссылка на вариант файла трека, выбранный политикой качества.
+    Download info и ссылка кэшируются, пока ссылка не истекает.
+
+    Args:
+        track: Трек.
+        quality: Политика из QUALITY_POLICIES.
+
+    Returns:
+        Optional[TrackLink]: Ссылка или None, если трек недоступен для скачивания.
+    """
+    download_info_list = download_info_cache.get(str(track.id))
     if download_info_list is None:
+        download_info_list = await metadata_flights.run(
+            ("download_info", str(track.id)), lambda: _fetch_download_info(track)
+        )
+        if not download_info_list:
+            return None
+        download_info_cache.set(str(track.id), download_info_list)
+    else:
+        round_trips_avoided.inc(call="download_info")
+
+    download_info = select_download_info(download_info_list, quality)
+    key = _link_key(track, download_info)
+    direct_link = direct_link_cache.get(key)
+    if direct_link is not None:
+        round_trips_avoided.inc(call="direct_link")
+    else:
+        direct_link = await metadata_flights.run(("direct_link",) + key, lambda: _fetch_direct_link(download_info))
+        if not direct_link:
+            return None
+        direct_link_cache.set(key, direct_link, ttl=direct_link_ttl(direct_link))
+    return TrackLink(direct_link, download_info.codec, download_info.bitrate_in_kbps)
+
+
+def invalidate_direct_link(track: Track) -> None:
+    """Забывает download info и ссылки трека (CDN ответил 403/410)."""
+    download_info_list = download_info_cache.get(str(track.id))
+    download_info_cache.pop(str(track.id))
+    for download_info in download_info_list or []:
+        direct_link_cache.pop(_link_key(track, download_info))
+
+
+async def open_track_stream(direct_link: str, byte_range: Optional[str] = None) -> httpx.Response:
+    """
+    Открывает потоковый запрос к прямой ссылке: тело не читается, его
+    нужно отдать по кускам и закрыть ответ (aclose).
+
+    Args:
+        direct_link: Прямая ссылка на аудиофайл.
+        byte_range: Значение заголовка Range (если нужен фрагмент).
+
+    Returns:
+        httpx.Response: Ответ с непрочитанным телом.
+
+    Raises:
+        httpx.HTTPError: Ошибка соединения или неуспешный статус.
+        Overloaded: Не получено разрешение на запрос к источнику.
+    """
+    headers = {"Range": byte_range} if byte_range else None
+    request = http_client.build_request("GET", direct_link, headers=headers)
+    # Разрешение нужно на открытие запроса; тело читается уже без него
+    async with upstream_limiter.slot("stream"):
+        response = await http_client.send(request, stream=True)
+    if response.is_error:
+        await response.aclose()
+        response.raise_for_status()
+    return response
+
+
+def parse_byte_range(value: str, total: int) -> Optional[tuple[int, int]]:
+    """
+    Разбирает заголовок Range с одним диапазоном: "bytes=a-b", "bytes=a-"
+    или "bytes=-n" (последние n байт).
+
+    Args:
+        value: Значение заголовка Range.
+        total: Размер файла.
+
+    Returns:
+        Optional[tuple[int, int]]: Первый и последний байт (включительно)
+            или None, если диапазон не разобран.
+
+    Raises:
+        ValueError: Диапазон вне файла.
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    if not (first.isdigit() or last.isdigit()):
+        return None
+    if not first:
+        start, end = max(total - int(last), 0), total - 1
+    else:
+        start = int(first)
+        end = min(int(last), total - 1) if last.isdigit() else total - 1
+    if start >= total or start > end:
+        raise ValueError(f"Диапазон {value} вне файла размером {total}")
+    return start, end
+
+
+def content_total(response: httpx.Response) -> Optional[int]:
+    """
+    Полный размер файла по ответу: из Content-Range для 206,
+    иначе из Content-Length.
+    """
+    content_range = response.headers.get("content-range", "")
+    if response.status_code == 206 and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    content_length = response.headers.get("content-length")
+    return int(content_length) if content_length and content_length.isdigit() else None
+
+
+async def open_track_audio(
+    track: Track,
+    byte_range: Optional[str] = None,
+    quality: str = DEFAULT_QUALITY
+) -> Optional[tuple[TrackLink, httpx.Response]]:
+    """
+    Открывает поток аудио трека по (кэшированной) прямой ссылке. Если CDN
+    отвечает 403/410 — ссылка истекла раньше срока, — она забывается
+    и запрашивается заново (один раз).
+
+    Args:
+        track: Трек.
+        byte_range: Значение заголовка Range.
+        quality: Политика качества.
+
+    Returns:
+        Optional[tuple[TrackLink, httpx.Response]]: Выбранный вариант и ответ
+            с непрочитанным телом или None, если трек недоступен для скачивания.
+    """
+    link = await get_track_link(track, quality)
+    if link is None:
+        return None
+    try:
+        return link, await open_track_stream(link.url, byte_range)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code not in (403, 410):
+            raise
+    invalidate_direct_link(track)
+    link = await get_track_link(track, quality)
+    if link is None:
+        return None
+    return link, await open_track_stream(link.url, byte_range)
+
+
+async def read_track_bytes(
+    track: Track,
+    start: int,
+    length: int,
+    quality: str = DEFAULT_QUALITY
+) -> tuple[bytes, Optional[int]]:
+    """
+    Читает фрагмент файла по прямой ссылке. Если источник не поддерживает
+    Range, лишнее начало пропускается, а чтение обрывается после нужных байт.
+
+    Args:
+        track: Трек.
+        start: Смещение начала фрагмента.
+        length: Длина фрагмента.
+        quality: Политика качества.
+
+    Returns:
+        tuple[bytes, Optional[int]]: Фрагмент и полный размер файла.
+    """
+    opened = await open_track_audio(track, f"bytes={start}-{start + length - 1}", quality)
+    if opened is None:
+        return b"", None
+    _, response = opened
+    try:
+        total = content_total(response)
+        skip = 0 if response.status_code == 206 else start
+        data = bytearray()
+        async for chunk in response.aiter_bytes():
+            if skip:
+                dropped = min(skip, len(chunk))
+                chunk, skip = chunk[dropped:], skip - dropped
+            data += chunk
+            if len(data) >= length:
+                break
+        return bytes(data[:length]), total
+    finally:
+        await response.aclose()
+
+
+async def get_track_index(track: Track, quality: str = DEFAULT_QUALITY) -> Optional[Mp3Index]:
+    """
+    Индекс времени -> смещения для MP3 трека (по началу файла: ID3v2,
+    первый кадр, заголовок Xing/Info). Кэшируется по треку и политике.
+
+    Args:
+        track: Трек.
+        quality: Политика качества (индекс строится для выбранного варианта).
+
+    Returns:
+        Optional[Mp3Index]: Индекс или None, если это не MP3.
+    """
+    key = (str(track.id), quality)
+    index = index_cache.get(key)
+    if index is not None:
+        return index
+
+    head, total = await read_track_bytes(track, 0, INDEX_HEAD_BYTES, quality)
+    if total is None:
         return None
-    download_info = download_info_list[0]
-    track_source = await track.download_bytes_async(download_info.codec, download_info.bitrate_in_kbps)
-    return track_source
+    data_offset = id3v2_size(head)
+    data = head[data_offset:]
+    if data_offset and len(data) < INDEX_HEAD_BYTES // 2:
+        # Большой тег ID3v2 (например, с обложкой): дочитываем начало аудио
+        data, _ = await read_track_bytes(track, data_offset, INDEX_HEAD_BYTES, quality)
+    index = build_index(data, data_offset, total, (track.duration_ms or 0) / 1000)
+    if index is not None:
+        index_cache.set(key, index)
+    return index
@@ -0,0 +1,94 @@
+"""
+Доля попаданий дискового кэша аудио: чистый LRU против LRU с допуском
+по частоте (TinyLFU, frequency.FrequencySketch).
+
+Синтетическая трасса запросов: каталог треков, популярность которых
+распределена по Ципфу, а размеры — как у MP3 3–5 минут. Трасса
+проигрывается через настоящий DiskCache (файлы пишутся во временный
+каталог, размеры уменьшены в 1000 раз), для каждой политики печатаются
+доля попаданий по запросам и по байтам и число записей файлов в кэш.
+
+Запуск из каталога audio_receiver:
+    python -m benchmarks.cache_admission [--requests 50000] [--catalog 20000] [--zipf 0.9]
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from disk_cache import DiskCache  # noqa: E402
+from frequency import FrequencySketch  # noqa: E402
+
+# Размеры файлов уменьшены в 1000 раз: килобайты вместо мегабайт
+SCALE = 1000
+
+
+def build_trace(requests: int, catalog: int, exponent: float, seed: int = 0) -> tuple[list[int], list[int]]:
+    """
+    Трасса запросов и размеры треков.
+
+    Returns:
+        tuple[list[int], list[int]]: Номера треков по порядку запросов
+            и размер каждого трека в байтах (уменьшенный).
+    """
+    rng = random.Random(seed)
+    cumulative = list(itertools.accumulate(1.0 / rank ** exponent for rank in range(1, catalog + 1)))
+    # Номера популярности перемешаны, чтобы ключи не шли по порядку
+    by_rank = list(range(catalog))
+    rng.shuffle(by_rank)
+    ranks = rng.choices(range(catalog), cum_weights=cumulative, k=requests)
+    sizes = [int(rng.uniform(180, 300) * 320 / 8 * 1000 / SCALE) for _ in range(catalog)]
+    return [by_rank[rank] for rank in ranks], sizes
+
+
+def replay(trace: list[int], sizes: list[int], max_bytes: int, sketch_width: int) -> tuple[float, float, int]:
+    """
+    Проигрывает трассу через DiskCache.
+
+    Returns:
+        tuple[float, float, int]: Доля попаданий по запросам, по байтам
+            и число записей файлов в кэш.
+    """
+    hits = hit_bytes = total_bytes = writes = 0
+    with tempfile.TemporaryDirectory() as directory:
+        sketch = FrequencySketch(sketch_width) if sketch_width else None
+        cache = DiskCache("benchmark", directory, max_bytes, sketch=sketch)
+        for track in trace:
+            key, size = str(track), sizes[track]
+            total_bytes += size
+            if cache.get(key) is not None:
+                hits += 1
+                hit_bytes += size
+            elif cache.admits(key, size):
+                cache.put_bytes(key, bytes(size))
+                writes += 1
+    return hits / len(trace), hit_bytes / total_bytes, writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--catalog", type=int, default=20000, help="различных треков")
+    parser.add_argument("--zipf", type=float, default=0.9, help="показатель распределения Ципфа")
+    parser.add_argument("--cache-tracks", type=int, default=250, help="бюджет кэша в средних треках")
+    parser.add_argument("--sketch-width", type=int, default=4096)
+    args = parser.parse_args()
+
+    trace, sizes = build_trace(args.requests, args.catalog, args.zipf)
+    max_bytes = int(args.cache_tracks * sum(sizes) / len(sizes))
+    print(
+        f"Запросов {args.requests}, треков {args.catalog}, Ципф {args.zipf:g}, "
+        f"кэш ~{args.cache_tracks} треков ({max_bytes * SCALE / 1024 ** 3:.1f} ГБ в реальном масштабе)"
+    )
+    print(f"{'политика':<10} {'по запросам':>12} {'по байтам':>10} {'записей':>9}")
+    for name, width in (("LRU", 0), ("TinyLFU", args.sketch_width)):
+        request_ratio, byte_ratio, writes = replay(trace, sizes, max_bytes, width)
+        print(f"{name:<10} {request_ratio:>12.1%} {byte_ratio:>10.1%} {writes:>9}")
+
+
+if __name__ == "__main__":
+    main()
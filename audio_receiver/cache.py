@@ -0,0 +1,98 @@
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from metrics import Counter
+
+cache_requests = Counter("audio_receiver_cache_requests_total", "Обращения к кэшам (hit/miss)")
+cache_evictions = Counter("audio_receiver_cache_evictions_total", "Вытеснения из кэшей (expired/lru)")
+
+_MISSING = object()
+
+# Кириллица -> латиница: запросы, набранные в другой раскладке письма
+# ("виикенд" и "viikend"), дают один ключ
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh",
+    "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "ts",
+    "ч": "ch", "ш": "sh", "щ": "sch", "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu",
+    "я": "ya",
+})
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class TTLCache:
+    """
+    Кэш с ограничением числа записей (вытесняется давно не использованная)
+    и временем жизни записи. Вызывается только из event loop, поэтому
+    обходится без блокировок.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Значение по ключу или default, если записи нет или она устарела.
+        """
+        entry = self._entries.get(key, _MISSING)
+        if entry is not _MISSING and entry[0] <= self._clock():
+            del self._entries[key]
+            cache_evictions.inc(cache=self.name, reason="expired")
+            entry = _MISSING
+        if entry is _MISSING:
+            cache_requests.inc(cache=self.name, result="miss")
+            return default
+        self._entries.move_to_end(key)
+        cache_requests.inc(cache=self.name, result="hit")
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Сохраняет значение.
+
+        Args:
+            key: Ключ.
+            value: Значение.
+            ttl: Время жизни в секундах (по умолчанию — общее для кэша).
+        """
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (self._clock() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            cache_evictions.inc(cache=self.name, reason="lru")
+
+    def pop(self, key: Hashable) -> None:
+        """Удаляет запись, если она есть."""
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Ключ поискового запроса: регистр, знаки препинания, повторные пробелы
+    и письменность (кириллица транслитерируется) не влияют на ключ.
+
+    Args:
+        query: Запрос пользователя.
+
+    Returns:
+        str: Нормализованный запрос.
+    """
+    query = unicodedata.normalize("NFKC", query).casefold().translate(_TRANSLIT)
+    query = _PUNCTUATION.sub(" ", query)
+    return _WHITESPACE.sub(" ", query).strip()
@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from threading import get_ident
+from typing import Optional
+
+from cache import cache_evictions, cache_requests
+from frequency import FrequencySketch
+from metrics import Counter
+
+INDEX_FILE_NAME = "index.json"
+
+cache_bytes_saved = Counter(
+    "audio_receiver_cache_bytes_saved_total", "Байт, отданных из дискового кэша вместо скачивания"
+)
+cache_admissions = Counter(
+    "audio_receiver_cache_admissions_total", "Решения о допуске файлов в дисковый кэш (admitted/rejected)"
+)
+
+
+def hit_ratio(name: str) -> float:
+    """Доля попаданий кэша name с момента запуска."""
+    hits = cache_requests.value(cache=name, result="hit")
+    misses = cache_requests.value(cache=name, result="miss")
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+class CacheWriter:
+    """
+    Запись файла в кэш по частям: пишется во временный файл, который
+    появляется в кэше только после commit (атомарным переименованием).
+    """
+
+    def __init__(self, cache: "DiskCache", key: str):
+        self.cache = cache
+        self.key = key
+        self.path = os.path.join(cache.directory, f".{cache.file_name(key)}.{os.getpid()}.{get_ident()}.tmp")
+        self.size = 0
+        self._file = open(self.path, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        # Недописанный файл читают другие запросы того же трека (SharedDownload)
+        self._file.flush()
+        self.size += len(chunk)
+
+    def commit(self, expected_size: Optional[int] = None) -> bool:
+        """
+        Публикует файл в кэше.
+
+        Args:
+            expected_size: Ожидаемый размер; при несовпадении (оборванная
+                загрузка) файл отбрасывается.
+
+        Returns:
+            bool: True, если файл попал в кэш (скачан полностью и допущен).
+        """
+        self._file.close()
+        if expected_size is not None and self.size != expected_size:
+            self.abort()
+            return False
+        return self.cache._publish(self.key, self.path, self.size)
+
+    def abort(self) -> None:
+        """Отбрасывает недописанный файл."""
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class DiskCache:
+    """
+    Кэш файлов на диске с бюджетом в байтах: при превышении удаляются
+    давно не использованные файлы. Если задан sketch (TinyLFU), новый
+    файл, которому не хватает места, допускается, только если его оценка
+    частоты обращений выше, чем у каждого из вытесняемых, — иначе разовые
+    запросы редких треков вымывали бы популярные. Индекс (ключи, размеры и порядок
+    использования) хранится в index.json и переживает перезапуск: он
+    сохраняется не на каждую запись, а периодически (flush_index, в потоке)
+    и при остановке. Каталог читается при первом обращении. Вызывается
+    только из event loop, поэтому обходится без блокировок.
+    """
+
+    def __init__(self, name: str, directory: str, max_bytes: int, sketch: Optional[FrequencySketch] = None):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.sketch = sketch
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._loaded = False
+        self._index_dirty = False
+
+    @staticmethod
+    def file_name(key: str) -> str:
+        return hashlib.sha1(key.encode("utf8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, self.file_name(key))
+
+    def _load(self) -> None:
+        """
+        Читает индекс и сверяет его с каталогом: записи без файлов
+        забываются, файлы без записей (и недописанные .tmp) удаляются.
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE_NAME), encoding="utf8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = []
+
+        for key, size in saved:
+            path = self._path(key)
+            if os.path.isfile(path) and os.path.getsize(path) == size:
+                self._entries[key] = size
+                self.total_bytes += size
+        known = {self.file_name(key) for key in self._entries} | {INDEX_FILE_NAME}
+        for file_name in os.listdir(self.directory):
+            if file_name not in known:
+                os.remove(os.path.join(self.directory, file_name))
+        self._evict()
+
+    def _write_index(self, entries: list) -> None:
+        """Атомарно записывает индекс (от давно использованных к недавним)."""
+        index_path = os.path.join(self.directory, INDEX_FILE_NAME)
+        tmp_path = f"{index_path}.{os.getpid()}.{get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, index_path)
+
+    def save_index(self) -> None:
+        """Записывает индекс сразу (при остановке)."""
+        if not self._loaded:
+            return
+        self._index_dirty = False
+        self._write_index(list(self._entries.items()))
+
+    async def flush_index(self) -> None:
+        """Записывает индекс в потоке, если с прошлой записи в кэше появились файлы."""
+        if not self._loaded or not self._index_dirty:
+            return
+        self._index_dirty = False
+        try:
+            await asyncio.to_thread(self._write_index, list(self._entries.items()))
+        except OSError:
+            self._index_dirty = True
+            raise
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Путь к файлу по ключу или None.
+
+        Args:
+            key: Ключ.
+
+        Returns:
+            Optional[str]: Путь к файлу в кэше.
+        """
+        self._load()
+        if self.sketch is not None:
+            self.sketch.increment(key)
+        size = self._entries.get(key)
+        if size is not None and not os.path.exists(self._path(key)):
+            # Файл удалили снаружи
+            self._forget(key)
+            size = None
+        if size is None:
+            cache_requests.inc(cache=self.name, result="miss")
+            return None
+        self._entries.move_to_end(key)
+        cache_requests.inc(cache=self.name, result="hit")
+        return self._path(key)
+
+    def size(self, key: str) -> Optional[int]:
+        return self._entries.get(key)
+
+    def record_saved(self, saved_bytes: int) -> None:
+        """Учитывает байты, отданные из кэша вместо скачивания."""
+        cache_bytes_saved.inc(saved_bytes, cache=self.name)
+
+    def writer(self, key: str) -> Optional[CacheWriter]:
+        """Запись файла по частям (None, если кэш выключен)."""
+        if self.max_bytes <= 0:
+            return None
+        self._load()
+        return CacheWriter(self, key)
+
+    def put_bytes(self, key: str, data: bytes) -> None:
+        """Сохраняет небольшой файл целиком."""
+        writer = self.writer(key)
+        if writer is not None:
+            writer.write(data)
+            writer.commit()
+
+    def _victims(self, key: str, size: int) -> list[str]:
+        """Ключи, которые придется вытеснить, чтобы поместился файл."""
+        excess = self.total_bytes - self._entries.get(key, 0) + size - self.max_bytes
+        victims = []
+        for victim in self._entries:
+            if excess <= 0:
+                break
+            if victim != key:
+                victims.append(victim)
+                excess -= self._entries[victim]
+        return victims
+
+    def admits(self, key: str, size: int) -> bool:
+        """
+        Решение о допуске файла: без вытеснения — всегда, иначе частота
+        кандидата должна быть выше частоты каждой жертвы.
+        """
+        if size > self.max_bytes:
+            return False
+        if self.sketch is None or key in self._entries:
+            return True
+        candidate = self.sketch.estimate(key)
+        return all(self.sketch.estimate(victim) < candidate for victim in self._victims(key, size))
+
+    def _publish(self, key: str, tmp_path: str, size: int) -> bool:
+        if not self.admits(key, size):
+            os.remove(tmp_path)
+            cache_admissions.inc(cache=self.name, result="rejected")
+            return False
+        cache_admissions.inc(cache=self.name, result="admitted")
+        os.replace(tmp_path, self._path(key))
+        if key in self._entries:
+            self.total_bytes -= self._entries[key]
+        self._entries[key] = size
+        self._entries.move_to_end(key)
+        self.total_bytes += size
+        self._evict()
+        self._index_dirty = True
+        return True
+
+    def _forget(self, key: str) -> None:
+        self.total_bytes -= self._entries.pop(key)
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            path = self._path(key)
+            self._forget(key)
+            if os.path.exists(path):
+                os.remove(path)
+            cache_evictions.inc(cache=self.name, reason="lru")
+
+    def clear(self) -> None:
+        self._load()
+        for key in list(self._entries):
+            path = self._path(key)
+            self._forget(key)
+            if os.path.exists(path):
+                os.remove(path)
+        self.save_index()
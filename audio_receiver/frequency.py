@@ -0,0 +1,44 @@
+from typing import Hashable
+
+# Счетчики насыщаются на 15, как 4-битные счетчики TinyLFU
+MAX_COUNT = 15
+_SEEDS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F)
+_HALVE = bytes(value >> 1 for value in range(256))
+
+
+class FrequencySketch:
+    """
+    Приблизительная частота обращений к ключам (count-min sketch)
+    с устареванием: после sample_size обращений все счетчики делятся
+    пополам, поэтому старая популярность постепенно забывается.
+    Памяти нужно width * depth байт независимо от числа ключей.
+    """
+
+    def __init__(self, width: int, depth: int = 4, sample_size: int = 0):
+        self.width = width
+        self.depth = min(depth, len(_SEEDS))
+        self.sample_size = sample_size or 10 * width
+        self.additions = 0
+        self._rows = [bytearray(width) for _ in range(self.depth)]
+
+    def _indexes(self, key: Hashable):
+        for seed, row in zip(_SEEDS, self._rows):
+            yield row, hash((seed, key)) % self.width
+
+    def increment(self, key: Hashable) -> None:
+        """Учитывает обращение к ключу."""
+        for row, index in self._indexes(key):
+            if row[index] < MAX_COUNT:
+                row[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key: Hashable) -> int:
+        """Оценка частоты сверху (минимум по строкам)."""
+        return min(row[index] for row, index in self._indexes(key))
+
+    def _age(self) -> None:
+        for row in self._rows:
+            row[:] = row.translate(_HALVE)
+        self.additions //= 2
@@ -0,0 +1,140 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, NamedTuple
+
+from metrics import Counter, Histogram
+
+upstream_wait_seconds = Histogram(
+    "audio_receiver_upstream_wait_seconds",
+    "Ожидание разрешения на запрос к Яндекс Музыке (семафор и токены), по классу эндпоинтов",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5)
+)
+requests_shed = Counter(
+    "audio_receiver_requests_shed_total", "Запросы, отклоненные с 503 из-за перегрузки (concurrency/rate)"
+)
+
+
+class Overloaded(Exception):
+    """Разрешение на запрос к источнику не получено за бюджет ожидания."""
+
+    def __init__(self, endpoint: str, reason: str, retry_after: float):
+        super().__init__(f"Источник перегружен ({endpoint}: {reason})")
+        self.endpoint = endpoint
+        self.reason = reason
+        self.retry_after = max(math.ceil(retry_after), 1)
+
+
+class EndpointLimits(NamedTuple):
+    """Ограничения класса эндпоинтов."""
+    concurrency: int  # одновременных запросов к источнику
+    wait_budget: float  # секунд ожидания, после которых запрос отклоняется
+    reserve: float  # токенов, которые класс оставляет более приоритетным (0 — высший приоритет)
+
+
+class TokenBucket:
+    """
+    Ограничение частоты: rate токенов в секунду, не больше burst про запас.
+    Вызывается только из event loop, поэтому обходится без блокировок.
+    """
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, reserve: float = 0) -> float:
+        """Через сколько секунд в запасе будет токен сверх reserve."""
+        self._refill()
+        return max(reserve + 1 - self.tokens, 0.0) / self.rate
+
+    def try_take(self, reserve: float = 0) -> bool:
+        """Берет токен, если после этого в запасе останется не меньше reserve."""
+        if self.wait_time(reserve) > 0:
+            return False
+        self.tokens -= 1
+        return True
+
+    def borrow(self) -> float:
+        """
+        Берет токен в долг (запас может уйти в минус): токены достаются
+        в порядке очереди, даже если их сейчас нет.
+
+        Returns:
+            float: Сколько секунд подождать, пока долг покроется.
+        """
+        wait = self.wait_time()
+        self.tokens -= 1
+        return wait
+
+
+class UpstreamLimiter:
+    """
+    Допуск запросов к источнику: у каждого класса эндпоинтов свой семафор
+    одновременных запросов, частоту ограничивает общий TokenBucket.
+    Класс с reserve = 0 берет токены в долг и обслуживается в порядке
+    очереди; остальные берут токен, только пока в запасе остается больше
+    reserve, поэтому при нехватке токенов они уступают приоритетному.
+    Запрос, который не получит разрешения за wait_budget (или по оценке
+    не получит), отклоняется сразу — исключением Overloaded.
+    """
+
+    def __init__(
+        self,
+        bucket: TokenBucket,
+        limits: dict[str, EndpointLimits],
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.bucket = bucket
+        self.limits = limits
+        self._clock = clock
+        self._semaphores = {endpoint: asyncio.Semaphore(limit.concurrency) for endpoint, limit in limits.items()}
+
+    def _shed(self, endpoint: str, reason: str, retry_after: float) -> Overloaded:
+        requests_shed.inc(endpoint=endpoint, reason=reason)
+        return Overloaded(endpoint, reason, retry_after)
+
+    async def _take_token(self, endpoint: str, limits: EndpointLimits, deadline: float) -> None:
+        if limits.reserve <= 0:
+            wait = self.bucket.wait_time()
+            if self._clock() + wait > deadline:
+                raise self._shed(endpoint, "rate", wait)
+            await asyncio.sleep(self.bucket.borrow())
+            return
+        while not self.bucket.try_take(limits.reserve):
+            wait = self.bucket.wait_time(limits.reserve)
+            if self._clock() + wait > deadline:
+                raise self._shed(endpoint, "rate", wait)
+            await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def slot(self, endpoint: str):
+        """
+        Разрешение на один запрос к источнику класса endpoint
+        (search, meta, stream); держится до выхода из блока.
+
+        Raises:
+            Overloaded: Разрешение не получено за бюджет ожидания.
+        """
+        limits = self.limits[endpoint]
+        semaphore = self._semaphores[endpoint]
+        started = self._clock()
+        deadline = started + limits.wait_budget
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=limits.wait_budget)
+        except asyncio.TimeoutError:
+            raise self._shed(endpoint, "concurrency", limits.wait_budget) from None
+        try:
+            await self._take_token(endpoint, limits, deadline)
+            upstream_wait_seconds.observe(self._clock() - started, endpoint=endpoint)
+            yield
+        finally:
+            semaphore.release()
@@ -1,21 +1,66 @@
+import asyncio
+
+import httpx
 from audio_receiver_utils import *
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import Response, StreamingResponse
+from cache import normalize_query
+from disk_cache import CacheWriter
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+from limits import Overloaded
+from single_flight import IncompleteDownload, SharedDownload, single_flight_calls
+from metrics import render_metrics
+from mp3_index import byte_range_for_window, id3v2_size, parse_frame_header
+from starlette.background import BackgroundTask
 from typing import Optional
 
 app = FastAPI(title="Yandex Music API Wrapper")
+_index_saver: Optional[asyncio.Task] = None
+
+
+def _service_unavailable(e: Overloaded) -> HTTPException:
+    """Быстрый отказ, когда источник перегружен: клиент повторит позже."""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+async def _save_cache_indexes() -> None:
+    """Периодически сохраняет индексы дисковых кэшей, в которых появились файлы."""
+    while True:
+        await asyncio.sleep(CACHE_INDEX_SAVE_INTERVAL_SECONDS)
+        for disk_cache in (audio_cache, cover_cache):
+            try:
+                await disk_cache.flush_index()
+            except OSError as e:
+                print(f"Не удалось сохранить индекс кэша {disk_cache.name}: {e}")
 
 
 @app.on_event("startup")
 async def startup_event():
+    global _index_saver
     await init_client()
+    await init_http_client()
+    _index_saver = asyncio.create_task(_save_cache_indexes())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _index_saver is not None:
+        _index_saver.cancel()
+    await close_http_client()
+    # Порядок использования меняется и при попаданиях, индекс сохраняется при остановке
+    audio_cache.save_index()
+    cover_cache.save_index()
 
 
 @app.get("/search/")
 async def search_tracks(query: str, limit: Optional[int] = 5):
     """
-    Поиск треков по названию
+    Поиск треков по названию. Ответы кэшируются по нормализованному
+    запросу и limit, повторный запрос не идет в Яндекс Музыку.
     """
+    cache_key = (normalize_query(query), limit)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
     try:
         tracks = await find_tracks_by_name(query)
         if not tracks:
@@ -31,7 +76,11 @@ async def search_tracks(query: str, limit: Optional[int] = 5):
                 # noqa
             })
 
-        return {"results": result}
+        response = {"results": result}
+        search_cache.set(cache_key, response)
+        return response
+    except Overloaded as e:
+        raise _service_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -51,47 +100,371 @@ async def track_info(track_id: str):
             "artists": [{"id": artist.id, "name": artist.name} for artist in track.artists],
             "duration": track.duration_ms
         }
+    except Overloaded as e:
+        raise _service_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _fetch_cover(track_id: str) -> Optional[bytes]:
+    track = await get_track_info(track_id)
+    cover_bytes = await get_track_cover(track)
+    if cover_bytes:
+        cover_cache.put_bytes(track_id, cover_bytes)
+    return cover_bytes
+
+
 @app.get("/track/{track_id}/cover")
 async def get_track_cover_image(track_id: str):
     """
-    Получение обложки трека
+    Получение обложки трека (из дискового кэша, если она уже скачивалась)
     """
+    cached_path = cover_cache.get(track_id)
+    if cached_path is not None:
+        cover_cache.record_saved(cover_cache.size(track_id))
+        return FileResponse(cached_path, media_type="image/jpeg")
     try:
-        track = await get_track_info(track_id)
-        cover_bytes = await get_track_cover(track)
+        cover_bytes = await cover_flights.run(track_id, lambda: _fetch_cover(track_id))
         if not cover_bytes:
             raise HTTPException(status_code=404, detail="Обложка не найдена")
 
         return Response(content=cover_bytes, media_type="image/jpeg")
+    except Overloaded as e:
+        raise _service_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _slice_stream(chunks, start: int, end: int):
+    """Байты start..end (включительно) из потока целого файла."""
+    position = 0
+    async for chunk in chunks:
+        chunk_start, position = position, position + len(chunk)
+        if position <= start:
+            continue
+        yield chunk[max(start - chunk_start, 0):end + 1 - chunk_start]
+        if position > end:
+            break
+
+
+async def _tee_to_cache(chunks, writer: CacheWriter, expected_size: int, download: SharedDownload, cache_key: str):
+    """
+    Отдает поток дальше и одновременно пишет его в кэш. Файл попадает
+    в кэш, только если скачан полностью. Записанные байты сразу доступны
+    одновременным запросам того же трека через download.
+    """
+    committed = False
+    try:
+        async for chunk in chunks:
+            writer.write(chunk)
+            download.advance(len(chunk))
+            yield chunk
+        committed = writer.commit(expected_size)
+    finally:
+        if not committed:
+            writer.abort()
+        download.finish(committed)
+        _forget_download(cache_key, download)
+
+
+async def _count_bytes(chunks, quality: str, source: str = "upstream"):
+    """Отдает поток дальше, считая байты, отданные по политике quality."""
+    async for chunk in chunks:
+        stream_bytes.inc(len(chunk), quality=quality, source=source)
+        yield chunk
+
+
+def _forget_download(cache_key: str, download: SharedDownload) -> None:
+    if audio_downloads.get(cache_key) is download:
+        del audio_downloads[cache_key]
+
+
+async def _follow_download(chunks, download: SharedDownload, track_id: str, quality: str):
+    """
+    Байты файла, который скачивает другой запрос. Если тот запрос
+    оборвался (клиент отключился), остаток докачивается с Range.
+    """
+    try:
+        async for chunk in chunks:
+            yield chunk
+        return
+    except IncompleteDownload as e:
+        position = e.position
+    track = await get_track_info(track_id)
+    opened = await open_track_audio(track, f"bytes={position}-", quality)
+    if opened is None:
+        return
+    _, upstream = opened
+    try:
+        body = upstream.aiter_bytes(STREAM_CHUNK_SIZE)
+        if upstream.status_code != 206:
+            body = _slice_stream(body, position, download.total - 1)
+        async for chunk in _count_bytes(body, quality):
+            yield chunk
+    finally:
+        await upstream.aclose()
+
+
+def _shared_track_response(track_id: str, quality: str, download: SharedDownload) -> Optional[StreamingResponse]:
+    """
+    Ответ из файла, который сейчас пишется в кэш другим запросом
+    (None, если запись уже закончилась и временного файла нет).
+    """
+    try:
+        chunks = download.follow(STREAM_CHUNK_SIZE, UPSTREAM_TIMEOUT_SECONDS)
+    except OSError:
+        return None
+    single_flight_calls.inc(operation="audio", role="follower")
+    return StreamingResponse(
+        _count_bytes(_follow_download(chunks, download, track_id, quality), quality, source="shared"),
+        media_type=AUDIO_MEDIA_TYPES.get(download.codec, "application/octet-stream"),
+        headers={
+            "Content-Disposition": f"inline; filename=track_{track_id}.{download.codec}",
+            "Accept-Ranges": "bytes",
+            "Content-Length": str(download.total)
+        }
+    )
+
+
+def _audio_key(track_id: str, quality: str) -> str:
+    return f"{track_id}:{quality}"
+
+
+def _cached_codec(path: str) -> str:
+    """Кодек файла в кэше по первому кадру: MP3 (с ID3v2 или без) или AAC (ADTS)."""
+    with open(path, "rb") as f:
+        head = f.read(10)
+    if id3v2_size(head) or parse_frame_header(head, 0) is not None:
+        return "mp3"
+    return "aac"
+
+
+def _cached_track_response(
+    track_id: str,
+    quality: str,
+    path: str,
+    range_header: Optional[str]
+) -> FileResponse:
+    """Ответ из дискового кэша; Range обрабатывает FileResponse."""
+    saved = audio_cache.size(_audio_key(track_id, quality))
+    if range_header:
+        try:
+            byte_range = parse_byte_range(range_header, saved)
+        except ValueError:
+            byte_range = (0, -1)
+        if byte_range is not None:
+            saved = byte_range[1] - byte_range[0] + 1
+    audio_cache.record_saved(saved)
+    stream_bytes.inc(saved, quality=quality, source="cache")
+    codec = _cached_codec(path)
+    return FileResponse(
+        path,
+        media_type=AUDIO_MEDIA_TYPES[codec],
+        filename=f"track_{track_id}.{codec}",
+        content_disposition_type="inline"
+    )
+
+
+def _check_quality(quality: Optional[str]) -> str:
+    quality = quality or DEFAULT_QUALITY
+    if quality not in QUALITY_POLICIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неизвестное значение quality, допустимые: {', '.join(QUALITY_POLICIES)}"
+        )
+    return quality
+
+
 @app.get("/track/{track_id}/stream")
-async def stream_track(track_id: str):
+async def stream_track(
+    track_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    quality: Optional[str] = Query(None)
+):
     """
-    Потоковое воспроизведение трека
+    Потоковое воспроизведение трека: файл по прямой ссылке проксируется
+    кусками по мере получения, без загрузки целиком в память. Заголовок
+    Range передается источнику; если источник его не поддерживает,
+    нужный фрагмент вырезается из потока (ответ 206 в обоих случаях).
+    Целиком скачанный файл попадает в дисковый кэш, и следующие запросы
+    (в том числе с Range) отдаются с диска.
+
+    Одновременные запросы целого файла, который еще пишется в кэш,
+    не скачивают его заново, а читают записанное по мере загрузки.
+
+    Параметр quality выбирает вариант файла: best — наибольший битрейт,
+    circle — около CIRCLE_TARGET_KBPS (для кружков, которые все равно
+    перекодируются); по умолчанию DEFAULT_QUALITY.
     """
+    quality = _check_quality(quality)
+    cache_key = _audio_key(track_id, quality)
+    cached_path = audio_cache.get(cache_key)
+    if cached_path is not None:
+        return _cached_track_response(track_id, quality, cached_path, range_header)
+
+    download = None
+    if not range_header:
+        download = audio_downloads.get(cache_key)
+        if download is not None and not download.stalled(UPSTREAM_TIMEOUT_SECONDS):
+            await download.ready.wait()
+            response = None
+            if download.path is not None:
+                response = _shared_track_response(track_id, quality, download)
+            # Пока ждали, файл мог целиком попасть в кэш
+            cached_path = audio_cache.get(cache_key) if response is None else None
+            if cached_path is not None:
+                return _cached_track_response(track_id, quality, cached_path, range_header)
+            if response is not None:
+                return response
+        # Ведущий запрос: одновременные запросы ждут, пока он решит, пишется ли файл
+        download = SharedDownload()
+        audio_downloads[cache_key] = download
+        single_flight_calls.inc(operation="audio", role="leader")
+    try:
+        return await _proxy_track(track_id, quality, cache_key, range_header, download)
+    finally:
+        if download is not None and not download.ready.is_set():
+            download.decline()
+            _forget_download(cache_key, download)
+
+
+async def _proxy_track(
+    track_id: str,
+    quality: str,
+    cache_key: str,
+    range_header: Optional[str],
+    download: Optional[SharedDownload]
+) -> StreamingResponse:
+    """Проксирует файл из источника (см. stream_track)."""
     try:
         track = await get_track_info(track_id)
-        track_bytes = await get_track_bytes(track)
-        if not track_bytes:
+        opened = await open_track_audio(track, range_header, quality)
+        if opened is None:
             raise HTTPException(status_code=404, detail="Трек не найден")
+        link, upstream = opened
+    except HTTPException:
+        raise
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 416:
+            raise HTTPException(status_code=416, detail="Запрошенный диапазон вне файла")
+        raise HTTPException(status_code=502, detail=f"Ошибка загрузки трека: {e}")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Ошибка загрузки трека: {e}")
+    except Overloaded as e:
+        raise _service_unavailable(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        return StreamingResponse(
-            iter([track_bytes]),
-            media_type="audio/mpeg",
-            headers={
-                "Content-Disposition": f"inline; filename=track_{track.trackId}.mp3",
-                "Content-Length": str(len(track_bytes))
-            }
-        )
+    headers = {
+        "Content-Disposition": f"inline; filename=track_{track.trackId}.{link.codec}",
+        "Accept-Ranges": "bytes"
+    }
+    status_code = upstream.status_code
+    body = _count_bytes(upstream.aiter_bytes(STREAM_CHUNK_SIZE), quality)
+    # Длина известна, только если тело передается без сжатия
+    content_length = upstream.headers.get("content-length")
+    if "content-encoding" in upstream.headers:
+        content_length = None
+
+    if status_code == 206:
+        headers["Content-Range"] = upstream.headers["content-range"]
+    elif not range_header and content_length and audio_cache.admits(cache_key, int(content_length)):
+        # Трек, который фильтр частот не пустит в кэш, и не записывается
+        writer = audio_cache.writer(cache_key)
+        if writer is not None:
+            download.start(writer.path, int(content_length), link.codec)
+            body = _tee_to_cache(body, writer, int(content_length), download, cache_key)
+    elif range_header and content_length:
+        total = int(content_length)
+        try:
+            byte_range = parse_byte_range(range_header, total)
+        except ValueError:
+            await upstream.aclose()
+            raise HTTPException(
+                status_code=416,
+                detail="Запрошенный диапазон вне файла",
+                headers={"Content-Range": f"bytes */{total}"}
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = 206
+            body = _slice_stream(body, start, end)
+            headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+            content_length = str(end - start + 1)
+
+    if content_length:
+        headers["Content-Length"] = content_length
+    return StreamingResponse(
+        body,
+        status_code=status_code,
+        media_type=AUDIO_MEDIA_TYPES.get(link.codec, "application/octet-stream"),
+        headers=headers,
+        background=BackgroundTask(upstream.aclose)
+    )
+
+
+@app.get("/track/{track_id}/byte_range")
+async def track_byte_range(
+    track_id: str,
+    start: float = Query(..., ge=0),
+    end: float = Query(..., gt=0),
+    margin: float = Query(1.0, ge=0, le=30),
+    quality: Optional[str] = Query(None)
+):
+    """
+    Приблизительный диапазон байт файла трека для отрезка start..end
+    (секунды) с запасом margin секунд с каждой стороны. Считается по
+    оглавлению Xing (VBR) или по битрейту (CBR); результат можно
+    передать в заголовок Range запроса /track/{id}/stream
+    (с тем же quality).
+    """
+    quality = _check_quality(quality)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="Параметр start должен быть меньше end")
+    try:
+        track = await get_track_info(track_id)
+        link = await get_track_link(track, quality)
+        if link is None:
+            raise HTTPException(status_code=404, detail="Трек не найден")
+        if link.codec != "mp3":
+            raise HTTPException(status_code=422, detail="Оценка диапазона поддерживается только для MP3")
+        index = await get_track_index(track, quality)
+    except HTTPException:
+        raise
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Ошибка загрузки трека: {e}")
+    except Overloaded as e:
+        raise _service_unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if index is None:
+        raise HTTPException(status_code=422, detail="Не удалось разобрать начало файла как MP3")
+
+    first, last = byte_range_for_window(index, start, end, margin)
+    return {
+        "start": first,
+        "end": last,
+        "range": f"bytes={first}-{last}",
+        "total": index.audio_offset + index.audio_bytes,
+        "duration": round(index.duration, 3),
+        "bitrate": index.bitrate,
+        "method": "toc" if index.toc is not None else "bitrate"
+    }
+
+@app.get("/health")
+async def health_check():
+    """
+    Проверка состояния сервиса
+    """
+    return {"status": "healthy"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """
+    Метрики в текстовом формате Prometheus (попадания и промахи кэшей).
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
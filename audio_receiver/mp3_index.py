@@ -0,0 +1,188 @@
+from typing import NamedTuple, Optional
+
+# Битрейты (кбит/с) по индексу: MPEG-1 Layer III и MPEG-2/2.5 Layer III
+_BITRATES_V1 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_BITRATES_V2 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+_XING_FRAMES = 0x1
+_XING_BYTES = 0x2
+_XING_TOC = 0x4
+
+
+class FrameHeader(NamedTuple):
+    """Заголовок кадра MPEG Layer III."""
+    version: int  # 3 — MPEG-1, 2 — MPEG-2, 0 — MPEG-2.5
+    bitrate: int  # кбит/с
+    sample_rate: int
+    mono: bool
+    samples_per_frame: int
+    frame_length: int
+
+
+class Mp3Index(NamedTuple):
+    """Сведения для перевода времени в смещение в файле."""
+    audio_offset: int  # начало первого кадра (после ID3v2)
+    audio_bytes: int  # байт аудио от первого кадра до конца
+    duration: float  # секунды
+    bitrate: int  # средний битрейт, кбит/с
+    toc: Optional[tuple]  # оглавление Xing: 100 точек по 0..255
+
+
+def id3v2_size(data: bytes) -> int:
+    """
+    Размер тега ID3v2 в начале файла (0, если тега нет).
+
+    Args:
+        data: Начало файла (не меньше 10 байт).
+
+    Returns:
+        int: Размер тега вместе с заголовком и футером.
+    """
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def parse_frame_header(data: bytes, offset: int) -> Optional[FrameHeader]:
+    """
+    Разбирает заголовок кадра Layer III по смещению.
+
+    Returns:
+        Optional[FrameHeader]: Заголовок или None, если там нет кадра.
+    """
+    if offset + 4 > len(data):
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or b1 & 0xE0 != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x3
+    layer = (b1 >> 1) & 0x3
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 0x3
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate = (_BITRATES_V1 if version == 3 else _BITRATES_V2)[bitrate_index]
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    samples_per_frame = 1152 if version == 3 else 576
+    padding = (b2 >> 1) & 0x1
+    frame_length = samples_per_frame // 8 * bitrate * 1000 // sample_rate + padding
+    return FrameHeader(version, bitrate, sample_rate, (b3 >> 6) == 3, samples_per_frame, frame_length)
+
+
+def find_first_frame(data: bytes, start: int = 0) -> Optional[tuple[int, FrameHeader]]:
+    """
+    Первый кадр, за которым сразу следует еще один кадр (защита от ложной
+    синхронизации внутри мусора).
+
+    Returns:
+        Optional[tuple[int, FrameHeader]]: Смещение и заголовок кадра.
+    """
+    offset = data.find(b"\xff", start)
+    while offset != -1:
+        header = parse_frame_header(data, offset)
+        if header is not None:
+            following = offset + header.frame_length
+            if following + 4 > len(data) or parse_frame_header(data, following) is not None:
+                return offset, header
+        offset = data.find(b"\xff", offset + 1)
+    return None
+
+
+def _xing_offset(header: FrameHeader) -> int:
+    # Заголовок Xing идет после 4 байт заголовка кадра и side info
+    if header.version == 3:
+        return 4 + (17 if header.mono else 32)
+    return 4 + (9 if header.mono else 17)
+
+
+def build_index(data: bytes, data_offset: int, total_bytes: int, duration: float) -> Optional[Mp3Index]:
+    """
+    Строит индекс по началу аудиоданных: первый кадр, заголовок Xing/Info
+    (число кадров, байт и оглавление), если он есть.
+
+    Args:
+        data: Байты файла, начиная с data_offset (несколько КБ после ID3v2).
+        data_offset: Смещение data в файле.
+        total_bytes: Размер всего файла.
+        duration: Длительность трека из метаданных (секунды), если
+            в файле нет Xing.
+
+    Returns:
+        Optional[Mp3Index]: Индекс или None, если кадр не найден.
+    """
+    found = find_first_frame(data)
+    if found is None:
+        return None
+    frame_offset, header = found
+    audio_offset = data_offset + frame_offset
+    audio_bytes = total_bytes - audio_offset
+    toc = None
+
+    xing = frame_offset + _xing_offset(header)
+    if data[xing:xing + 4] in (b"Xing", b"Info") and xing + 8 <= len(data):
+        flags = int.from_bytes(data[xing + 4:xing + 8], "big")
+        position = xing + 8
+        if flags & _XING_FRAMES and position + 4 <= len(data):
+            frames = int.from_bytes(data[position:position + 4], "big")
+            if frames:
+                duration = frames * header.samples_per_frame / header.sample_rate
+            position += 4
+        if flags & _XING_BYTES and position + 4 <= len(data):
+            audio_bytes = int.from_bytes(data[position:position + 4], "big") or audio_bytes
+            position += 4
+        if flags & _XING_TOC and position + 100 <= len(data):
+            toc = tuple(data[position:position + 100])
+
+    if duration > 0:
+        bitrate = round(audio_bytes * 8 / duration / 1000)
+    else:
+        bitrate = header.bitrate
+        duration = audio_bytes * 8 / (bitrate * 1000)
+    return Mp3Index(audio_offset, audio_bytes, duration, bitrate, toc)
+
+
+def time_to_byte(index: Mp3Index, seconds: float) -> int:
+    """
+    Приблизительное смещение в файле для момента времени: по оглавлению
+    Xing (VBR), иначе — по среднему битрейту.
+
+    Args:
+        index: Индекс файла.
+        seconds: Момент времени.
+
+    Returns:
+        int: Смещение в байтах.
+    """
+    seconds = min(max(seconds, 0.0), index.duration)
+    if index.toc is not None and index.duration > 0:
+        percent = seconds / index.duration * 100
+        point = min(int(percent), 99)
+        lower = index.toc[point]
+        upper = index.toc[point + 1] if point < 99 else 256
+        fraction = lower + (upper - lower) * (percent - point)
+        position = int(fraction / 256 * index.audio_bytes)
+    else:
+        position = int(seconds * index.bitrate * 1000 / 8)
+    return index.audio_offset + min(position, index.audio_bytes)
+
+
+def byte_range_for_window(index: Mp3Index, start: float, end: float, margin: float) -> tuple[int, int]:
+    """
+    Диапазон байт (включительно), покрывающий отрезок времени с запасом
+    margin секунд с каждой стороны: запас покрывает неточность оценки
+    и резервуар битов кадров перед началом отрезка.
+
+    Returns:
+        tuple[int, int]: Первый и последний байт.
+    """
+    first = time_to_byte(index, start - margin)
+    last = time_to_byte(index, end + margin)
+    if end + margin >= index.duration:
+        last = index.audio_offset + index.audio_bytes
+    return first, max(first, last - 1)
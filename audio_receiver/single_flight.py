@@ -0,0 +1,154 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from metrics import Counter
+
+single_flight_calls = Counter(
+    "audio_receiver_single_flight_total",
+    "Запросы к источнику по ролям: leader — выполнил запрос, follower — дождался чужого"
+)
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные одинаковые запросы к источнику: пока запрос
+    по ключу выполняется, остальные вызовы с тем же ключом ждут его
+    результат (или исключение), а не повторяют запрос. Запрос выполняется
+    отдельной задачей, поэтому отмена одного из ожидающих (клиент
+    отключился) не отменяет его для остальных. Вызывается только из
+    event loop, поэтому обходится без блокировок.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, function: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Результат function() для ключа key, общий для одновременных вызовов.
+
+        Args:
+            key: Ключ запроса.
+            function: Функция, создающая корутину запроса.
+
+        Returns:
+            Any: Результат запроса.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(function())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+            single_flight_calls.inc(operation=self.name, role="leader")
+        else:
+            single_flight_calls.inc(operation=self.name, role="follower")
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Исключение забирается здесь, если все ожидавшие уже отменены
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+
+class IncompleteDownload(Exception):
+    """Общая загрузка оборвалась; position — сколько байт читатель уже получил."""
+
+    def __init__(self, position: int):
+        super().__init__(f"Загрузка оборвалась на байте {position}")
+        self.position = position
+
+
+class SharedDownload:
+    """
+    Файл, который один запрос скачивает в дисковый кэш, а остальные
+    одновременные запросы того же файла читают из временного файла
+    по мере записи. Сначала ведущий запрос решает, будет ли файл
+    записываться (start или decline); ожидающие ждут ready.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.ready = asyncio.Event()
+        self.path: Optional[str] = None
+        self.total = 0
+        self.codec = ""
+        self.written = 0
+        self.done = False
+        self.failed = False
+        self._clock = clock
+        self.updated = clock()
+        self._progress = asyncio.Event()
+
+    def start(self, path: str, total: int, codec: str) -> None:
+        """Файл пишется в path, его полный размер — total."""
+        self.path, self.total, self.codec = path, total, codec
+        self.updated = self._clock()
+        self.ready.set()
+
+    def decline(self) -> None:
+        """Файл не пишется в кэш (ошибка, Range, отказ в допуске): каждый качает сам."""
+        self.done = self.failed = True
+        self.ready.set()
+        self._notify()
+
+    def advance(self, size: int) -> None:
+        """Записано еще size байт."""
+        self.written += size
+        self._notify()
+
+    def finish(self, completed: bool) -> None:
+        """Загрузка закончилась: файл целиком в кэше или загрузка оборвалась."""
+        self.done = True
+        self.failed = not completed
+        self._notify()
+
+    def stalled(self, timeout: float) -> bool:
+        """Не было записи дольше timeout секунд (ведущий запрос пропал)."""
+        return not self.done and self._clock() - self.updated > timeout
+
+    def _notify(self) -> None:
+        self.updated = self._clock()
+        self._progress.set()
+        self._progress = asyncio.Event()
+
+    def follow(self, chunk_size: int, timeout: float):
+        """
+        Байты файла по мере записи. Файл открывается сразу: после
+        публикации в кэше временного файла уже не будет.
+
+        Args:
+            chunk_size: Наибольший размер куска.
+            timeout: Сколько ждать новых байт, прежде чем считать загрузку оборванной.
+
+        Returns:
+            AsyncIterator[bytes]: Куски файла; если загрузка оборвалась или
+                остановилась, итерация заканчивается IncompleteDownload.
+
+        Raises:
+            OSError: Временный файл уже удален.
+        """
+        return self._read(open(self.path, "rb"), chunk_size, timeout)
+
+    async def _read(self, f, chunk_size: int, timeout: float):
+        position = 0
+        with f:
+            while True:
+                if position < self.written:
+                    f.seek(position)
+                    chunk = f.read(min(chunk_size, self.written - position))
+                    position += len(chunk)
+                    yield chunk
+                    continue
+                if self.done:
+                    if self.failed or position < self.total:
+                        raise IncompleteDownload(position)
+                    return
+                try:
+                    await asyncio.wait_for(self._progress.wait(), timeout)
+                except asyncio.TimeoutError:
+                    raise IncompleteDownload(position) from None
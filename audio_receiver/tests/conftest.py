@@ -10,3 +10,38 @@ os.environ.setdefault("YANDEX_MUSIC_API_TOKEN", "fake_test_token")
 # Мокаем yandex_music, чтобы не требовать реальную установку
 _mock_ym = MagicMock()
 sys.modules["yandex_music"] = _mock_ym
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Кэши модуля общие для всех тестов, поэтому очищаются перед каждым."""
+    import audio_receiver_utils
+    audio_receiver_utils.search_cache.clear()
+    audio_receiver_utils.track_cache.clear()
+    audio_receiver_utils.index_cache.clear()
+    audio_receiver_utils.download_info_cache.clear()
+    audio_receiver_utils.direct_link_cache.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def isolated_disk_caches(tmp_path, monkeypatch):
+    """Дисковые кэши каждого теста — в его временном каталоге."""
+    import audio_receiver_utils
+    import main
+    from disk_cache import DiskCache
+
+    audio_cache = DiskCache("audio", str(tmp_path / "cache" / "audio"), 64 * 1024 * 1024)
+    cover_cache = DiskCache("cover", str(tmp_path / "cache" / "covers"), 1024 * 1024)
+    for module in (audio_receiver_utils, main):
+        monkeypatch.setattr(module, "audio_cache", audio_cache)
+        monkeypatch.setattr(module, "cover_cache", cover_cache)
+    yield
+
+
+@pytest.fixture(autouse=True)
+def fresh_upstream_limiter(monkeypatch):
+    """Токены и семафоры допуска к источнику не переходят между тестами."""
+    import audio_receiver_utils
+    monkeypatch.setattr(audio_receiver_utils, "upstream_limiter", audio_receiver_utils.create_upstream_limiter())
+    yield
@@ -0,0 +1,75 @@
+from cache import TTLCache, cache_requests, normalize_query
+
+
+class FakeClock:
+    """Управляемые часы для проверки времени жизни записей."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache:
+    """Тесты TTLCache."""
+
+    def test_hit_and_miss_are_counted(self):
+        """Попадания и промахи попадают в метрику."""
+        cache = TTLCache("test_counts", max_entries=10, ttl=60)
+        cache.set("key", "value")
+
+        assert cache.get("key") == "value"
+        assert cache.get("other") is None
+        assert cache_requests.value(cache="test_counts", result="hit") == 1
+        assert cache_requests.value(cache="test_counts", result="miss") == 1
+
+    def test_entry_expires(self):
+        """Запись устаревает через ttl."""
+        clock = FakeClock()
+        cache = TTLCache("test_ttl", max_entries=10, ttl=60, clock=clock)
+        cache.set("key", "value")
+        cache.set("short", "value", ttl=5)
+
+        clock.now = 10
+        assert cache.get("short") is None
+        assert cache.get("key") == "value"
+        clock.now = 61
+        assert cache.get("key") is None
+        assert len(cache) == 0
+
+    def test_least_recently_used_is_evicted(self):
+        """При переполнении вытесняется давно не использованная запись."""
+        cache = TTLCache("test_lru", max_entries=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_disabled_cache(self):
+        """max_entries=0 отключает кэш."""
+        cache = TTLCache("test_disabled", max_entries=0, ttl=60)
+        cache.set("a", 1)
+
+        assert cache.get("a") is None
+
+
+class TestNormalizeQuery:
+    """Тесты normalize_query."""
+
+    def test_case_and_whitespace(self):
+        """Регистр и лишние пробелы не влияют на ключ."""
+        assert normalize_query("  The Weeknd   Blinding\tLights ") == "the weeknd blinding lights"
+
+    def test_punctuation(self):
+        """Знаки препинания заменяются пробелами."""
+        assert normalize_query("Блестящие — Чао, бамбино!") == normalize_query("блестящие чао бамбино")
+
+    def test_transliteration(self):
+        """Кириллица и латиница дают один ключ."""
+        assert normalize_query("Кино Группа крови") == normalize_query("kino gruppa krovi")
+        assert normalize_query("Ёлка") == normalize_query("елка")
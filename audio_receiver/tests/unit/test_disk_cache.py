@@ -0,0 +1,160 @@
+import os
+
+from disk_cache import INDEX_FILE_NAME, DiskCache, cache_admissions, cache_bytes_saved, hit_ratio
+from frequency import FrequencySketch
+
+
+def _cache(tmp_path, max_bytes=1000, name="test_disk"):
+    return DiskCache(name, str(tmp_path / "cache"), max_bytes)
+
+
+class TestDiskCache:
+    """Тесты DiskCache."""
+
+    def test_put_and_get(self, tmp_path):
+        """Сохраненный файл отдается по ключу."""
+        cache = _cache(tmp_path)
+        cache.put_bytes("track:1", b"abc")
+
+        path = cache.get("track:1")
+        assert path is not None
+        with open(path, "rb") as f:
+            assert f.read() == b"abc"
+        assert cache.get("track:2") is None
+        assert cache.total_bytes == 3
+
+    def test_evicts_least_recently_used_over_budget(self, tmp_path):
+        """При превышении бюджета удаляются давно не использованные файлы."""
+        cache = _cache(tmp_path, max_bytes=250)
+        cache.put_bytes("a", bytes(100))
+        cache.put_bytes("b", bytes(100))
+        cache.get("a")
+        cache.put_bytes("c", bytes(100))
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.total_bytes == 200
+        assert len(os.listdir(cache.directory)) == 2  # индекс сохраняется позже
+
+    def test_oversized_file_is_not_cached(self, tmp_path):
+        """Файл больше бюджета не сохраняется."""
+        cache = _cache(tmp_path, max_bytes=10)
+        cache.put_bytes("big", bytes(11))
+
+        assert cache.get("big") is None
+        assert os.listdir(cache.directory) == []
+
+    def test_incomplete_download_is_discarded(self, tmp_path):
+        """Оборванная запись не попадает в кэш."""
+        cache = _cache(tmp_path)
+        writer = cache.writer("partial")
+        writer.write(b"12345")
+
+        assert not writer.commit(expected_size=10)
+        assert cache.get("partial") is None
+        assert os.listdir(cache.directory) == []
+
+    def test_index_survives_restart(self, tmp_path):
+        """Индекс и порядок использования восстанавливаются после перезапуска."""
+        cache = _cache(tmp_path, max_bytes=250)
+        cache.put_bytes("a", bytes(100))
+        cache.put_bytes("b", bytes(100))
+        cache.get("a")
+        cache.save_index()
+
+        restarted = _cache(tmp_path, max_bytes=250)
+        restarted.put_bytes("c", bytes(100))
+        assert restarted.get("b") is None
+        assert restarted.get("a") is not None
+        assert restarted.total_bytes == 200
+
+    def test_orphans_removed_on_start(self, tmp_path):
+        """Недописанные файлы и файлы без записи в индексе удаляются."""
+        cache = _cache(tmp_path)
+        cache.put_bytes("a", b"data")
+        with open(os.path.join(cache.directory, ".junk.tmp"), "wb") as f:
+            f.write(b"partial")
+        # Индекс не сохранен (процесс упал до flush_index)
+        assert not os.path.exists(os.path.join(cache.directory, INDEX_FILE_NAME))
+
+        restarted = _cache(tmp_path)
+        assert restarted.get("a") is None
+        assert os.listdir(restarted.directory) == []
+
+    async def test_flush_index_only_when_changed(self, tmp_path):
+        """Индекс пишется в потоке и только после новых файлов."""
+        cache = _cache(tmp_path)
+        index_path = os.path.join(cache.directory, INDEX_FILE_NAME)
+        cache.put_bytes("a", b"data")
+
+        await cache.flush_index()
+        assert os.path.exists(index_path)
+        os.remove(index_path)
+        await cache.flush_index()
+        assert not os.path.exists(index_path)
+
+        restarted = _cache(tmp_path)
+        cache.put_bytes("b", b"data")
+        await cache.flush_index()
+        assert restarted.get("a") is not None
+        assert restarted.get("b") is not None
+
+    def test_commit_reports_rejected_admission(self, tmp_path):
+        """Файл, не допущенный в кэш, не считается закэшированным."""
+        cache = DiskCache("test_commit_rejected", str(tmp_path / "cache"), 100, sketch=FrequencySketch(1024))
+        for _ in range(3):
+            cache.get("popular")
+        cache.put_bytes("popular", bytes(100))
+
+        writer = cache.writer("one-off")
+        writer.write(bytes(100))
+        assert not writer.commit(expected_size=100)
+        assert cache.size("one-off") is None
+        assert os.listdir(cache.directory) == [cache.file_name("popular")]
+
+    def test_hit_ratio_and_bytes_saved(self, tmp_path):
+        """Доля попаданий и сэкономленные байты."""
+        cache = _cache(tmp_path, name="test_ratio")
+        cache.put_bytes("a", b"data")
+        cache.get("a")
+        cache.get("missing")
+        cache.record_saved(4)
+
+        assert hit_ratio("test_ratio") == 0.5
+        assert cache_bytes_saved.value(cache="test_ratio") == 4
+
+
+class TestAdmission:
+    """Допуск в кэш по частоте (TinyLFU)."""
+
+    def test_one_off_track_does_not_evict_popular(self, tmp_path):
+        """Редкий трек не вытесняет популярный."""
+        cache = DiskCache("test_admission", str(tmp_path / "cache"), 200, sketch=FrequencySketch(1024))
+        for _ in range(5):
+            cache.get("popular")
+        cache.put_bytes("popular", bytes(100))
+        cache.get("warm")
+        cache.put_bytes("warm", bytes(100))
+        cache.get("popular")  # жертвой по LRU становится warm
+
+        cache.get("one-off")
+        assert not cache.admits("one-off", 100)
+        cache.put_bytes("one-off", bytes(100))
+        assert cache.size("one-off") is None
+        assert cache_admissions.value(cache="test_admission", result="rejected") == 1
+
+        # Трек, который запрашивают чаще жертвы, допускается
+        for _ in range(3):
+            cache.get("rising")
+        cache.put_bytes("rising", bytes(100))
+        assert cache.size("rising") == 100
+        assert cache.size("warm") is None
+        assert cache.size("popular") == 100
+
+    def test_free_space_admits_everything(self, tmp_path):
+        """Пока место есть, допуск не нужен."""
+        cache = DiskCache("test_admission_free", str(tmp_path / "cache"), 1000, sketch=FrequencySketch(1024))
+        cache.put_bytes("new", bytes(100))
+
+        assert cache.size("new") == 100
@@ -0,0 +1,28 @@
+from frequency import MAX_COUNT, FrequencySketch
+
+
+class TestFrequencySketch:
+    """Тесты FrequencySketch."""
+
+    def test_estimate_counts_accesses(self):
+        """Оценка растет с числом обращений и насыщается."""
+        sketch = FrequencySketch(1024)
+        for _ in range(3):
+            sketch.increment("hot")
+        for _ in range(100):
+            sketch.increment("saturated")
+
+        assert sketch.estimate("hot") >= 3
+        assert sketch.estimate("saturated") == MAX_COUNT
+        assert sketch.estimate("never") <= 1
+
+    def test_aging_halves_counters(self):
+        """После sample_size обращений счетчики делятся пополам."""
+        sketch = FrequencySketch(1024, sample_size=20)
+        for _ in range(8):
+            sketch.increment("old")
+        for number in range(12):
+            sketch.increment(f"other-{number}")
+
+        assert sketch.estimate("old") == 4
+        assert sketch.additions == 10
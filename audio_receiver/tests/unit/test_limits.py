@@ -0,0 +1,151 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi import HTTPException
+
+import audio_receiver_utils as utils
+import main
+from limits import EndpointLimits, Overloaded, TokenBucket, UpstreamLimiter, requests_shed, upstream_wait_seconds
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTokenBucket:
+    """Тесты TokenBucket."""
+
+    def test_burst_then_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, burst=3, clock=clock)
+
+        assert [bucket.try_take() for _ in range(4)] == [True, True, True, False]
+        assert bucket.wait_time() == pytest.approx(0.5)
+        clock.now += 0.5
+        assert bucket.try_take()
+
+    def test_refill_capped_by_burst(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, burst=2, clock=clock)
+        clock.now += 60
+        assert [bucket.try_take() for _ in range(3)] == [True, True, False]
+
+    def test_reserve_left_for_priority(self):
+        """С reserve токен берется, только пока в запасе остается больше reserve."""
+        bucket = TokenBucket(rate=1, burst=3, clock=FakeClock())
+        assert bucket.try_take(reserve=1)
+        assert bucket.try_take(reserve=1)
+        assert not bucket.try_take(reserve=1)
+        assert bucket.try_take()
+
+    def test_borrow_queues_in_order(self):
+        """В долг: каждый следующий ждет на 1/rate дольше."""
+        bucket = TokenBucket(rate=4, burst=1, clock=FakeClock())
+        assert [bucket.borrow() for _ in range(3)] == pytest.approx([0, 0.25, 0.5])
+
+
+def _limiter(rate=1000.0, burst=1000.0, **limits) -> UpstreamLimiter:
+    defaults = {
+        "stream": EndpointLimits(4, 0.2, 0),
+        "search": EndpointLimits(4, 0.05, 2),
+    }
+    defaults.update(limits)
+    return UpstreamLimiter(TokenBucket(rate, burst), defaults)
+
+
+class TestUpstreamLimiter:
+    """Тесты UpstreamLimiter."""
+
+    async def test_concurrency_limit_sheds(self):
+        limiter = _limiter(search=EndpointLimits(1, 0.05, 0))
+        shed = requests_shed.value(endpoint="search", reason="concurrency")
+
+        async with limiter.slot("search"):
+            with pytest.raises(Overloaded) as exc_info:
+                async with limiter.slot("search"):
+                    pass
+        assert exc_info.value.reason == "concurrency"
+        assert requests_shed.value(endpoint="search", reason="concurrency") == shed + 1
+
+        # Слот освобожден
+        async with limiter.slot("search"):
+            pass
+
+    async def test_waits_for_slot_within_budget(self):
+        limiter = _limiter(stream=EndpointLimits(1, 1.0, 0))
+        waits = upstream_wait_seconds.count(endpoint="stream")
+
+        async def hold():
+            async with limiter.slot("stream"):
+                await asyncio.sleep(0.05)
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        async with limiter.slot("stream"):
+            pass
+        await holder
+        assert upstream_wait_seconds.count(endpoint="stream") == waits + 2
+
+    async def test_rate_shed_is_fast(self):
+        """Если токен по оценке не появится за бюджет, отказ без ожидания."""
+        limiter = _limiter(rate=1, burst=1, stream=EndpointLimits(4, 0.5, 0))
+        async with limiter.slot("stream"):
+            pass
+
+        started = time.monotonic()
+        with pytest.raises(Overloaded) as exc_info:
+            async with limiter.slot("stream"):
+                pass
+        assert time.monotonic() - started < 0.1
+        assert exc_info.value.reason == "rate"
+        assert exc_info.value.retry_after == 1
+
+    async def test_stream_has_priority_over_search(self):
+        """Когда токенов мало, поиск отклоняется, а поток еще проходит."""
+        limiter = _limiter(rate=1, burst=3)
+        async with limiter.slot("search"):
+            pass
+
+        with pytest.raises(Overloaded):
+            async with limiter.slot("search"):
+                pass
+        async with limiter.slot("stream"):
+            pass
+        async with limiter.slot("stream"):
+            pass
+
+
+class TestOverloadedEndpoints:
+    """Перегрузка источника -> 503 с Retry-After."""
+
+    async def test_stream_overloaded(self, monkeypatch):
+        limiter = _limiter(rate=1, burst=1, stream=EndpointLimits(4, 0.1, 0))
+        monkeypatch.setattr(utils, "upstream_limiter", limiter)
+        limiter.bucket.borrow()
+        track = MagicMock(trackId="100:1")
+        track.get_download_info_async = AsyncMock(return_value=[])
+        utils.track_cache.set("100", track)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await main.stream_track("100", range_header=None, quality=None)
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers["Retry-After"] == "1"
+        track.get_download_info_async.assert_not_called()
+
+    async def test_search_overloaded(self, monkeypatch):
+        limiter = _limiter(rate=1, burst=1)
+        monkeypatch.setattr(utils, "upstream_limiter", limiter)
+        client = MagicMock()
+        client.search = AsyncMock()
+        monkeypatch.setattr(utils, "client", client)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await main.search_tracks("overloaded", limit=5)
+        assert exc_info.value.status_code == 503
+        client.search.assert_not_called()
@@ -0,0 +1,50 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import main
+
+
+def _track(track_id: int, title: str) -> MagicMock:
+    track = MagicMock(id=track_id, title=title, duration_ms=180000)
+    track.artists = [MagicMock()]
+    track.artists[0].name = "Artist"
+    return track
+
+
+class TestSearchCache:
+    """Кэш ответов /search/."""
+
+    async def test_repeated_query_served_from_cache(self):
+        """Повтор запроса (с другим регистром и пробелами) не идет в API."""
+        tracks = [_track(1, "Blinding Lights"), _track(2, "Save Your Tears")]
+        with patch("main.find_tracks_by_name", AsyncMock(return_value=tracks)) as find:
+            first = await main.search_tracks("The Weeknd Blinding Lights", limit=5)
+            second = await main.search_tracks("the weeknd  blinding lights ", limit=5)
+
+        assert first == second
+        assert [item["id"] for item in first["results"]] == [1, 2]
+        find.assert_called_once()
+
+    async def test_limit_is_part_of_key(self):
+        """Разный limit — разные записи кэша."""
+        tracks = [_track(1, "A"), _track(2, "B")]
+        with patch("main.find_tracks_by_name", AsyncMock(return_value=tracks)) as find:
+            one = await main.search_tracks("query", limit=1)
+            two = await main.search_tracks("query", limit=2)
+
+        assert len(one["results"]) == 1
+        assert len(two["results"]) == 2
+        assert find.call_count == 2
+
+
+class TestMetricsEndpoint:
+    """Тесты /metrics."""
+
+    async def test_metrics_include_cache_counters(self):
+        """Метрики кэшей отдаются в формате Prometheus."""
+        with patch("main.find_tracks_by_name", AsyncMock(return_value=[_track(1, "A")])):
+            await main.search_tracks("metrics query", limit=5)
+            await main.search_tracks("metrics query", limit=5)
+
+        response = await main.metrics_endpoint()
+        body = response.body.decode()
+        assert 'audio_receiver_cache_requests_total{cache="search",result="hit"}' in body
@@ -0,0 +1,110 @@
+from mp3_index import (
+    build_index, byte_range_for_window, find_first_frame, id3v2_size, parse_frame_header, time_to_byte
+)
+
+FRAME_SECONDS = 1152 / 44100
+
+
+def _frame(bitrate_index: int, payload: bytes = b"") -> bytes:
+    """Кадр MPEG-1 Layer III 44.1 кГц стерео с нулевыми данными."""
+    header = bytes([0xFF, 0xFB, bitrate_index << 4, 0x00])
+    length = parse_frame_header(header, 0).frame_length
+    return header + (payload + bytes(length))[:length - 4]
+
+
+def _id3(size: int) -> bytes:
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x04\x00\x00" + syncsafe + bytes(size)
+
+
+def _vbr_file() -> tuple[bytes, list[int]]:
+    """
+    VBR-файл: 200 тихих кадров 32 кбит/с, затем 200 кадров 320 кбит/с,
+    с заголовком Xing. Возвращает файл и смещения начал кадров.
+    """
+    frames = [_frame(1)] * 200 + [_frame(14)] * 200
+    xing_length = len(_frame(9))
+    offsets, position = [], xing_length
+    for frame in frames:
+        offsets.append(position)
+        position += len(frame)
+    audio_bytes = position
+    duration = len(frames) * FRAME_SECONDS
+    toc = bytes(
+        min(255, offsets[min(int(i / 100 * duration / FRAME_SECONDS), len(frames) - 1)] * 256 // audio_bytes)
+        for i in range(100)
+    )
+    side_info = bytes(32)
+    xing = b"Xing" + (7).to_bytes(4, "big") + len(frames).to_bytes(4, "big") + audio_bytes.to_bytes(4, "big") + toc
+    tag = _id3(100)
+    data = tag + _frame(9, side_info + xing) + b"".join(frames)
+    return data, [len(tag) + offset for offset in offsets]
+
+
+class TestFrames:
+    """Разбор заголовков."""
+
+    def test_frame_header(self):
+        """Битрейт, частота и длина кадра."""
+        header = parse_frame_header(_frame(9), 0)
+        assert header.bitrate == 128
+        assert header.sample_rate == 44100
+        assert header.frame_length == 417
+
+    def test_not_a_frame(self):
+        """Не кадр — None."""
+        assert parse_frame_header(b"\xff\xff\xff\xff", 0) is None
+        assert parse_frame_header(b"RIFF", 0) is None
+
+    def test_id3v2_size(self):
+        """Размер тега ID3v2 с заголовком."""
+        assert id3v2_size(_id3(1000)) == 1010
+        assert id3v2_size(_frame(9)) == 0
+
+    def test_first_frame_skips_false_sync(self):
+        """Одиночный байт синхронизации в мусоре не принимается за кадр."""
+        data = b"\x00\xff\xfb\x90\x00\x00" + _frame(9) + _frame(9)
+        offset, header = find_first_frame(data)
+        assert offset == 6
+        assert header.bitrate == 128
+
+
+class TestIndex:
+    """Перевод времени в смещение."""
+
+    def test_cbr_by_bitrate(self):
+        """Без Xing смещение считается по битрейту и длительности трека."""
+        data = _id3(50) + b"".join([_frame(9)] * 500)
+        head_offset = id3v2_size(data)
+        index = build_index(data[head_offset:head_offset + 16384], head_offset, len(data), 500 * FRAME_SECONDS)
+
+        assert index.toc is None
+        assert index.audio_offset == 60
+        assert abs(index.bitrate - 128) <= 1
+        expected = 60 + 250 * 417
+        assert abs(time_to_byte(index, 250 * FRAME_SECONDS) - expected) < 417 * 3
+
+    def test_vbr_by_toc(self):
+        """Для VBR оглавление Xing точнее среднего битрейта."""
+        data, offsets = _vbr_file()
+        head_offset = id3v2_size(data)
+        index = build_index(data[head_offset:head_offset + 16384], head_offset, len(data), 0)
+
+        assert index.toc is not None
+        assert abs(index.duration - 400 * FRAME_SECONDS) < 0.01
+        seconds = 300 * FRAME_SECONDS
+        by_toc = time_to_byte(index, seconds)
+        by_bitrate = time_to_byte(index._replace(toc=None), seconds)
+        assert abs(by_toc - offsets[300]) < 0.02 * len(data)
+        assert abs(by_bitrate - offsets[300]) > 0.1 * len(data)
+
+    def test_byte_range_with_margin(self):
+        """Диапазон с запасом; конец трека — до последнего байта."""
+        data = b"".join([_frame(9)] * 500)
+        index = build_index(data[:16384], 0, len(data), 500 * FRAME_SECONDS)
+
+        first, last = byte_range_for_window(index, 5, 8, margin=1)
+        assert first == time_to_byte(index, 4)
+        assert last == time_to_byte(index, 9) - 1
+        assert byte_range_for_window(index, 5, 13, margin=1)[1] == len(data) - 1
+        assert byte_range_for_window(index, 0, 3, margin=1)[0] == 0
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from single_flight import IncompleteDownload, SharedDownload, SingleFlight, single_flight_calls
+
+
+class TestSingleFlight:
+    """Тесты SingleFlight."""
+
+    async def test_concurrent_calls_share_one_request(self):
+        flights = SingleFlight("test")
+        calls = []
+        release = asyncio.Event()
+
+        async def fetch():
+            calls.append(1)
+            await release.wait()
+            return "value"
+
+        waiters = [asyncio.create_task(flights.run("key", fetch)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await asyncio.gather(*waiters) == ["value"] * 5
+        assert len(calls) == 1
+        assert len(flights) == 0
+
+    async def test_exception_shared_and_not_remembered(self):
+        flights = SingleFlight("test")
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(*(flights.run("key", fetch) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert len(calls) == 1
+
+        # Следующий вызов — новый запрос
+        with pytest.raises(RuntimeError):
+            await flights.run("key", fetch)
+        assert len(calls) == 2
+
+    async def test_different_keys_not_shared(self):
+        flights = SingleFlight("test")
+
+        async def fetch(value):
+            await asyncio.sleep(0)
+            return value
+
+        assert await asyncio.gather(flights.run("a", lambda: fetch(1)), flights.run("b", lambda: fetch(2))) == [1, 2]
+
+    async def test_cancelled_leader_does_not_cancel_followers(self):
+        flights = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return "value"
+
+        followers = single_flight_calls.value(operation="test", role="follower")
+        leader = asyncio.create_task(flights.run("key", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.run("key", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        release.set()
+
+        assert await follower == "value"
+        assert single_flight_calls.value(operation="test", role="follower") == followers + 1
+
+
+class TestSharedDownload:
+    """Тесты SharedDownload."""
+
+    async def _collect(self, download: SharedDownload) -> bytes:
+        return b"".join([chunk async for chunk in download.follow(chunk_size=4, timeout=1)])
+
+    async def test_reader_follows_writer(self, tmp_path):
+        path = tmp_path / "partial"
+        download = SharedDownload()
+        download.start(str(path), total=10, codec="mp3")
+
+        with open(path, "wb", buffering=0) as f:
+            f.write(b"01234")
+            download.advance(5)
+            reader = asyncio.create_task(self._collect(download))
+            await asyncio.sleep(0)
+            f.write(b"56789")
+            download.advance(5)
+            download.finish(True)
+
+        assert await reader == b"0123456789"
+
+    async def test_failed_download_reports_position(self, tmp_path):
+        path = tmp_path / "partial"
+        path.write_bytes(b"012")
+        download = SharedDownload()
+        download.start(str(path), total=10, codec="mp3")
+        download.advance(3)
+        download.finish(False)
+
+        received = b""
+        with pytest.raises(IncompleteDownload) as exc_info:
+            async for chunk in download.follow(chunk_size=4, timeout=1):
+                received += chunk
+        assert received == b"012"
+        assert exc_info.value.position == 3
+
+    async def test_stalled_download_times_out(self, tmp_path):
+        path = tmp_path / "partial"
+        path.write_bytes(b"")
+        download = SharedDownload()
+        download.start(str(path), total=10, codec="mp3")
+
+        with pytest.raises(IncompleteDownload):
+            async for _ in download.follow(chunk_size=4, timeout=0.01):
+                pass
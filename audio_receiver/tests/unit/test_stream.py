@@ -0,0 +1,411 @@
+import asyncio
+import tracemalloc
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import audio_receiver_utils as utils
+import main
+from tests.unit.test_mp3_index import FRAME_SECONDS, _frame, _id3
+
+TRACK_SIZE = 32 * 1024 * 1024
+UPSTREAM_CHUNK = 64 * 1024
+# Файл для источника, который поддерживает Range: ID3v2 и 500 кадров 128 кбит/с
+RANGED_FILE = _id3(5000) + b"".join([_frame(9)] * 500)
+
+
+class FakeUpstreamBody(httpx.AsyncByteStream):
+    """Тело файла, которое отдается кусками и нигде не хранится целиком."""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    async def __aiter__(self):
+        sent = 0
+        while sent < self.size:
+            chunk = min(UPSTREAM_CHUNK, self.size - sent)
+            sent += chunk
+            yield b"\xff" * chunk
+
+
+def _ranged_response(request: httpx.Request) -> httpx.Response:
+    total = len(RANGED_FILE)
+    byte_range = request.headers.get("range")
+    if byte_range is None:
+        return httpx.Response(200, headers={"Content-Length": str(total)}, content=RANGED_FILE)
+    try:
+        start, end = utils.parse_byte_range(byte_range, total)
+    except ValueError:
+        return httpx.Response(416, headers={"Content-Range": f"bytes */{total}"})
+    return httpx.Response(
+        206,
+        headers={"Content-Range": f"bytes {start}-{end}/{total}", "Content-Length": str(end - start + 1)},
+        content=RANGED_FILE[start:end + 1]
+    )
+
+
+def _fake_upstream(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/missing.mp3":
+        return httpx.Response(404)
+    if request.url.path == "/expired.mp3":
+        return httpx.Response(403)
+    if request.url.path == "/ranged.mp3":
+        return _ranged_response(request)
+    return httpx.Response(
+        200,
+        headers={"Content-Length": str(TRACK_SIZE), "Content-Type": "audio/mpeg"},
+        stream=FakeUpstreamBody(TRACK_SIZE)
+    )
+
+
+def _track(direct_link: str) -> MagicMock:
+    download_info = MagicMock(codec="mp3", bitrate_in_kbps=128)
+    download_info.get_direct_link_async = AsyncMock(return_value=direct_link)
+    track = MagicMock(trackId="42:1", duration_ms=int(500 * FRAME_SECONDS * 1000))
+    track.get_download_info_async = AsyncMock(return_value=[download_info])
+    return track
+
+
+@pytest.fixture
+async def fake_upstream():
+    await utils.init_http_client(transport=httpx.MockTransport(_fake_upstream))
+    yield
+    await utils.close_http_client()
+
+
+class TestStreamTrack:
+    """Проксирование /track/{id}/stream."""
+
+    async def test_streams_with_bounded_memory(self, fake_upstream):
+        """Файл отдается кусками, память не зависит от размера файла."""
+        utils.track_cache.set("42", _track("http://upstream/track.mp3"))
+
+        tracemalloc.start()
+        try:
+            response = await main.stream_track("42", range_header=None, quality=None)
+            received = 0
+            async for chunk in response.body_iterator:
+                received += len(chunk)
+                assert len(chunk) <= utils.STREAM_CHUNK_SIZE
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        await response.background()
+
+        assert received == TRACK_SIZE
+        assert response.headers["content-length"] == str(TRACK_SIZE)
+        assert peak < 4 * 1024 * 1024
+
+    async def test_upstream_error_is_bad_gateway(self, fake_upstream):
+        """Ошибка прямой ссылки — 502."""
+        utils.track_cache.set("43", _track("http://upstream/missing.mp3"))
+
+        with pytest.raises(HTTPException) as error:
+            await main.stream_track("43", range_header=None, quality=None)
+        assert error.value.status_code == 502
+
+    async def test_track_without_download_info(self, fake_upstream):
+        """Трек без вариантов скачивания — 404."""
+        track = MagicMock()
+        track.get_download_info_async = AsyncMock(return_value=None)
+        utils.track_cache.set("44", track)
+
+        with pytest.raises(HTTPException) as error:
+            await main.stream_track("44", range_header=None, quality=None)
+        assert error.value.status_code == 404
+
+
+async def _read(response) -> bytes:
+    data = b"".join([chunk async for chunk in response.body_iterator])
+    if response.background is not None:
+        await response.background()
+    return data
+
+
+class TestStreamRange:
+    """Запросы Range к /track/{id}/stream."""
+
+    async def test_range_proxied_to_upstream(self, fake_upstream):
+        """Источник поддерживает Range: 206 и его Content-Range."""
+        utils.track_cache.set("50", _track("http://upstream/ranged.mp3"))
+
+        response = await main.stream_track("50", range_header="bytes=100-199", quality=None)
+
+        assert response.status_code == 206
+        assert response.headers["content-range"] == f"bytes 100-199/{len(RANGED_FILE)}"
+        assert await _read(response) == RANGED_FILE[100:200]
+
+    async def test_range_cut_from_full_stream(self, fake_upstream):
+        """Источник отдает файл целиком: фрагмент вырезается из потока."""
+        utils.track_cache.set("51", _track("http://upstream/track.mp3"))
+        start = UPSTREAM_CHUNK * 3 + 10
+
+        response = await main.stream_track("51", range_header=f"bytes={start}-{start + 99999}", quality=None)
+
+        assert response.status_code == 206
+        assert response.headers["content-range"] == f"bytes {start}-{start + 99999}/{TRACK_SIZE}"
+        assert response.headers["content-length"] == "100000"
+        assert len(await _read(response)) == 100000
+
+    async def test_unsatisfiable_range(self, fake_upstream):
+        """Диапазон за концом файла — 416."""
+        utils.track_cache.set("52", _track("http://upstream/track.mp3"))
+
+        with pytest.raises(HTTPException) as error:
+            await main.stream_track("52", range_header=f"bytes={TRACK_SIZE}-", quality=None)
+        assert error.value.status_code == 416
+        assert error.value.headers["Content-Range"] == f"bytes */{TRACK_SIZE}"
+
+
+class TestParseByteRange:
+    """Тесты parse_byte_range."""
+
+    def test_forms(self):
+        """Закрытый, открытый и суффиксный диапазоны."""
+        assert utils.parse_byte_range("bytes=0-99", 1000) == (0, 99)
+        assert utils.parse_byte_range("bytes=900-", 1000) == (900, 999)
+        assert utils.parse_byte_range("bytes=-100", 1000) == (900, 999)
+        assert utils.parse_byte_range("bytes=500-5000", 1000) == (500, 999)
+
+    def test_unsupported_and_invalid(self):
+        """Несколько диапазонов не поддерживаются, диапазон вне файла — ошибка."""
+        assert utils.parse_byte_range("bytes=0-1,5-6", 1000) is None
+        assert utils.parse_byte_range("items=0-1", 1000) is None
+        with pytest.raises(ValueError):
+            utils.parse_byte_range("bytes=1000-", 1000)
+
+
+class TestByteRangeEndpoint:
+    """Тесты /track/{id}/byte_range."""
+
+    async def test_window_to_range(self, fake_upstream):
+        """Отрезок переводится в диапазон, который затем отдает /stream."""
+        utils.track_cache.set("60", _track("http://upstream/ranged.mp3"))
+
+        result = await main.track_byte_range("60", start=5, end=8, margin=1, quality=None)
+
+        audio_offset = 5010
+        assert result["method"] == "bitrate"
+        assert abs(result["bitrate"] - 128) <= 1
+        assert abs(result["start"] - (audio_offset + 4 * 16000)) < 1000
+        assert abs(result["end"] - (audio_offset + 9 * 16000)) < 1000
+        assert result["total"] == len(RANGED_FILE)
+
+        response = await main.stream_track("60", range_header=result["range"], quality=None)
+        assert len(await _read(response)) == result["end"] - result["start"] + 1
+
+    async def test_index_is_cached(self, fake_upstream):
+        """Индекс файла строится один раз."""
+        utils.track_cache.set("61", _track("http://upstream/ranged.mp3"))
+        await main.track_byte_range("61", start=1, end=2, margin=0, quality=None)
+
+        with patch("audio_receiver_utils.read_track_bytes") as read:
+            await main.track_byte_range("61", start=3, end=4, margin=0, quality=None)
+        read.assert_not_called()
+
+
+class TestStreamDiskCache:
+    """Дисковый кэш /track/{id}/stream и /track/{id}/cover."""
+
+    async def test_second_request_served_from_disk(self, fake_upstream):
+        """Полностью скачанный трек отдается с диска, Range — из файла."""
+        utils.track_cache.set("70", _track("http://upstream/ranged.mp3"))
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await client.get("/track/70/stream")
+            assert first.content == RANGED_FILE
+            assert main.audio_cache.get("70:best") is not None
+
+            with patch("main.open_track_audio") as upstream:
+                second = await client.get("/track/70/stream")
+                partial = await client.get("/track/70/stream", headers={"Range": "bytes=10-19"})
+            upstream.assert_not_called()
+
+        assert second.content == RANGED_FILE
+        assert partial.status_code == 206
+        assert partial.content == RANGED_FILE[10:20]
+
+    async def test_partial_download_not_cached(self, fake_upstream):
+        """Запросы Range не сохраняются в кэш."""
+        utils.track_cache.set("71", _track("http://upstream/ranged.mp3"))
+
+        response = await main.stream_track("71", range_header="bytes=0-99", quality=None)
+        await _read(response)
+
+        assert main.audio_cache.size("71:best") is None
+
+    async def test_cover_cached(self):
+        """Обложка скачивается один раз."""
+        track = MagicMock()
+        track.download_cover_bytes_async = AsyncMock(return_value=b"cover-bytes")
+        utils.track_cache.set("72", track)
+
+        first = await main.get_track_cover_image("72")
+        second = await main.get_track_cover_image("72")
+
+        assert first.body == b"cover-bytes"
+        assert second.path == main.cover_cache.get("72")
+        track.download_cover_bytes_async.assert_called_once()
+
+
+class TestDirectLinkCache:
+    """Кэш download info и прямых ссылок."""
+
+    async def test_link_reused_between_requests(self, fake_upstream):
+        """Повторные запросы не запрашивают download info и ссылку."""
+        track = _track("http://upstream/ranged.mp3")
+        utils.track_cache.set("80", track)
+        avoided = utils.round_trips_avoided.value(call="direct_link")
+
+        for byte_range in ("bytes=0-9", "bytes=10-19", "bytes=20-29"):
+            await _read(await main.stream_track("80", range_header=byte_range, quality=None))
+
+        track.get_download_info_async.assert_called_once()
+        track.get_download_info_async.return_value[0].get_direct_link_async.assert_called_once()
+        assert utils.round_trips_avoided.value(call="direct_link") == avoided + 2
+
+    async def test_forbidden_link_is_refreshed(self, fake_upstream):
+        """403 от CDN: ссылка забывается и запрашивается заново."""
+        track = _track("http://upstream/expired.mp3")
+        get_direct_link = track.get_download_info_async.return_value[0].get_direct_link_async
+        get_direct_link.side_effect = ["http://upstream/expired.mp3", "http://upstream/ranged.mp3"]
+        utils.track_cache.set("81", track)
+
+        response = await main.stream_track("81", range_header="bytes=0-9", quality=None)
+
+        assert response.status_code == 206
+        assert await _read(response) == RANGED_FILE[:10]
+        assert get_direct_link.call_count == 2
+        assert track.get_download_info_async.call_count == 2
+
+
+class TestStreamQuality:
+    """Параметр quality у /track/{id}/stream."""
+
+    def _track(self) -> MagicMock:
+        links = {320: "http://upstream/track.mp3", 128: "http://upstream/ranged.mp3"}
+        infos = []
+        for bitrate, link in links.items():
+            info = MagicMock(codec="mp3", bitrate_in_kbps=bitrate)
+            info.get_direct_link_async = AsyncMock(return_value=link)
+            infos.append(info)
+        track = MagicMock(trackId="90:1")
+        track.get_download_info_async = AsyncMock(return_value=infos)
+        return track
+
+    async def test_circle_downloads_smaller_variant(self, fake_upstream):
+        """circle берет 128 кбит/с, байты учитываются по политике."""
+        utils.track_cache.set("90", self._track())
+        circle = utils.stream_bytes.value(quality="circle", source="upstream")
+        best = utils.stream_bytes.value(quality="best", source="upstream")
+
+        response = await main.stream_track("90", range_header=None, quality="circle")
+
+        assert response.media_type == "audio/mpeg"
+        assert await _read(response) == RANGED_FILE
+        assert utils.stream_bytes.value(quality="circle", source="upstream") == circle + len(RANGED_FILE)
+        assert utils.stream_bytes.value(quality="best", source="upstream") == best
+
+    async def test_policies_cached_separately(self, fake_upstream):
+        """Файл, скачанный для circle, не отдается вместо best."""
+        utils.track_cache.set("91", self._track())
+        await _read(await main.stream_track("91", range_header=None, quality="circle"))
+        cached = utils.stream_bytes.value(quality="circle", source="cache")
+
+        response = await main.stream_track("91", range_header=None, quality="circle")
+        assert response.path == main.audio_cache.get("91:circle")
+        assert utils.stream_bytes.value(quality="circle", source="cache") == cached + len(RANGED_FILE)
+        assert main.audio_cache.get("91:best") is None
+
+    async def test_unknown_quality(self):
+        with pytest.raises(HTTPException) as exc_info:
+            await main.stream_track("92", range_header=None, quality="lossless")
+        assert exc_info.value.status_code == 400
+
+
+class TestSingleFlight:
+    """Одновременные запросы одного трека и обложки."""
+
+    async def test_concurrent_streams_share_download(self, fake_upstream):
+        """Второй запрос читает файл, который пишет первый; источник открыт один раз."""
+        utils.track_cache.set("110", _track("http://upstream/ranged.mp3"))
+        calls = []
+        original = utils.open_track_stream
+
+        async def counting_open(*args, **kwargs):
+            calls.append(args)
+            return await original(*args, **kwargs)
+
+        with patch("audio_receiver_utils.open_track_stream", counting_open):
+            leader = await main.stream_track("110", range_header=None, quality=None)
+            follower = await main.stream_track("110", range_header=None, quality=None)
+            leader_body, follower_body = await asyncio.gather(_read(leader), _read(follower))
+
+        assert leader_body == follower_body == RANGED_FILE
+        assert follower.headers["content-length"] == str(len(RANGED_FILE))
+        assert len(calls) == 1
+        assert main.audio_cache.get("110:best") is not None
+        assert not utils.audio_downloads
+
+    async def test_follower_resumes_when_leader_disconnects(self, fake_upstream):
+        """Первый клиент отключился: второй докачивает остаток с Range."""
+        utils.track_cache.set("111", _track("http://upstream/ranged.mp3"))
+        leader = await main.stream_track("111", range_header=None, quality=None)
+        follower = await main.stream_track("111", range_header=None, quality=None)
+
+        await leader.body_iterator.__anext__()
+        await leader.body_iterator.aclose()
+        await leader.background()
+
+        assert await _read(follower) == RANGED_FILE
+        assert main.audio_cache.size("111:best") is None
+        assert not utils.audio_downloads
+
+    async def test_range_requests_not_shared(self, fake_upstream):
+        utils.track_cache.set("112", _track("http://upstream/ranged.mp3"))
+        leader = await main.stream_track("112", range_header=None, quality=None)
+
+        partial = await main.stream_track("112", range_header="bytes=0-9", quality=None)
+        assert partial.status_code == 206
+        assert await _read(partial) == RANGED_FILE[:10]
+        assert await _read(leader) == RANGED_FILE
+
+    async def test_concurrent_covers_share_download(self):
+        release = asyncio.Event()
+
+        async def download_cover(size):
+            await release.wait()
+            return b"cover-bytes"
+
+        track = MagicMock()
+        track.download_cover_bytes_async = AsyncMock(side_effect=download_cover)
+        utils.track_cache.set("113", track)
+
+        requests = [asyncio.create_task(main.get_track_cover_image("113")) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        responses = await asyncio.gather(*requests)
+
+        assert [response.body for response in responses] == [b"cover-bytes"] * 3
+        track.download_cover_bytes_async.assert_called_once()
+
+    async def test_concurrent_track_info_shares_request(self, monkeypatch):
+        release = asyncio.Event()
+        track = MagicMock()
+
+        async def tracks(track_id):
+            await release.wait()
+            return [track]
+
+        client = MagicMock()
+        client.tracks = AsyncMock(side_effect=tracks)
+        monkeypatch.setattr(utils, "client", client)
+
+        requests = [asyncio.create_task(utils.get_track_info("114")) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await asyncio.gather(*requests) == [track] * 3
+        client.tracks.assert_called_once_with("114")
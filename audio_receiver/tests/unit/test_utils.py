@@ -1,7 +1,13 @@
+import os
+import subprocess
+import sys
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 import audio_receiver_utils as utils
 
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 
 class TestInitClient:
     """Тесты init_client."""
@@ -128,55 +134,67 @@ class TestGetTrackCover:
         mock_track.download_cover_bytes_async.assert_called_once_with(size="200x200")
 
 
-class TestGetTrackBytes:
-    """Тесты get_track_bytes."""
+def _track_with_variants(*variants) -> MagicMock:
+    infos = []
+    for codec, bitrate in variants:
+        info = MagicMock(codec=codec, bitrate_in_kbps=bitrate)
+        info.get_direct_link_async = AsyncMock(return_value=f"http://upstream/{codec}-{bitrate}")
+        infos.append(info)
+    track = MagicMock()
+    track.get_download_info_async = AsyncMock(return_value=infos)
+    return track
 
-    async def test_success(self):
-        """Успешное получение байтов трека."""
-        mock_track = MagicMock()
-        mock_download_info = MagicMock()
-        mock_download_info.codec = "mp3"
-        mock_download_info.bitrate_in_kbps = 192
 
-        mock_track.get_download_info_async = AsyncMock(return_value=[mock_download_info])
-        mock_track.download_bytes_async = AsyncMock(return_value=b"audio_bytes")
+class TestGetTrackLinkQuality:
+    """Выбор варианта файла политикой качества в get_track_link."""
 
-        result = await utils.get_track_bytes(mock_track)
-        assert result == b"audio_bytes"
-        mock_track.download_bytes_async.assert_called_once_with("mp3", 192)
+    async def _link(self, variants, quality):
+        link = await utils.get_track_link(_track_with_variants(*variants), quality)
+        return link.codec, link.bitrate
 
-    async def test_no_download_info(self):
-        """download_info_list is None → возвращает None."""
-        mock_track = MagicMock()
-        mock_track.get_download_info_async = AsyncMock(return_value=None)
+    async def test_best_takes_highest_bitrate(self):
+        variants = (("aac", 64), ("mp3", 192), ("mp3", 320), ("aac", 320))
+        assert await self._link(variants, "best") == ("mp3", 320)
 
-        result = await utils.get_track_bytes(mock_track)
-        assert result is None
+    async def test_circle_takes_smallest_enough_bitrate(self):
+        """Наименьший битрейт не ниже цели; при равенстве — кодек раньше в CIRCLE_CODECS."""
+        variants = (("mp3", 320), ("aac", 128), ("mp3", 192), ("mp3", 128), ("aac", 64))
+        assert await self._link(variants, "circle") == ("mp3", 128)
 
-    async def test_download_bytes_error(self):
-        """Ошибка при скачивании байтов трека."""
-        mock_track = MagicMock()
-        mock_download_info = MagicMock()
-        mock_download_info.codec = "mp3"
-        mock_download_info.bitrate_in_kbps = 320
+    async def test_circle_falls_back_to_highest_below_target(self):
+        assert await self._link((("aac", 64), ("mp3", 96)), "circle") == ("mp3", 96)
 
-        mock_track.get_download_info_async = AsyncMock(return_value=[mock_download_info])
-        mock_track.download_bytes_async = AsyncMock(side_effect=Exception("Download failed"))
+    async def test_circle_ignores_other_codecs_when_preferred_exist(self):
+        assert await self._link((("flac", 128), ("mp3", 320)), "circle") == ("mp3", 320)
 
-        with pytest.raises(Exception, match="Download failed"):
-            await utils.get_track_bytes(mock_track)
+    async def test_circle_without_preferred_codecs(self):
+        assert await self._link((("flac", 1000), ("flac", 700)), "circle") == ("flac", 700)
+
+    async def test_link_points_to_selected_variant(self):
+        link = await utils.get_track_link(_track_with_variants(("mp3", 320), ("aac", 128)), "circle")
+        assert link.url == "http://upstream/aac-128"
 
-    async def test_selects_first_download_info(self):
-        """Используется первый элемент из списка download_info."""
-        mock_track = MagicMock()
-        info_1 = MagicMock(codec="aac", bitrate_in_kbps=128)
-        info_2 = MagicMock(codec="mp3", bitrate_in_kbps=320)
 
-        mock_track.get_download_info_async = AsyncMock(return_value=[info_1, info_2])
-        mock_track.download_bytes_async = AsyncMock(return_value=b"data")
+class TestDefaultQuality:
+    """Проверка DEFAULT_QUALITY при импорте."""
 
-        await utils.get_track_bytes(mock_track)
-        mock_track.download_bytes_async.assert_called_once_with("aac", 128)
+    def _import_with(self, value: str) -> subprocess.CompletedProcess:
+        code = (
+            "import sys; from unittest.mock import MagicMock; "
+            "sys.modules['yandex_music'] = MagicMock(); import audio_receiver_utils"
+        )
+        env = dict(os.environ, YANDEX_MUSIC_API_TOKEN="fake_test_token", DEFAULT_QUALITY=value)
+        return subprocess.run(
+            [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True
+        )
+
+    def test_unknown_value_rejected(self):
+        result = self._import_with("hq")
+        assert result.returncode != 0
+        assert "DEFAULT_QUALITY" in result.stderr
+
+    def test_known_value_accepted(self):
+        assert self._import_with("circle").returncode == 0
 
 
 class TestFindTracksByNameExtra:
@@ -266,3 +284,61 @@ class TestGetTrackCoverExtra:
         result = await utils.get_track_cover(mock_track)
         assert result == b""
         mock_track.download_cover_bytes_async.assert_called_once_with(size="200x200")
+
+
+class TestTrackCache:
+    """Кэш объектов треков."""
+
+    async def test_repeated_info_hits_cache(self):
+        """/info, /cover и /stream одного трека — один запрос к API."""
+        mock_track = MagicMock(title="Cached")
+        mock_client = AsyncMock()
+        mock_client.tracks = AsyncMock(return_value=[mock_track])
+        utils.client = mock_client
+
+        for track_id in (12345, "12345", "12345"):
+            assert await utils.get_track_info(track_id) is mock_track
+        mock_client.tracks.assert_called_once_with(12345)
+
+    async def test_search_populates_cache(self):
+        """Треки из результатов поиска не запрашиваются повторно."""
+        mock_track = MagicMock(id=777, title="Found")
+        mock_search_result = MagicMock()
+        mock_search_result.tracks.results = [mock_track]
+
+        mock_client = AsyncMock()
+        mock_client.search = AsyncMock(return_value=mock_search_result)
+        utils.client = mock_client
+
+        await utils.find_tracks_by_name("found")
+        assert await utils.get_track_info("777") is mock_track
+        mock_client.tracks.assert_not_called()
+
+    async def test_expired_entry_is_refetched(self):
+        """Устаревшая запись запрашивается заново."""
+        mock_client = AsyncMock()
+        mock_client.tracks = AsyncMock(return_value=[MagicMock()])
+        utils.client = mock_client
+
+        await utils.get_track_info(1)
+        utils.track_cache.set("1", MagicMock(), ttl=0)
+        await utils.get_track_info(1)
+        assert mock_client.tracks.call_count == 2
+
+
+class TestDirectLinkTtl:
+    """Тесты direct_link_ttl."""
+
+    def test_default_ttl(self):
+        """Без срока в ссылке — DIRECT_LINK_TTL_SECONDS минус запас."""
+        with patch.object(utils, "DIRECT_LINK_TTL_SECONDS", 300), \
+                patch.object(utils, "DIRECT_LINK_EXPIRY_MARGIN_SECONDS", 30):
+            assert utils.direct_link_ttl("https://cdn/get-mp3/a/b/track.mp3") == 270
+
+    def test_expiry_from_link(self):
+        """Срок из параметра expires сокращает время жизни."""
+        with patch.object(utils, "DIRECT_LINK_TTL_SECONDS", 300), \
+                patch.object(utils, "DIRECT_LINK_EXPIRY_MARGIN_SECONDS", 30), \
+                patch("audio_receiver_utils.time.time", return_value=1000):
+            assert utils.direct_link_ttl("https://cdn/track.mp3?expires=1100") == 70
+            assert utils.direct_link_ttl("https://cdn/track.mp3?exp=1010") == 0
@@ -0,0 +1,65 @@
+import os
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+
+from . import config
+from .profiling import PROFILE_SUFFIXES, list_profiles
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """
+    Проверка служебного токена из заголовка X-Admin-Token.
+
+    Args:
+        x_admin_token: Значение заголовка.
+    """
+    if config.ADMIN_TOKEN is None:
+        raise HTTPException(status_code=404, detail="Служебные endpoint'ы отключены")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token.encode(), config.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Неверный служебный токен")
+
+
+admin_router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin_token)])
+
+
+@admin_router.get("/profiles")
+async def list_profiles_endpoint():
+    """
+    Список сохраненных профилей запросов (от новых к старым).
+    """
+    return {
+        "profiles": [
+            {
+                "id": profile_id,
+                "files": [
+                    f"{profile_id}{suffix}"
+                    for suffix in PROFILE_SUFFIXES
+                    if os.path.exists(os.path.join(config.PROFILE_DIR, profile_id + suffix))
+                ],
+            }
+            for profile_id in list_profiles()
+        ]
+    }
+
+
+@admin_router.get("/profiles/{file_name}")
+async def download_profile_endpoint(file_name: str):
+    """
+    Скачивание файла профиля (.prof для pstats/snakeviz или текстовый отчет .txt).
+
+    Args:
+        file_name: Имя файла из списка /admin/profiles.
+    """
+    profile_id, suffix = os.path.splitext(file_name)
+    if suffix not in PROFILE_SUFFIXES or profile_id not in list_profiles():
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+
+    path = os.path.join(config.PROFILE_DIR, file_name)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+
+    media_type = "text/plain; charset=utf-8" if suffix == ".txt" else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=file_name)
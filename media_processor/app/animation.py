@@ -0,0 +1,219 @@
+import os
+from threading import Lock, get_ident
+
+import ffmpeg
+import numpy as np
+
+from . import config
+from .cpu import encoder_threads
+from .ffmpeg_runner import FfmpegError, run_ffmpeg_command_sync
+from .images import decode_image
+from .templates import VinylTemplate, composite_layers, cover_hash, get_template
+from .workspace import JobWorkspace
+
+# Таблицы строятся для четверти оборота: остальные кадры получаются
+# поворотом исходника на 90 градусов (np.rot90 — точная перестановка пикселей)
+_QUARTER_TURNS = 4
+
+_tables: dict[tuple[int, int], np.ndarray] = {}
+_tables_lock = Lock()
+
+# Блокировка кодирования петли и число потоков, которые ее держат или ждут
+_loop_locks: dict[str, list] = {}
+_loop_locks_lock = Lock()
+
+
+def build_rotation_tables(size: int, frames_per_turn: int) -> np.ndarray:
+    """
+    Предрассчитывает таблицы переотображения (nearest neighbour) для
+    первой четверти оборота.
+
+    Args:
+        size: Сторона кадра в пикселях.
+        frames_per_turn: Число кадров на полный оборот (кратно 4).
+
+    Returns:
+        np.ndarray: Массив (frames_per_turn // 4, size * size) плоских индексов
+            исходного пикселя для каждого пикселя кадра.
+    """
+    if frames_per_turn % _QUARTER_TURNS:
+        raise ValueError("Число кадров на оборот должно быть кратно 4")
+
+    center = (size - 1) / 2
+    yy, xx = np.mgrid[0:size, 0:size].astype(np.float32)
+    dx, dy = xx - center, yy - center
+    # Пиксели вне пластинки не вращаются
+    outside = np.hypot(dx, dy) > size / 2
+    identity = (yy * size + xx).astype(np.int32)
+
+    steps = frames_per_turn // _QUARTER_TURNS
+    tables = np.empty((steps, size * size), dtype=np.int32)
+    for step in range(steps):
+        angle = 2 * np.pi * step / frames_per_turn
+        cos_a, sin_a = np.cos(angle), np.sin(angle)
+        src_x = np.clip(np.rint(center + dx * cos_a + dy * sin_a), 0, size - 1)
+        src_y = np.clip(np.rint(center - dx * sin_a + dy * cos_a), 0, size - 1)
+        table = (src_y * size + src_x).astype(np.int32)
+        table[outside] = identity[outside]
+        tables[step] = table.ravel()
+    return tables
+
+
+def get_rotation_tables(
+    size: int = config.FRAME_SIZE,
+    frames_per_turn: int = config.ANIMATION_FRAMES_PER_TURN
+) -> np.ndarray:
+    """Возвращает таблицы поворота, строя их при первом обращении."""
+    key = (size, frames_per_turn)
+    with _tables_lock:
+        if key not in _tables:
+            _tables[key] = build_rotation_tables(size, frames_per_turn)
+        return _tables[key]
+
+
+def iter_rotation_frames(record: np.ndarray, template: VinylTemplate, frames_per_turn: int):
+    """
+    Генерирует кадры одного оборота пластинки. Блик неподвижен и
+    накладывается поверх вращающейся пластинки.
+
+    Args:
+        record: Кадр пластинки без блика, uint8 (size, size, 3).
+        template: Шаблон с маской блика.
+        frames_per_turn: Число кадров на оборот.
+
+    Yields:
+        np.ndarray: Кадры uint8 (size, size, 3).
+    """
+    size = record.shape[0]
+    tables = get_rotation_tables(size, frames_per_turn)
+    keep = 1.0 - template.sheen_alpha
+    add = 255.0 * template.sheen_alpha
+
+    for quarter in range(_QUARTER_TURNS):
+        # Поворот исходника на quarter * 90 градусов в ту же сторону, что и таблицы
+        source = np.ascontiguousarray(np.rot90(record, k=-quarter)).reshape(-1, 3)
+        for table in tables:
+            rotated = source[table].reshape(size, size, 3)
+            yield (rotated * keep + add).astype(np.uint8)
+
+
+def encode_rotation_loop(cover_bytes: bytes, template_id: str, output_path: str) -> None:
+    """
+    Кодирует один бесшовный оборот пластинки в H.264 (один GOP, без B-кадров),
+    чтобы петлю можно было повторять через -stream_loop с -c:v copy.
+
+    Args:
+        cover_bytes: Байты обложки.
+        template_id: Идентификатор шаблона.
+        output_path: Путь к результату (.mp4).
+    """
+    template = get_template(template_id)
+    frames_per_turn = config.ANIMATION_FRAMES_PER_TURN
+    cover = decode_image(cover_bytes)
+    record = np.clip(composite_layers(cover, template, with_sheen=False), 0, 255).astype(np.uint8)
+
+    stream = (
+        ffmpeg
+        .input('pipe:', format='rawvideo', pix_fmt='rgb24',
+               s=f'{template.size}x{template.size}', framerate=config.ANIMATION_FPS)
+        .output(output_path, vcodec='libx264', threads=encoder_threads(), pix_fmt='yuv420p',
+                g=frames_per_turn, bf=0, movflags='+faststart')
+        .global_args('-loglevel', 'error')
+        .overwrite_output()
+    )
+    frames = (frame.tobytes() for frame in iter_rotation_frames(record, template, frames_per_turn))
+    try:
+        run_ffmpeg_command_sync(stream.compile(), stdin_chunks=frames)
+    except FfmpegError as e:
+        print("Ошибка при кодировании петли анимации:")
+        print(e.stderr_tail)
+        raise
+
+
+def _evict_old_loops() -> None:
+    """Удаляет самые давно использованные петли сверх лимита."""
+    cache_dir = config.ANIMATION_CACHE_DIR
+    loops = [
+        os.path.join(cache_dir, name)
+        for name in os.listdir(cache_dir)
+        if name.endswith('.mp4') and not name.endswith('.tmp.mp4')
+    ]
+    if len(loops) <= config.ANIMATION_CACHE_MAX_FILES:
+        return
+    loops.sort(key=os.path.getmtime)
+    for path in loops[:len(loops) - config.ANIMATION_CACHE_MAX_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def get_rotation_loop(cover_bytes: bytes, template_id: str) -> str:
+    """
+    Возвращает путь к закодированной петле вращения для обложки и шаблона.
+    Петля кодируется один раз, затем берется из дискового кэша.
+
+    Args:
+        cover_bytes: Байты обложки.
+        template_id: Идентификатор шаблона.
+
+    Returns:
+        str: Путь к .mp4 с одним оборотом пластинки.
+    """
+    key = (f"{cover_hash(cover_bytes)}_{template_id}_"
+           f"{config.FRAME_SIZE}_{config.ANIMATION_FRAMES_PER_TURN}_{config.ANIMATION_FPS}")
+    loop_path = os.path.join(config.ANIMATION_CACHE_DIR, f"{key}.mp4")
+
+    # Запись удаляется, только когда ее больше никто не ждет:
+    # иначе следующий запрос получил бы новую блокировку
+    with _loop_locks_lock:
+        entry = _loop_locks.setdefault(key, [Lock(), 0])
+        entry[1] += 1
+
+    # Один и тот же оборот не кодируется параллельно двумя запросами
+    encoded = False
+    try:
+        with entry[0]:
+            if os.path.exists(loop_path):
+                os.utime(loop_path)
+            else:
+                os.makedirs(config.ANIMATION_CACHE_DIR, exist_ok=True)
+                # Временное имя уникально: кэш может быть общим для нескольких процессов
+                tmp_path = f"{loop_path}.{os.getpid()}.{get_ident()}.tmp.mp4"
+                try:
+                    encode_rotation_loop(cover_bytes, template_id, tmp_path)
+                    os.replace(tmp_path, loop_path)
+                    encoded = True
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+    finally:
+        with _loop_locks_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _loop_locks[key]
+
+    if encoded:
+        _evict_old_loops()
+    return loop_path
+
+
+def link_rotation_loop(workspace: JobWorkspace, cover_bytes: bytes, template_id: str) -> str:
+    """
+    Петля вращения в рабочем каталоге задачи (ссылка на файл кэша):
+    вытеснение петли из кэша другим запросом не мешает рендеру,
+    который кодирует видео из нее в несколько проходов.
+
+    Args:
+        workspace: Рабочий каталог задачи.
+        cover_bytes: Байты обложки.
+        template_id: Идентификатор шаблона.
+
+    Returns:
+        str: Путь к петле в рабочем каталоге.
+    """
+    try:
+        return workspace.link("loop.mp4", get_rotation_loop(cover_bytes, template_id))
+    except FileNotFoundError:
+        # Петлю вытеснили между кодированием и ссылкой: закодировать заново
+        return workspace.link("loop.mp4", get_rotation_loop(cover_bytes, template_id))
@@ -1,12 +1,24 @@
-from fastapi import APIRouter, File, Form, UploadFile
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, File, Form, HTTPException, Query, Request, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from urllib.parse import quote_plus
 import io
 import os
 
-from .schemas import HTTPError
-from .services import trim_audio, create_video_from_audio_and_cover_files
-from .utils import validate_audio_content, validate_image_content, validate_audio_range, validate_audio_duration
+from . import config
+from .capacity import render_limiter
+from .metrics import render_metrics
+from .profiling import run_profiled
+from .schemas import HTTPError, SharedVideoRequest, VideoByReferenceRequest
+from .services import trim_audio, create_video_from_audio_and_cover_files, render_video_in_workspace, render_video_file
+from .shared import publish_file, resolve_shared_input, resolve_shared_output
+from .templates import PLAIN_TEMPLATE_ID
+from .uploads import has_cover, load_cover, read_limited_body, store_cover
+from .utils import validate_audio_content, validate_image_content, validate_audio_range, validate_audio_duration, validate_template, validate_animation
+from .utils import validate_fades
+from .utils import validate_audio_file, validate_audio_file_range, validate_image_bytes, validate_octet_stream
+from .upstream import TRACK_ID_PATTERN, fetch_track_audio, fetch_track_cover
+from .workspace import job_workspace
 
 router = APIRouter()
 
@@ -24,10 +36,20 @@ router = APIRouter()
                     }
                 }
             }
+        },
+        503: {
+            "model": HTTPError,
+            "description": "Service overloaded"
         }
     }
 )
-async def trim_audio_endpoint(file: UploadFile = File(...), start: int = Form(...), end: int = Form(...)):
+async def trim_audio_endpoint(
+    file: UploadFile = File(...),
+    start: int = Form(...),
+    end: int = Form(...),
+    fade_in: float = Form(0.0),
+    fade_out: float = Form(0.0)
+):
     """
     Endpoint для обрезки аудиофайла.
 
@@ -35,6 +57,8 @@ async def trim_audio_endpoint(file: UploadFile = File(...), start: int = Form(..
         file: Загружаемый аудиофайл.
         start: Начало отрезка в секундах (передается как Form-параметр).
         end: Конец отрезка в секундах (передается как Form-параметр).
+        fade_in: Плавное нарастание в начале отрезка, секунды.
+        fade_out: Плавное затухание в конце отрезка, секунды.
 
     Returns:
         StreamingResponse: HTTP-ответ с обрезанным аудиофайлом.
@@ -42,12 +66,14 @@ async def trim_audio_endpoint(file: UploadFile = File(...), start: int = Form(..
 
     # Проверка корректности параметров start и end
     validate_audio_range(start, end)
+    validate_fades(fade_in, fade_out, end - start)
     # Проверка, что это действительно поддерживаемый аудиофайл
     contents = await validate_audio_content(file)
     # Проверка длительности файла в секундах
-    validate_audio_duration(contents, start, end)
+    await run_in_threadpool(validate_audio_duration, contents, start, end)
 
-    trimmed_audio_buffer = await trim_audio(contents, start, end)
+    async with render_limiter.slot():
+        trimmed_audio_buffer = await run_in_threadpool(trim_audio, contents, start, end, fade_in, fade_out)
     filename_base, ext = os.path.splitext(file.filename)
     output_filename = f"cut_{filename_base}_{start}_{end}.mp3"
     encoded_filename = quote_plus(output_filename)
@@ -72,12 +98,20 @@ async def trim_audio_endpoint(file: UploadFile = File(...), start: int = Form(..
                     }
                 }
             }
+        },
+        503: {
+            "model": HTTPError,
+            "description": "Service overloaded"
         }
     }
 )
 async def create_video_endpoint(
     audio_file: UploadFile = File(...),
-    image_file: UploadFile = File(...)
+    image_file: UploadFile = File(...),
+    template: str = Form(PLAIN_TEMPLATE_ID),
+    animated: bool = Form(False),
+    fade_in: float = Form(0.0),
+    fade_out: float = Form(0.0)
 ):
     """
     Endpoint для создания видео из аудио и обложки.
@@ -85,14 +119,32 @@ async def create_video_endpoint(
     Args:
         audio_file: Загружаемый аудиофайл.
         image_file: Загружаемый файл с изображением (обложка).
+        template: Шаблон оформления обложки ("cover" или "vinyl").
+        animated: Вращать пластинку (только для шаблона "vinyl").
+        fade_in: Плавное нарастание звука, секунды.
+        fade_out: Плавное затухание звука, секунды.
 
     Returns:
         StreamingResponse: HTTP-ответ с созданным видеофайлом.
     """
+    validate_template(template)
+    validate_animation(template, animated)
+    validate_fades(fade_in, fade_out)
     audio_content = await validate_audio_content(audio_file)
     image_content = await validate_image_content(image_file)
 
-    video_bytes = create_video_from_audio_and_cover_files(io.BytesIO(audio_content), io.BytesIO(image_content))
+    # Рендер выполняется в пуле потоков, чтобы event loop (и /health) не блокировался
+    async with render_limiter.slot():
+        video_bytes = await run_in_threadpool(
+            run_profiled,
+            create_video_from_audio_and_cover_files,
+            io.BytesIO(audio_content),
+            io.BytesIO(image_content),
+            template_id=template,
+            animated=animated,
+            fade_in=fade_in,
+            fade_out=fade_out
+        )
     filename_base_audio, _ = os.path.splitext(audio_file.filename)
     filename_base_image, _ = os.path.splitext(image_file.filename)
     output_filename = f"{filename_base_audio}_with_cover_{filename_base_image}.mp4"
@@ -101,3 +153,295 @@ async def create_video_endpoint(
         "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
     }
     return StreamingResponse(io.BytesIO(video_bytes), media_type="video/mp4", headers=headers)
+
+
+# --- Загрузка "сырым" телом (application/octet-stream) ---
+# Тело пишется в рабочий каталог по мере поступления, без разбора multipart,
+# параметры передаются в query. Обложка загружается отдельно и передается по хэшу.
+
+@router.post(
+    "/covers",
+    responses={
+        400: {"model": HTTPError, "description": "Invalid image"},
+        413: {"model": HTTPError, "description": "Image too large"},
+        415: {"model": HTTPError, "description": "Body is not application/octet-stream"}
+    }
+)
+async def upload_cover_endpoint(request: Request):
+    """
+    Загрузка обложки для последующих запросов /create_video/raw.
+
+    Args:
+        request: Запрос, тело которого — байты изображения (application/octet-stream).
+
+    Returns:
+        dict: Идентификатор обложки (sha1 содержимого).
+    """
+    validate_octet_stream(request)
+    cover_bytes = await read_limited_body(request, config.MAX_COVER_UPLOAD_BYTES)
+    validate_image_bytes(cover_bytes)
+    cover_id = await run_in_threadpool(store_cover, cover_bytes)
+    return {"cover_id": cover_id}
+
+
+@router.head("/covers/{cover_id}")
+async def cover_exists_endpoint(cover_id: str):
+    """
+    Проверка, что обложка уже загружена (клиент может посчитать sha1 сам
+    и не загружать обложку повторно).
+
+    Args:
+        cover_id: Идентификатор обложки.
+    """
+    if not has_cover(cover_id):
+        return Response(status_code=404)
+    return Response(status_code=200)
+
+
+@router.post(
+    "/trim_audio/raw",
+    response_model=None,
+    responses={
+        400: {"model": HTTPError, "description": "Invalid request"},
+        415: {"model": HTTPError, "description": "Body is not application/octet-stream"},
+        503: {"model": HTTPError, "description": "Service overloaded"}
+    }
+)
+async def trim_audio_raw_endpoint(
+    request: Request,
+    start: int = Query(...),
+    end: int = Query(...),
+    fade_in: float = Query(0.0),
+    fade_out: float = Query(0.0),
+    filename: str = Query("audio.mp3")
+):
+    """
+    Обрезка аудиофайла, переданного телом запроса.
+
+    Args:
+        request: Запрос, тело которого — аудиофайл (application/octet-stream).
+        start: Начало отрезка в секундах.
+        end: Конец отрезка в секундах.
+        fade_in: Плавное нарастание в начале отрезка, секунды.
+        fade_out: Плавное затухание в конце отрезка, секунды.
+        filename: Имя исходного файла (для имени результата).
+
+    Returns:
+        StreamingResponse: HTTP-ответ с обрезанным аудиофайлом.
+    """
+    validate_octet_stream(request)
+    validate_audio_range(start, end)
+    validate_fades(fade_in, fade_out, end - start)
+
+    with job_workspace() as workspace:
+        audio_path = await workspace.write_stream("audio_source", request.stream())
+        await run_in_threadpool(validate_audio_file_range, audio_path, start, end)
+        async with render_limiter.slot():
+            trimmed_audio_buffer = await run_in_threadpool(trim_audio, audio_path, start, end, fade_in, fade_out)
+
+    filename_base, _ = os.path.splitext(filename)
+    encoded_filename = quote_plus(f"cut_{filename_base}_{start}_{end}.mp3")
+    headers = {
+        "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
+    }
+    return StreamingResponse(trimmed_audio_buffer, media_type="audio/mpeg", headers=headers)
+
+
+@router.post(
+    "/create_video/raw",
+    response_model=None,
+    responses={
+        400: {"model": HTTPError, "description": "Invalid request"},
+        404: {"model": HTTPError, "description": "Cover not found"},
+        415: {"model": HTTPError, "description": "Body is not application/octet-stream"},
+        503: {"model": HTTPError, "description": "Service overloaded"}
+    }
+)
+async def create_video_raw_endpoint(
+    request: Request,
+    cover_id: str = Query(...),
+    template: str = Query(PLAIN_TEMPLATE_ID),
+    animated: bool = Query(False),
+    fade_in: float = Query(0.0),
+    fade_out: float = Query(0.0),
+    filename: str = Query("audio.mp3")
+):
+    """
+    Создание видео из аудио, переданного телом запроса, и ранее загруженной обложки.
+
+    Args:
+        request: Запрос, тело которого — аудиофайл (application/octet-stream).
+        cover_id: Идентификатор обложки из POST /covers.
+        template: Шаблон оформления обложки ("cover" или "vinyl").
+        animated: Вращать пластинку (только для шаблона "vinyl").
+        fade_in: Плавное нарастание звука, секунды.
+        fade_out: Плавное затухание звука, секунды.
+        filename: Имя исходного аудиофайла (для имени результата).
+
+    Returns:
+        StreamingResponse: HTTP-ответ с созданным видеофайлом.
+    """
+    validate_octet_stream(request)
+    validate_template(template)
+    validate_animation(template, animated)
+    validate_fades(fade_in, fade_out)
+    cover_bytes = load_cover(cover_id)
+    if cover_bytes is None:
+        raise HTTPException(status_code=404, detail="Обложка не найдена, загрузите ее через /covers")
+
+    with job_workspace() as workspace:
+        audio_path = await workspace.write_stream("audio_source", request.stream())
+        await run_in_threadpool(validate_audio_file, audio_path)
+        async with render_limiter.slot():
+            video_bytes = await run_in_threadpool(
+                run_profiled,
+                render_video_in_workspace,
+                workspace,
+                audio_path,
+                cover_bytes,
+                template_id=template,
+                animated=animated,
+                fade_in=fade_in,
+                fade_out=fade_out
+            )
+
+    filename_base, _ = os.path.splitext(filename)
+    encoded_filename = quote_plus(f"{filename_base}_with_cover_{cover_id[:8]}.mp4")
+    headers = {
+        "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
+    }
+    return StreamingResponse(io.BytesIO(video_bytes), media_type="video/mp4", headers=headers)
+
+
+@router.post(
+    "/create_video/by_reference",
+    response_model=None,
+    responses={
+        400: {"model": HTTPError, "description": "Invalid request"},
+        404: {"model": HTTPError, "description": "Track or cover not found"},
+        502: {"model": HTTPError, "description": "audio_receiver unavailable"},
+        503: {"model": HTTPError, "description": "Service overloaded"}
+    }
+)
+async def create_video_by_reference_endpoint(payload: VideoByReferenceRequest):
+    """
+    Создание видео по track_id: аудио и обложку media_processor забирает
+    из audio_receiver сам (через общий пул соединений и дисковый кэш),
+    клиент передает только небольшой JSON и получает готовый MP4.
+
+    Args:
+        payload: track_id, отрезок start/end, необязательный cover_id
+            (обложка из POST /covers вместо обложки трека), шаблон и анимация.
+
+    Returns:
+        StreamingResponse: HTTP-ответ с созданным видеофайлом.
+    """
+    if not TRACK_ID_PATTERN.match(payload.track_id):
+        raise HTTPException(status_code=400, detail="Некорректный track_id")
+    validate_audio_range(payload.start, payload.end)
+    validate_fades(payload.fade_in, payload.fade_out, payload.end - payload.start)
+    validate_template(payload.template)
+    validate_animation(payload.template, payload.animated)
+
+    if payload.cover_id is not None:
+        cover_bytes = load_cover(payload.cover_id)
+        if cover_bytes is None:
+            raise HTTPException(status_code=404, detail="Обложка не найдена, загрузите ее через /covers")
+    else:
+        cover_bytes = await fetch_track_cover(payload.track_id)
+        validate_image_bytes(cover_bytes)
+
+    with job_workspace() as workspace:
+        # Своя ссылка на файл: кэш может вытеснить его во время рендера
+        audio_path = workspace.link("track.mp3", await fetch_track_audio(payload.track_id))
+        await run_in_threadpool(validate_audio_file_range, audio_path, payload.start, payload.end)
+
+        async with render_limiter.slot():
+            video_bytes = await run_in_threadpool(
+                run_profiled,
+                render_video_in_workspace,
+                workspace,
+                audio_path,
+                cover_bytes,
+                template_id=payload.template,
+                animated=payload.animated,
+                start=payload.start,
+                end=payload.end,
+                fade_in=payload.fade_in,
+                fade_out=payload.fade_out
+            )
+
+    encoded_filename = quote_plus(f"video_{payload.track_id}.mp4")
+    headers = {
+        "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
+    }
+    return StreamingResponse(io.BytesIO(video_bytes), media_type="video/mp4", headers=headers)
+
+
+@router.post(
+    "/create_video/shared",
+    responses={
+        400: {"model": HTTPError, "description": "Invalid request or path"},
+        404: {"model": HTTPError, "description": "Shared mode disabled or file not found"},
+        503: {"model": HTTPError, "description": "Service overloaded"}
+    }
+)
+async def create_video_shared_endpoint(payload: SharedVideoRequest):
+    """
+    Создание видео из файлов в общем с клиентом каталоге (SHARED_DIR).
+    Запрос и ответ содержат только относительные пути — байты аудио
+    и видео через HTTP не передаются.
+
+    Args:
+        payload: Пути к аудио и обложке, путь результата (по умолчанию
+            рядом с аудио, с расширением .mp4), отрезок, шаблон и анимация.
+
+    Returns:
+        dict: Относительный путь к готовому видео.
+    """
+    audio_path = resolve_shared_input(payload.audio_path)
+    cover_path = resolve_shared_input(payload.cover_path)
+    output_relative_path = payload.output_path or f"{os.path.splitext(payload.audio_path)[0]}.mp4"
+    output_path = resolve_shared_output(output_relative_path, ".mp4")
+
+    validate_template(payload.template)
+    validate_animation(payload.template, payload.animated)
+    validate_fades(payload.fade_in, payload.fade_out)
+    if (payload.start is None) != (payload.end is None):
+        raise HTTPException(status_code=400, detail="Параметры start и end передаются вместе")
+    if payload.start is not None:
+        validate_audio_range(payload.start, payload.end)
+        await run_in_threadpool(validate_audio_file_range, audio_path, payload.start, payload.end)
+    else:
+        await run_in_threadpool(validate_audio_file, audio_path)
+
+    with open(cover_path, "rb") as f:
+        cover_bytes = f.read()
+    validate_image_bytes(cover_bytes)
+
+    with job_workspace() as workspace:
+        async with render_limiter.slot():
+            video_path = await run_in_threadpool(
+                run_profiled,
+                render_video_file,
+                workspace,
+                audio_path,
+                cover_bytes,
+                template_id=payload.template,
+                animated=payload.animated,
+                start=payload.start,
+                end=payload.end,
+                fade_in=payload.fade_in,
+                fade_out=payload.fade_out
+            )
+        await run_in_threadpool(publish_file, video_path, output_path)
+
+    return {"output_path": output_relative_path}
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """
+    Метрики сервиса в текстовом формате Prometheus.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
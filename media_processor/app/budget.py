@@ -0,0 +1,310 @@
+import math
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import NamedTuple, Optional
+
+import ffmpeg
+
+from . import config
+from .ffmpeg_runner import run_ffmpeg_command_sync
+from .cpu import encoder_threads
+from .metrics import Counter, Histogram
+
+# Пробное кодирование: столько кадров обложки кодируется, чтобы оценить
+# размер I-кадра и средний размер P-кадра
+TRIAL_FRAMES = 50
+# Интервал ключевых кадров итогового видео (совпадает с умолчанием x264)
+KEYFRAME_INTERVAL = 250
+# Шаг CRF, на котором измеряется, во сколько раз уменьшается размер
+CRF_STEP = 6
+# Зависимость по умолчанию, пока она не измерена для обложки: для неподвижных
+# кадров размер падает заметно медленнее, чем вдвое на каждые 6 единиц CRF
+DEFAULT_STEP_RATIO = 0.75
+MAX_CRF = 51
+# Сколько раз выбранный CRF уточняется пробным кодированием
+REFINE_TRIALS = 2
+# Верхние оценки размеров кадров относительно размера PNG-кадра обложки
+# (сложность изображения): по ним пробное кодирование пропускается,
+# если видео заведомо укладывается в бюджет
+KEYFRAME_PNG_RATIO = 0.5
+FRAME_PNG_RATIO = 0.005
+# Накладные расходы контейнера MP4 поверх дорожек
+MUX_OVERHEAD_RATIO = 0.02
+MUX_OVERHEAD_BYTES = 16 * 1024
+
+_TRIAL_CACHE_SIZE = 256
+_trial_cache: "OrderedDict[tuple, TrialResult]" = OrderedDict()
+_trial_cache_lock = Lock()
+
+size_prediction_error = Histogram(
+    "media_size_prediction_error_ratio",
+    "Относительная ошибка предсказания размера видео: (факт - прогноз) / прогноз",
+    buckets=(-0.5, -0.25, -0.1, -0.05, 0, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+size_budget_second_passes = Counter(
+    "media_size_budget_second_passes_total", "Повторные кодирования из-за превышения бюджета размера"
+)
+size_budget_exceeded = Counter(
+    "media_size_budget_exceeded_total", "Видео, не уложившиеся в бюджет и после повторного кодирования"
+)
+
+
+class TrialResult(NamedTuple):
+    """Размеры кадров пробного кодирования при заданном CRF."""
+    keyframe_bytes: int
+    frame_bytes: float
+
+
+class EncodePlan(NamedTuple):
+    """Параметры кодирования видео и ожидаемый размер видеодорожки."""
+    crf: int
+    predicted_bytes: int
+    # Во сколько раз меняется размер при увеличении CRF на CRF_STEP
+    step_ratio: float
+
+
+def video_budget_bytes(audio_bytes: int) -> int:
+    """
+    Сколько байт остается на видеодорожку с учетом аудио и контейнера.
+
+    Args:
+        audio_bytes: Размер аудиодорожки.
+
+    Returns:
+        int: Бюджет видеодорожки (может быть отрицательным).
+    """
+    budget = config.VIDEO_SIZE_BUDGET_BYTES - audio_bytes
+    return int(budget / (1 + MUX_OVERHEAD_RATIO)) - MUX_OVERHEAD_BYTES
+
+
+def predicted_file_bytes(video_bytes: int, audio_bytes: int) -> int:
+    """Ожидаемый размер MP4 по размерам дорожек."""
+    return int((video_bytes + audio_bytes) * (1 + MUX_OVERHEAD_RATIO)) + MUX_OVERHEAD_BYTES
+
+
+def split_h264_frames(stream: bytes) -> TrialResult:
+    """
+    Делит поток H.264 (Annex B) на байты ключевых кадров (IDR вместе
+    с SPS/PPS/SEI) и остальных кадров.
+
+    Args:
+        stream: Поток H.264 с TRIAL_FRAMES кадрами, из которых первый — ключевой.
+
+    Returns:
+        TrialResult: Размер ключевого кадра и средний размер остальных.
+    """
+    starts = []
+    index = stream.find(b"\x00\x00\x01")
+    while index != -1:
+        starts.append(index + 3)
+        index = stream.find(b"\x00\x00\x01", index + 3)
+
+    keyframe_bytes = 0
+    other_bytes = 0
+    other_frames = 0
+    for position, start in enumerate(starts):
+        end = starts[position + 1] - 3 if position + 1 < len(starts) else len(stream)
+        nal_type = stream[start] & 0x1f
+        if nal_type == 1:
+            other_bytes += end - start + 3
+            other_frames += 1
+        else:
+            keyframe_bytes += end - start + 3
+    return TrialResult(keyframe_bytes, other_bytes / other_frames if other_frames else 0.0)
+
+
+def trial_encode(image_path: str, crf: int, fps: int, cache_key: Optional[tuple] = None) -> TrialResult:
+    """
+    Кодирует несколько кадров обложки в тех же настройках, что и итоговое
+    видео. Результаты кэшируются по ключу обложки и CRF.
+
+    Args:
+        image_path: PNG-кадр обложки.
+        crf: CRF пробного кодирования.
+        fps: Частота кадров.
+        cache_key: Ключ кэша (например, хэш обложки и шаблон).
+
+    Returns:
+        TrialResult: Размеры кадров.
+    """
+    key = (cache_key, crf) if cache_key is not None else None
+    if key is not None:
+        with _trial_cache_lock:
+            result = _trial_cache.get(key)
+            if result is not None:
+                _trial_cache.move_to_end(key)
+                return result
+
+    stream = (
+        ffmpeg
+        .input(image_path, loop=1, framerate=fps)
+        .filter('scale', 'ceil(iw/2)*2', 'ceil(ih/2)*2')
+        .output('pipe:', format='h264', vcodec='libx264', threads=encoder_threads(), pix_fmt='yuv420p',
+                crf=crf, g=KEYFRAME_INTERVAL, frames=TRIAL_FRAMES)
+    )
+    result = split_h264_frames(run_ffmpeg_command_sync(stream.compile(), capture_stdout=True).stdout)
+
+    if key is not None:
+        with _trial_cache_lock:
+            _trial_cache[key] = result
+            while len(_trial_cache) > _TRIAL_CACHE_SIZE:
+                _trial_cache.popitem(last=False)
+    return result
+
+
+def predict_video_bytes(trial: TrialResult, duration: float, fps: int) -> int:
+    """
+    Размер видеодорожки из неподвижной обложки по пробному кодированию.
+
+    Args:
+        trial: Результат пробного кодирования.
+        duration: Длительность видео в секундах.
+        fps: Частота кадров.
+
+    Returns:
+        int: Ожидаемый размер в байтах.
+    """
+    frames = max(1, math.ceil(duration * fps))
+    keyframes = math.ceil(frames / KEYFRAME_INTERVAL)
+    return int(keyframes * trial.keyframe_bytes + (frames - keyframes) * trial.frame_bytes)
+
+
+def complexity_upper_bound(png_bytes: int, duration: float, fps: int) -> int:
+    """
+    Верхняя оценка размера видеодорожки по размеру PNG-кадра обложки.
+
+    Args:
+        png_bytes: Размер PNG-кадра.
+        duration: Длительность видео в секундах.
+        fps: Частота кадров.
+
+    Returns:
+        int: Оценка сверху в байтах.
+    """
+    bound = TrialResult(int(png_bytes * KEYFRAME_PNG_RATIO), png_bytes * FRAME_PNG_RATIO)
+    return predict_video_bytes(bound, duration, fps)
+
+
+def crf_for_target(base_crf: int, base_bytes: float, target_bytes: float, step_ratio: float) -> int:
+    """
+    CRF, при котором размер base_bytes (при base_crf) уменьшится до target_bytes,
+    если каждые CRF_STEP единиц размер меняется в step_ratio раз.
+    """
+    if target_bytes <= 0 or step_ratio >= 1:
+        return MAX_CRF
+    if base_bytes <= target_bytes:
+        return base_crf
+    steps = math.log(target_bytes / base_bytes) / math.log(step_ratio)
+    return min(MAX_CRF, base_crf + math.ceil(steps * CRF_STEP))
+
+
+def plan_static_encode(
+    image_path: str,
+    duration: float,
+    video_budget: int,
+    fps: int,
+    cache_key: Optional[tuple] = None
+) -> Optional[EncodePlan]:
+    """
+    Подбирает CRF для видео из неподвижной обложки так, чтобы уложиться
+    в бюджет за один проход. Простые обложки отсекаются оценкой сверху
+    по размеру PNG-кадра. Для остальных делается пробное кодирование:
+    если при CRF по умолчанию прогноз укладывается в бюджет, настройки
+    не меняются; иначе второе пробное кодирование (CRF + CRF_STEP) дает
+    зависимость размера от CRF, по которой выбирается подходящий CRF.
+    За пределами измеренных точек выбранный CRF проверяется еще одним
+    пробным кодированием.
+
+    Args:
+        image_path: PNG-кадр обложки.
+        duration: Длительность видео в секундах.
+        video_budget: Бюджет видеодорожки в байтах.
+        fps: Частота кадров.
+        cache_key: Ключ кэша пробных кодирований.
+
+    Returns:
+        Optional[EncodePlan]: CRF и ожидаемый размер видеодорожки или None,
+            если видео заведомо укладывается в бюджет с CRF по умолчанию.
+    """
+    if complexity_upper_bound(os.path.getsize(image_path), duration, fps) <= video_budget:
+        return None
+
+    base_crf = config.VIDEO_CRF
+    base_bytes = predict_video_bytes(trial_encode(image_path, base_crf, fps, cache_key), duration, fps)
+    if base_bytes <= video_budget:
+        return EncodePlan(base_crf, base_bytes, DEFAULT_STEP_RATIO)
+
+    step_crf = min(MAX_CRF, base_crf + CRF_STEP)
+    step_bytes = predict_video_bytes(trial_encode(image_path, step_crf, fps, cache_key), duration, fps)
+    step_ratio = step_bytes / base_bytes if base_bytes else DEFAULT_STEP_RATIO
+    if step_bytes <= video_budget:
+        # Между двумя измеренными точками модель достаточно точна
+        crf = crf_for_target(base_crf, base_bytes, video_budget, step_ratio)
+        predicted = int(base_bytes * step_ratio ** ((crf - base_crf) / CRF_STEP))
+        return EncodePlan(crf, predicted, step_ratio)
+
+    crf, crf_bytes = step_crf, step_bytes
+    if step_crf < MAX_CRF:
+        # Зависимость от CRF не совсем экспоненциальная: выбранный CRF
+        # проверяется еще одним пробным кодированием и при промахе
+        # уточняется по ближайшей измеренной точке
+        for _ in range(REFINE_TRIALS):
+            crf = crf_for_target(crf, crf_bytes, video_budget, step_ratio)
+            crf_bytes = predict_video_bytes(trial_encode(image_path, crf, fps, cache_key), duration, fps)
+            if crf_bytes <= video_budget or crf >= MAX_CRF:
+                break
+    return EncodePlan(crf, crf_bytes, step_ratio)
+
+
+def plan_loop_encode(loop_bytes: int, loop_seconds: float, duration: float, video_budget: int) -> tuple[int, Optional[int]]:
+    """
+    План для анимации: петля повторяется без перекодирования, поэтому
+    размер видеодорожки известен точно. Если он не укладывается в бюджет,
+    петля перекодируется с ограничением битрейта.
+
+    Args:
+        loop_bytes: Размер файла петли.
+        loop_seconds: Длительность петли.
+        duration: Длительность видео.
+        video_budget: Бюджет видеодорожки в байтах.
+
+    Returns:
+        tuple: Ожидаемый размер видеодорожки и битрейт перекодирования
+            (бит/с) или None, если петлю можно копировать.
+    """
+    copied_bytes = int(loop_bytes * duration / loop_seconds)
+    if copied_bytes <= video_budget:
+        return copied_bytes, None
+    bitrate = max(1, int(video_budget * 8 / duration))
+    return video_budget, bitrate
+
+
+def corrected_crf(plan: EncodePlan, actual_video_bytes: int, video_budget: int) -> int:
+    """
+    CRF для второго прохода, если первый не уложился в бюджет:
+    фактический размер пересчитывается по той же зависимости от CRF
+    с запасом в одну единицу.
+
+    Args:
+        plan: План первого прохода.
+        actual_video_bytes: Фактический размер видеодорожки.
+        video_budget: Бюджет видеодорожки.
+
+    Returns:
+        int: CRF второго прохода.
+    """
+    crf = crf_for_target(plan.crf, actual_video_bytes, video_budget, plan.step_ratio)
+    return min(MAX_CRF, max(crf, plan.crf) + 1)
+
+
+def record_prediction(predicted_bytes: int, actual_bytes: int) -> None:
+    """Сохраняет относительную ошибку предсказания размера в метрики."""
+    if predicted_bytes > 0:
+        size_prediction_error.observe((actual_bytes - predicted_bytes) / predicted_bytes)
+
+
+def clear_trial_cache() -> None:
+    """Очищает кэш пробных кодирований."""
+    with _trial_cache_lock:
+        _trial_cache.clear()
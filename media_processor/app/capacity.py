@@ -0,0 +1,68 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from . import config
+from .cpu import render_slots
+from .metrics import Counter, Gauge
+
+
+class RenderQueueFull(Exception):
+    """Все слоты рендера заняты и очередь ожидания заполнена."""
+
+
+class RenderLimiter:
+    """
+    Ограничивает число одновременных рендеров. Запросы сверх лимита ждут
+    в очереди ограниченной длины, а при заполненной очереди сразу отклоняются.
+    """
+
+    def __init__(self, slots: int, queue_limit: int):
+        self.slots = slots
+        self.queue_limit = queue_limit
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(slots)
+
+    @property
+    def free_slots(self) -> int:
+        return max(0, self.slots - self.in_flight)
+
+    @property
+    def saturated(self) -> bool:
+        """Новый запрос был бы отклонен."""
+        return self.free_slots == 0 and self.waiting >= self.queue_limit
+
+    @asynccontextmanager
+    async def slot(self):
+        """Занимает слот рендера на время блока."""
+        if self.saturated:
+            render_rejections.inc()
+            raise RenderQueueFull("Сервис перегружен, повторите запрос позже")
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+
+render_limiter = RenderLimiter(render_slots(), config.RENDER_QUEUE_LIMIT)
+
+render_in_flight = Gauge(
+    "media_render_in_flight", "Рендеры, выполняющиеся сейчас",
+    function=lambda: render_limiter.in_flight
+)
+render_queue_depth = Gauge(
+    "media_render_queue_depth", "Запросы, ожидающие свободного слота",
+    function=lambda: render_limiter.waiting
+)
+render_rejections = Counter(
+    "media_render_rejections_total", "Запросы, отклоненные из-за переполненной очереди"
+)
@@ -0,0 +1,140 @@
+import os
+import shutil
+import tempfile
+
+
+# Размер стороны итогового кадра (видеосообщения Telegram не больше 640x640)
+FRAME_SIZE = int(os.getenv('FRAME_SIZE', '640'))
+
+# Сколько скомпонованных кадров обложек держать в памяти
+COVER_FRAME_CACHE_SIZE = int(os.getenv('COVER_FRAME_CACHE_SIZE', '64'))
+
+# Анимация вращающейся пластинки: кадров на один оборот и частота кадров
+ANIMATION_FPS = int(os.getenv('ANIMATION_FPS', '25'))
+ANIMATION_FRAMES_PER_TURN = int(os.getenv('ANIMATION_FRAMES_PER_TURN', '48'))
+
+# Где хранить закодированные петли анимации и сколько их держать
+ANIMATION_CACHE_DIR = os.getenv(
+    'ANIMATION_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), 'media_processor_loops')
+)
+ANIMATION_CACHE_MAX_FILES = int(os.getenv('ANIMATION_CACHE_MAX_FILES', '200'))
+
+# Кэш метаданных ffprobe: в памяти (число записей) и на диске
+PROBE_CACHE_SIZE = int(os.getenv('PROBE_CACHE_SIZE', '1024'))
+PROBE_CACHE_DIR = os.getenv(
+    'PROBE_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), 'media_processor_probe')
+)
+PROBE_CACHE_MAX_FILES = int(os.getenv('PROBE_CACHE_MAX_FILES', '5000'))
+
+# Профилирование запросов: off — выключено (middleware не подключается),
+# header — только запросы с заголовками X-Profile и X-Admin-Token, always — все запросы
+PROFILING_MODE = os.getenv('PROFILING_MODE', 'off')
+PROFILE_DIR = os.getenv(
+    'PROFILE_DIR',
+    os.path.join(tempfile.gettempdir(), 'media_processor_profiles')
+)
+PROFILE_MAX_COUNT = int(os.getenv('PROFILE_MAX_COUNT', '50'))
+
+# Токен для служебных endpoint'ов (/admin/...)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+
+# Квоты рабочих каталогов задач: на одну задачу и на все сразу
+WORKSPACE_JOB_QUOTA_BYTES = int(os.getenv('WORKSPACE_JOB_QUOTA_BYTES', str(256 * 1024 * 1024)))
+WORKSPACE_TOTAL_QUOTA_BYTES = int(os.getenv('WORKSPACE_TOTAL_QUOTA_BYTES', str(1024 * 1024 * 1024)))
+# Минимальный запас свободного места в WORKSPACE_ROOT для готовности принимать запросы
+MIN_WORKSPACE_HEADROOM_BYTES = int(os.getenv('MIN_WORKSPACE_HEADROOM_BYTES', str(256 * 1024 * 1024)))
+
+
+def _default_workspace_root() -> str:
+    """
+    Рабочие каталоги размещаются в tmpfs (/dev/shm), только если он вмещает
+    общую квоту и запас: по умолчанию Docker дает контейнеру 64 МБ /dev/shm
+    (без shm_size), и тогда каталоги остаются на диске.
+    """
+    shm = '/dev/shm'
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        try:
+            size = shutil.disk_usage(shm).total
+        except OSError:
+            size = 0
+        if size >= WORKSPACE_TOTAL_QUOTA_BYTES + MIN_WORKSPACE_HEADROOM_BYTES:
+            return os.path.join(shm, 'media_processor')
+    return os.path.join(tempfile.gettempdir(), 'media_processor_jobs')
+
+
+# Рабочие каталоги задач: корень и уборка брошенных каталогов
+WORKSPACE_ROOT = os.getenv('WORKSPACE_ROOT') or _default_workspace_root()
+WORKSPACE_STALE_SECONDS = int(os.getenv('WORKSPACE_STALE_SECONDS', '3600'))
+WORKSPACE_REAP_INTERVAL_SECONDS = int(os.getenv('WORKSPACE_REAP_INTERVAL_SECONDS', '600'))
+
+# Ограничение одновременных рендеров и очереди ожидающих запросов
+# (0 — подобрать по квоте CPU контейнера)
+MAX_CONCURRENT_RENDERS = int(os.getenv('MAX_CONCURRENT_RENDERS', '0'))
+# Потоков x264 на один рендер (0 — поровну разделить квоту CPU между слотами рендера)
+X264_THREADS = int(os.getenv('X264_THREADS', '0'))
+RENDER_QUEUE_LIMIT = int(os.getenv('RENDER_QUEUE_LIMIT', '8'))
+
+# Хранилище обложек, загруженных заранее (на них ссылаются по хэшу из /create_video/raw)
+COVER_STORE_DIR = os.getenv(
+    'COVER_STORE_DIR',
+    os.path.join(tempfile.gettempdir(), 'media_processor_covers')
+)
+COVER_STORE_MAX_FILES = int(os.getenv('COVER_STORE_MAX_FILES', '500'))
+MAX_COVER_UPLOAD_BYTES = int(os.getenv('MAX_COVER_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+
+# Лимиты на входные изображения: размер файла и число пикселей по заголовку
+# (защита от "бомб" — маленьких файлов с огромным разрешением)
+MAX_IMAGE_BYTES = int(os.getenv('MAX_IMAGE_BYTES', str(MAX_COVER_UPLOAD_BYTES)))
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', str(40_000_000)))
+
+# audio_receiver, из которого media_processor сам забирает аудио и обложки по track_id
+AUDIO_RECEIVER_API_URL = os.getenv('AUDIO_RECEIVER_API_URL', 'http://audio_receiver:9000')
+UPSTREAM_TIMEOUT_SECONDS = float(os.getenv('UPSTREAM_TIMEOUT_SECONDS', '30'))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv('UPSTREAM_MAX_CONNECTIONS', '20'))
+
+# Дисковый кэш скачанных треков и обложек
+TRACK_CACHE_DIR = os.getenv(
+    'TRACK_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), 'media_processor_tracks')
+)
+TRACK_CACHE_MAX_FILES = int(os.getenv('TRACK_CACHE_MAX_FILES', '200'))
+TRACK_CACHE_MAX_BYTES = int(os.getenv('TRACK_CACHE_MAX_BYTES', str(2 * 1024 * 1024 * 1024)))
+
+# Общий с ботом каталог (том compose). Если задан, включается режим, в котором
+# запросы передают относительные пути внутри каталога, а не сами файлы
+SHARED_DIR = os.getenv('SHARED_DIR')
+
+# Бюджет размера итогового видео (байт): видео, которое не уложится,
+# перекодируется с подобранным CRF/битрейтом. 0 — без ограничения (по умолчанию:
+# пробное кодирование стоит CPU на каждом рендере; включать, например, 8388608)
+VIDEO_SIZE_BUDGET_BYTES = int(os.getenv('VIDEO_SIZE_BUDGET_BYTES', '0'))
+# CRF x264 по умолчанию для видео из неподвижной обложки
+VIDEO_CRF = int(os.getenv('VIDEO_CRF', '23'))
+
+# Плавные переходы звука: наибольшая длительность fade_in/fade_out и короткое
+# затухание на месте разреза, убирающее щелчок (0 — не сглаживать)
+MAX_FADE_SECONDS = float(os.getenv('MAX_FADE_SECONDS', '10'))
+AUDIO_DECLICK_SECONDS = float(os.getenv('AUDIO_DECLICK_SECONDS', '0.01'))
+
+# Запуск ffmpeg: ограничение времени одного процесса и сколько последних строк stderr хранить
+FFMPEG_TIMEOUT_SECONDS = float(os.getenv('FFMPEG_TIMEOUT_SECONDS', '300'))
+FFMPEG_STDERR_TAIL_LINES = int(os.getenv('FFMPEG_STDERR_TAIL_LINES', '50'))
+
+# Очередь задач рендера для отдельных воркеров (worker.py). Каталог задач
+# и база очереди должны быть общими для API и всех воркеров
+JOBS_DIR = os.getenv('JOBS_DIR', os.path.join(tempfile.gettempdir(), 'media_processor_render_jobs'))
+JOBS_DB_PATH = os.getenv('JOBS_DB_PATH', os.path.join(JOBS_DIR, 'queue.sqlite3'))
+# Срок аренды задачи воркером: воркер продлевает его, пока рендерит;
+# задачу упавшего воркера заберет другой после истечения срока
+JOB_VISIBILITY_TIMEOUT_SECONDS = float(os.getenv('JOB_VISIBILITY_TIMEOUT_SECONDS', '60'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+# Задержка перед повтором растет с номером попытки
+JOB_RETRY_DELAY_SECONDS = float(os.getenv('JOB_RETRY_DELAY_SECONDS', '5'))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv('JOB_POLL_INTERVAL_SECONDS', '1'))
+# Сколько хранить завершенные задачи и их результаты
+JOB_RESULT_TTL_SECONDS = int(os.getenv('JOB_RESULT_TTL_SECONDS', '3600'))
+# Одновременных рендеров в одном воркере (0 — по квоте CPU, как MAX_CONCURRENT_RENDERS)
+WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', '0'))
@@ -0,0 +1,115 @@
+import math
+import os
+from functools import lru_cache
+from typing import Optional
+
+from . import config
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+# Потоков x264 на один рендер: кадр 640x640 плохо делится между большим
+# числом потоков, поэтому выгоднее несколько рендеров по 2 потока,
+# чем один рендер на все ядра
+DEFAULT_THREADS_PER_RENDER = 2
+MAX_THREADS_PER_RENDER = 4
+
+# Одновременных рендеров в этом процессе, если их задает не render_slots()
+# (воркер очереди с WORKER_CONCURRENCY)
+_process_concurrency: Optional[int] = None
+
+
+def _read_first_line(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit(root: str = CGROUP_ROOT) -> Optional[float]:
+    """
+    Квота CPU контейнера из cgroup (v2: cpu.max, v1: cpu.cfs_quota_us).
+
+    Args:
+        root: Корень файловой системы cgroup.
+
+    Returns:
+        Optional[float]: Число ядер по квоте или None, если квоты нет.
+    """
+    cpu_max = _read_first_line(os.path.join(root, 'cpu.max'))
+    if cpu_max is not None:
+        quota, _, period = cpu_max.partition(' ')
+        if quota == 'max' or not period:
+            return None
+        return int(quota) / int(period)
+
+    quota = _read_first_line(os.path.join(root, 'cpu', 'cpu.cfs_quota_us'))
+    period = _read_first_line(os.path.join(root, 'cpu', 'cpu.cfs_period_us'))
+    if quota is None or period is None or int(quota) <= 0 or int(period) <= 0:
+        return None
+    return int(quota) / int(period)
+
+
+def available_cpus(root: str = CGROUP_ROOT) -> float:
+    """
+    Сколько ядер реально доступно процессу: меньшее из привязки
+    к ядрам (cpuset) и квоты cgroup.
+    """
+    try:
+        cpus = float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        cpus = float(os.cpu_count() or 1)
+    limit = cgroup_cpu_limit(root)
+    if limit is not None:
+        cpus = min(cpus, limit)
+    return max(1.0, cpus)
+
+
+@lru_cache(maxsize=None)
+def process_cpus() -> float:
+    """
+    available_cpus(), прочитанный один раз: квота cgroup не меняется,
+    пока жив процесс, а значение нужно на каждый рендер.
+    """
+    return available_cpus()
+
+
+def auto_render_slots(cpus: float) -> int:
+    """Число одновременных рендеров по умолчанию для заданного числа ядер."""
+    return max(1, math.floor(cpus / DEFAULT_THREADS_PER_RENDER))
+
+
+def auto_encoder_threads(cpus: float, slots: int) -> int:
+    """Потоков x264 на рендер, чтобы все рендеры вместе не превышали число ядер."""
+    return max(1, min(MAX_THREADS_PER_RENDER, math.floor(cpus / slots)))
+
+
+def render_slots() -> int:
+    """
+    Число одновременных рендеров: MAX_CONCURRENT_RENDERS или,
+    если он равен 0, подбирается по квоте CPU контейнера.
+    """
+    if config.MAX_CONCURRENT_RENDERS > 0:
+        return config.MAX_CONCURRENT_RENDERS
+    return auto_render_slots(process_cpus())
+
+
+def set_process_concurrency(concurrency: Optional[int]) -> None:
+    """
+    Задает число одновременных рендеров процесса, на которое делится
+    квота CPU в encoder_threads (None — по render_slots()).
+
+    Args:
+        concurrency: Число одновременных рендеров.
+    """
+    global _process_concurrency
+    _process_concurrency = concurrency
+
+
+def encoder_threads() -> int:
+    """
+    Потоков x264 на один рендер: X264_THREADS или, если он равен 0,
+    доля квоты CPU на один одновременный рендер процесса.
+    """
+    if config.X264_THREADS > 0:
+        return config.X264_THREADS
+    return auto_encoder_threads(process_cpus(), _process_concurrency or render_slots())
@@ -0,0 +1,291 @@
+import asyncio
+import re
+import time
+from collections import deque
+from itertools import count
+from typing import Callable, Iterable, NamedTuple, Optional
+
+import ffmpeg
+
+from . import config
+from .metrics import Counter, Gauge, Histogram
+
+# Строки stderr длиннее этого обрезаются, чтобы буфер оставался ограниченным
+MAX_LINE_BYTES = 1024
+READ_CHUNK_BYTES = 64 * 1024
+# Сколько ждать завершения после SIGTERM, прежде чем убить процесс
+TERMINATE_GRACE_SECONDS = 2
+# Строки вывода -progress: "ключ=значение" без пробелов в ключе
+PROGRESS_LINE_PATTERN = re.compile(r"^([a-z0-9_]+)=(.*)$")
+
+_run_ids = count(1)
+_active_runs: dict[int, "FfmpegRun"] = {}
+
+ffmpeg_runs = Counter("media_ffmpeg_runs_total", "Запуски ffmpeg по результату")
+ffmpeg_seconds = Histogram(
+    "media_ffmpeg_seconds", "Длительность запусков ffmpeg",
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+)
+ffmpeg_running = Gauge(
+    "media_ffmpeg_running", "Процессы ffmpeg, выполняющиеся сейчас",
+    function=lambda: len(_active_runs)
+)
+
+
+class FfmpegProgress(NamedTuple):
+    """Очередной блок вывода ffmpeg -progress."""
+    frame: int
+    out_time: float
+    speed: Optional[float]
+    done: bool
+
+
+class FfmpegResult(NamedTuple):
+    """Результат успешного запуска ffmpeg."""
+    stdout: bytes
+    # Последние строки stderr (без строк -progress)
+    stderr: str
+    elapsed: float
+
+
+class FfmpegError(ffmpeg.Error):
+    """
+    ffmpeg завершился с ошибкой или не уложился в таймаут. Вместо всего
+    stderr хранит только последние строки.
+    """
+
+    def __init__(
+        self,
+        command: list[str],
+        returncode: Optional[int],
+        stderr_tail: str,
+        timed_out: bool = False,
+        progress: Optional[FfmpegProgress] = None
+    ):
+        super().__init__('ffmpeg', b'', stderr_tail.encode('utf8'))
+        self.command = command
+        self.returncode = returncode
+        self.stderr_tail = stderr_tail
+        self.timed_out = timed_out
+        self.progress = progress
+
+    def __str__(self) -> str:
+        if self.timed_out:
+            return "ffmpeg не завершился за отведенное время"
+        return f"ffmpeg завершился с кодом {self.returncode}"
+
+    def to_dict(self) -> dict:
+        """Описание ошибки для ответа API и логов."""
+        return {
+            "detail": str(self),
+            "returncode": self.returncode,
+            "timed_out": self.timed_out,
+            "out_time": self.progress.out_time if self.progress is not None else None,
+            "stderr_tail": self.stderr_tail.splitlines(),
+        }
+
+
+class StderrRing:
+    """Последние строки stderr: старые вытесняются, длинные обрезаются."""
+
+    def __init__(self, max_lines: int):
+        self.lines: deque[str] = deque(maxlen=max_lines)
+        self.total_lines = 0
+
+    def append(self, line: bytes) -> None:
+        if len(line) > MAX_LINE_BYTES:
+            line = line[:MAX_LINE_BYTES] + b"..."
+        self.lines.append(line.decode('utf8', errors='replace'))
+        self.total_lines += 1
+
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+class FfmpegRun:
+    """Состояние выполняющегося процесса ffmpeg."""
+
+    def __init__(self, command: list[str], on_progress: Optional[Callable[[FfmpegProgress], None]]):
+        self.command = command
+        self.started = time.monotonic()
+        self.stderr = StderrRing(config.FFMPEG_STDERR_TAIL_LINES)
+        self.progress: Optional[FfmpegProgress] = None
+        self._on_progress = on_progress
+        self._fields: dict[str, str] = {}
+
+    def feed_line(self, line: bytes) -> None:
+        """Разбирает строку stderr: блок -progress или обычный лог."""
+        line = line.strip()
+        if not line:
+            return
+        match = PROGRESS_LINE_PATTERN.match(line.decode('utf8', errors='replace'))
+        if match is None:
+            self.stderr.append(line)
+            return
+        key, value = match.groups()
+        self._fields[key] = value
+        if key == "progress":
+            self.progress = parse_progress(self._fields)
+            self._fields = {}
+            if self._on_progress is not None:
+                self._on_progress(self.progress)
+
+    def status(self) -> dict:
+        """Текущий прогресс для /health/ready."""
+        return {
+            "elapsed": round(time.monotonic() - self.started, 1),
+            "out_time": self.progress.out_time if self.progress is not None else 0.0,
+            "speed": self.progress.speed if self.progress is not None else None,
+        }
+
+
+def parse_progress(fields: dict[str, str]) -> FfmpegProgress:
+    """
+    Собирает прогресс из полей одного блока -progress.
+
+    Args:
+        fields: Пары ключ-значение блока (до строки progress=... включительно).
+
+    Returns:
+        FfmpegProgress: Номер кадра, позиция в секундах, скорость и признак завершения.
+    """
+    def _number(value: Optional[str]) -> Optional[float]:
+        try:
+            return float(value.rstrip('x'))
+        except (AttributeError, ValueError):
+            return None
+
+    out_time_us = _number(fields.get("out_time_us")) or _number(fields.get("out_time_ms")) or 0.0
+    return FfmpegProgress(
+        frame=int(_number(fields.get("frame")) or 0),
+        out_time=max(0.0, out_time_us / 1_000_000),
+        speed=_number(fields.get("speed")),
+        done=fields.get("progress") == "end",
+    )
+
+
+def active_runs() -> list[dict]:
+    """Прогресс всех выполняющихся процессов ffmpeg."""
+    return [run.status() for run in list(_active_runs.values())]
+
+
+async def _read_stderr(stream: asyncio.StreamReader, run: FfmpegRun) -> None:
+    # Читаем фрагментами, а не readline: длина строки не ограничена заранее,
+    # а незавершенная строка не должна расти бесконечно
+    pending = b""
+    while True:
+        chunk = await stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        lines = re.split(rb"[\r\n]", pending + chunk)
+        pending = lines.pop()[:MAX_LINE_BYTES]
+        for line in lines:
+            run.feed_line(line)
+    run.feed_line(pending)
+
+
+async def _write_stdin(stream: asyncio.StreamWriter, chunks: Iterable[bytes]) -> None:
+    # Данные для stdin готовятся в пуле потоков (например, кадры анимации),
+    # чтобы не занимать event loop
+    iterator = iter(chunks)
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next, iterator, None)
+            if chunk is None:
+                break
+            stream.write(chunk)
+            await stream.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        # ffmpeg завершился раньше времени — причина будет в коде возврата
+        pass
+    finally:
+        stream.close()
+
+
+async def _stop(process: asyncio.subprocess.Process) -> None:
+    if process.returncode is not None:
+        return
+    process.terminate()
+    try:
+        await asyncio.wait_for(process.wait(), TERMINATE_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+async def run_ffmpeg_command(
+    command: list[str],
+    timeout: Optional[float] = None,
+    capture_stdout: bool = False,
+    stdin_chunks: Optional[Iterable[bytes]] = None,
+    on_progress: Optional[Callable[[FfmpegProgress], None]] = None
+) -> FfmpegResult:
+    """
+    Запускает ffmpeg как asyncio-подпроцесс. stderr читается потоково
+    в кольцевой буфер последних строк, прогресс разбирается из -progress.
+
+    Args:
+        command: Команда целиком (например, stream.compile()).
+        timeout: Ограничение времени в секундах (None — FFMPEG_TIMEOUT_SECONDS).
+        capture_stdout: Собрать stdout (иначе он отбрасывается).
+        stdin_chunks: Данные для stdin.
+        on_progress: Вызывается на каждый блок -progress.
+
+    Returns:
+        FfmpegResult: stdout, последние строки stderr и длительность.
+
+    Raises:
+        FfmpegError: Ненулевой код возврата или превышение таймаута.
+    """
+    timeout = config.FFMPEG_TIMEOUT_SECONDS if timeout is None else timeout
+    full_command = [command[0], '-nostats', '-progress', 'pipe:2', *command[1:]]
+    run = FfmpegRun(command, on_progress)
+    process = await asyncio.create_subprocess_exec(
+        *full_command,
+        stdin=asyncio.subprocess.PIPE if stdin_chunks is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE if capture_stdout else asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    run_id = next(_run_ids)
+    _active_runs[run_id] = run
+
+    tasks = [asyncio.ensure_future(_read_stderr(process.stderr, run))]
+    stdout_task = asyncio.ensure_future(process.stdout.read()) if capture_stdout else None
+    if stdout_task is not None:
+        tasks.append(stdout_task)
+    if stdin_chunks is not None:
+        tasks.append(asyncio.ensure_future(_write_stdin(process.stdin, stdin_chunks)))
+
+    timed_out = False
+    try:
+        await asyncio.wait_for(asyncio.gather(*tasks, process.wait()), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+    finally:
+        # При таймауте или отмене запроса процесс не должен пережить вызов
+        for task in tasks:
+            task.cancel()
+        await _stop(process)
+        del _active_runs[run_id]
+
+    elapsed = time.monotonic() - run.started
+    ffmpeg_seconds.observe(elapsed)
+    if timed_out or process.returncode != 0:
+        ffmpeg_runs.inc(result="timeout" if timed_out else "error")
+        raise FfmpegError(command, process.returncode, run.stderr.text(), timed_out, run.progress)
+
+    ffmpeg_runs.inc(result="ok")
+    stdout = stdout_task.result() if stdout_task is not None else b""
+    return FfmpegResult(stdout, run.stderr.text(), elapsed)
+
+
+def run_ffmpeg_command_sync(command: list[str], **kwargs) -> FfmpegResult:
+    """
+    run_ffmpeg_command для синхронного кода рендера (пул потоков, воркер
+    очереди, скрипты): процесс обслуживает собственный event loop
+    вызывающего потока. Из корутин вызывается run_ffmpeg_command.
+
+    Raises:
+        RuntimeError: Вызов из потока, в котором уже работает event loop.
+    """
+    return asyncio.run(run_ffmpeg_command(command, **kwargs))
@@ -0,0 +1,60 @@
+import shutil
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from . import config
+from .capacity import render_limiter
+from .cpu import encoder_threads
+from .ffmpeg_runner import active_runs
+from .workspace import workspace_disk_free_bytes
+
+health_router = APIRouter(prefix="/health")
+
+
+def ffmpeg_available() -> bool:
+    """Проверка, что ffmpeg и ffprobe есть в PATH."""
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+@health_router.get("/live")
+async def liveness():
+    """
+    Процесс жив и обслуживает event loop. На него смотрит healthcheck
+    контейнера; /health/ready — для балансировщика.
+    """
+    return {"status": "alive"}
+
+
+@health_router.get("/ready")
+async def readiness():
+    """
+    Готовность принимать рендеры: свободные слоты, глубина очереди, запас места
+    в рабочем каталоге и наличие ffmpeg. При насыщении возвращает 503, чтобы
+    балансировщик убрал реплику из ротации до того, как запросы начнут отваливаться.
+    """
+    disk_free = workspace_disk_free_bytes.value()
+    checks = {
+        "free_slots": render_limiter.free_slots,
+        "total_slots": render_limiter.slots,
+        "queue_depth": render_limiter.waiting,
+        "queue_limit": render_limiter.queue_limit,
+        "encoder_threads": encoder_threads(),
+        "ffmpeg_runs": active_runs(),
+        "workspace_free_bytes": disk_free,
+        "ffmpeg": ffmpeg_available(),
+    }
+
+    problems = []
+    if render_limiter.saturated:
+        problems.append("saturated")
+    if disk_free < config.MIN_WORKSPACE_HEADROOM_BYTES:
+        problems.append("low_disk")
+    if not checks["ffmpeg"]:
+        problems.append("ffmpeg_missing")
+
+    status_code = 503 if problems else 200
+    return JSONResponse(
+        status_code=status_code,
+        content={"status": "not_ready" if problems else "ready", "problems": problems, **checks},
+    )
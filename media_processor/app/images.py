@@ -0,0 +1,103 @@
+import io
+from typing import NamedTuple
+
+from PIL import Image
+
+from . import config
+
+# Форматы, которые принимаются как обложка
+ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF", "BMP"}
+# Режимы, для которых Image.reduce работает без преобразования
+REDUCIBLE_MODES = {"L", "LA", "RGB", "RGBA"}
+
+
+class ImageRejected(Exception):
+    """Изображение не прошло проверку (формат или лимиты размера)."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ImageInfo(NamedTuple):
+    """Сведения из заголовка изображения."""
+    format: str
+    width: int
+    height: int
+
+
+def _open(content: bytes) -> Image.Image:
+    """Открывает изображение, читая только заголовок (пиксели не декодируются)."""
+    if len(content) > config.MAX_IMAGE_BYTES:
+        raise ImageRejected(413, "Файл изображения слишком большой")
+    try:
+        img = Image.open(io.BytesIO(content))
+    except Image.DecompressionBombError:
+        raise ImageRejected(413, "Изображение слишком большое")
+    except Exception:
+        raise ImageRejected(400, "Не удалось обработать файл как изображение")
+
+    if img.format not in ALLOWED_FORMATS:
+        raise ImageRejected(400, f"Формат изображения не поддерживается: {img.format}")
+    width, height = img.size
+    if width <= 0 or height <= 0:
+        raise ImageRejected(400, "Не удалось обработать файл как изображение")
+    if width * height > config.MAX_IMAGE_PIXELS:
+        raise ImageRejected(413, f"Изображение слишком большое: {width}x{height}")
+    return img
+
+
+def inspect_image(content: bytes) -> ImageInfo:
+    """
+    Проверка изображения по заголовку: формат, лимит байт и лимит числа
+    пикселей. Изображение не декодируется.
+
+    Args:
+        content: Байты изображения.
+
+    Returns:
+        ImageInfo: Формат и размеры.
+
+    Raises:
+        ImageRejected: Изображение не подходит.
+    """
+    img = _open(content)
+    return ImageInfo(img.format, img.width, img.height)
+
+
+def decode_image(content: bytes, min_side: int = config.FRAME_SIZE) -> Image.Image:
+    """
+    Декодирует изображение для обрезки, сразу уменьшая его так, чтобы
+    меньшая сторона была не меньше min_side. JPEG декодируется сразу
+    в уменьшенном виде (масштабирование DCT), остальные форматы
+    уменьшаются в целое число раз после декодирования.
+
+    Args:
+        content: Байты изображения.
+        min_side: Меньшая сторона, которая понадобится после обрезки.
+
+    Returns:
+        Image.Image: Декодированное изображение.
+
+    Raises:
+        ImageRejected: Изображение не подходит.
+    """
+    img = _open(content)
+    width, height = img.size
+    factor = min(width, height) // min_side
+    if img.format == "JPEG" and factor >= 2:
+        # draft выбирает наибольший масштаб 1/2..1/8, при котором обе стороны
+        # не меньше запрошенных
+        img.draft("RGB", (width // factor, height // factor))
+
+    try:
+        img.load()
+    except Exception:
+        raise ImageRejected(400, "Не удалось обработать файл как изображение")
+
+    factor = min(img.size) // min_side
+    if factor >= 2:
+        if img.mode not in REDUCIBLE_MODES:
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+        img = img.reduce(factor)
+    return img
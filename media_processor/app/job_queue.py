@@ -0,0 +1,269 @@
+import json
+import os
+import secrets
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+from threading import Lock
+from typing import NamedTuple, Optional
+
+from . import config
+from .metrics import Counter
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    available_at REAL NOT NULL,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, available_at, created);
+"""
+
+_queues: dict[str, "JobQueue"] = {}
+_queues_lock = Lock()
+
+job_events = Counter("media_jobs_total", "События очереди задач рендера")
+
+
+class Job(NamedTuple):
+    """Задача рендера из очереди."""
+    id: str
+    status: str
+    params: dict
+    attempts: int
+    max_attempts: int
+    lease_owner: Optional[str]
+    lease_expires: Optional[float]
+    error: Optional[str]
+    created: float
+    updated: float
+
+
+def _row_to_job(row: sqlite3.Row) -> Job:
+    return Job(
+        id=row["id"],
+        status=row["status"],
+        params=json.loads(row["params"]),
+        attempts=row["attempts"],
+        max_attempts=row["max_attempts"],
+        lease_owner=row["lease_owner"],
+        lease_expires=row["lease_expires"],
+        error=row["error"],
+        created=row["created"],
+        updated=row["updated"],
+    )
+
+
+class JobQueue:
+    """
+    Надежная очередь задач в SQLite. Задача выдается воркеру в аренду
+    (lease) на время видимости; воркер продлевает аренду, пока работает.
+    Если воркер упал, аренда истекает и задачу забирает другой воркер,
+    пока не исчерпано число попыток.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return closing(conn)
+
+    @contextmanager
+    def _transaction(self, immediate: bool = False):
+        """
+        Соединение на время одной транзакции. BEGIN IMMEDIATE сразу берет
+        блокировку записи, чтобы два воркера не забрали одну задачу.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def enqueue(self, params: dict, job_id: Optional[str] = None) -> str:
+        """
+        Ставит задачу в очередь.
+
+        Args:
+            params: Параметры рендера (сериализуются в JSON).
+            job_id: Идентификатор (по умолчанию — случайный).
+
+        Returns:
+            str: Идентификатор задачи.
+        """
+        job_id = job_id or secrets.token_hex(16)
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, params, max_attempts, available_at, created, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, json.dumps(params), config.JOB_MAX_ATTEMPTS, now, now, now)
+            )
+        job_events.inc(event="enqueued")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Задача по идентификатору или None."""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row is not None else None
+
+    def claim(self, worker_id: str, visibility_timeout: float) -> Optional[Job]:
+        """
+        Забирает в аренду самую старую готовую задачу: из очереди или
+        с истекшей арендой (воркер упал). Задачи с истекшей арендой
+        и исчерпанными попытками помечаются как неудачные.
+
+        Args:
+            worker_id: Идентификатор воркера.
+            visibility_timeout: Срок аренды в секундах.
+
+        Returns:
+            Optional[Job]: Задача или None, если очередь пуста.
+        """
+        now = time.time()
+        with self._transaction(immediate=True) as conn:
+            abandoned = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated = ?"
+                " WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts",
+                (JOB_FAILED, "Воркер не завершил задачу за отведенное число попыток", now, JOB_RUNNING, now)
+            ).rowcount
+            row = conn.execute(
+                "SELECT * FROM jobs"
+                " WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_expires < ?)"
+                " ORDER BY created LIMIT 1",
+                (JOB_QUEUED, now, JOB_RUNNING, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1,"
+                    " updated = ? WHERE id = ?",
+                    (JOB_RUNNING, worker_id, now + visibility_timeout, now, row["id"])
+                )
+        if abandoned:
+            job_events.inc(abandoned, event="abandoned")
+        if row is None:
+            return None
+        if row["status"] == JOB_RUNNING:
+            job_events.inc(event="lease_expired")
+        job_events.inc(event="claimed")
+        return self.get(row["id"])
+
+    def heartbeat(self, job_id: str, worker_id: str, visibility_timeout: float) -> bool:
+        """
+        Продлевает аренду задачи.
+
+        Returns:
+            bool: False, если аренда уже перешла к другому воркеру.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                (now + visibility_timeout, now, job_id, JOB_RUNNING, worker_id)
+            ).rowcount
+        return updated == 1
+
+    def complete(self, job_id: str, worker_id: str) -> bool:
+        """
+        Отмечает задачу выполненной.
+
+        Returns:
+            bool: False, если аренда уже перешла к другому воркеру.
+        """
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, error = NULL, updated = ?"
+                " WHERE id = ? AND status = ? AND lease_owner = ?",
+                (JOB_DONE, time.time(), job_id, JOB_RUNNING, worker_id)
+            ).rowcount
+        if updated:
+            job_events.inc(event="done")
+        return updated == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True) -> bool:
+        """
+        Возвращает задачу в очередь с задержкой или, если попытки
+        исчерпаны (или retry=False), отмечает ее неудачной.
+
+        Returns:
+            bool: False, если аренда уже перешла к другому воркеру.
+        """
+        now = time.time()
+        with self._transaction(immediate=True) as conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = ? AND lease_owner = ?",
+                (job_id, JOB_RUNNING, worker_id)
+            ).fetchone()
+            if row is None:
+                return False
+            if retry and row["attempts"] < row["max_attempts"]:
+                status = JOB_QUEUED
+                available_at = now + config.JOB_RETRY_DELAY_SECONDS * row["attempts"]
+            else:
+                status, available_at = JOB_FAILED, now
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL,"
+                " available_at = ?, updated = ? WHERE id = ?",
+                (status, error, available_at, now, job_id)
+            )
+        job_events.inc(event="retried" if status == JOB_QUEUED else "failed")
+        return True
+
+    def purge_finished(self, older_than: float) -> list[str]:
+        """
+        Удаляет завершенные задачи, обновленные раньше older_than.
+
+        Returns:
+            list[str]: Идентификаторы удаленных задач.
+        """
+        with self._transaction(immediate=True) as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND updated < ?",
+                (JOB_DONE, JOB_FAILED, older_than)
+            ).fetchall()
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(row["id"],) for row in rows])
+        return [row["id"] for row in rows]
+
+    def counts(self) -> dict[str, int]:
+        """Число задач по статусам."""
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+def get_job_queue() -> JobQueue:
+    """Очередь задач по пути JOBS_DB_PATH (создается при первом обращении)."""
+    path = config.JOBS_DB_PATH
+    with _queues_lock:
+        queue = _queues.get(path)
+        if queue is None:
+            queue = _queues[path] = JobQueue(path)
+    return queue
+
+
+def job_dir(job_id: str) -> str:
+    """Каталог входных файлов и результата задачи (в общем хранилище)."""
+    return os.path.join(config.JOBS_DIR, job_id)
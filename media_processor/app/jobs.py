@@ -0,0 +1,144 @@
+import os
+import re
+import secrets
+import shutil
+from typing import Optional
+
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse
+
+from .job_queue import JOB_DONE, JOB_FAILED, Job, get_job_queue, job_dir
+from .metrics import Gauge
+from .schemas import HTTPError
+from .templates import PLAIN_TEMPLATE_ID
+from .utils import (
+    validate_animation, validate_audio_file, validate_audio_file_range, validate_audio_range,
+    validate_fades, validate_image_content, validate_template
+)
+from .worker import result_path
+
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+jobs_router = APIRouter(prefix="/jobs")
+
+
+def _job_status(job: Job) -> dict:
+    return {"job_id": job.id, "status": job.status, "attempts": job.attempts, "error": job.error}
+
+
+def _get_job(job_id: str) -> Job:
+    job = get_job_queue().get(job_id) if JOB_ID_PATTERN.match(job_id) else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
+
+
+def _enqueue_job(job_id: str, audio_bytes: bytes, cover_bytes: bytes, params: dict) -> None:
+    """
+    Записывает входные файлы в каталог задачи, проверяет аудио через
+    ffprobe и только затем ставит задачу в очередь.
+    """
+    directory = job_dir(job_id)
+    os.makedirs(directory)
+    try:
+        audio_path = os.path.join(directory, params["audio_file"])
+        with open(audio_path, "wb") as f:
+            f.write(audio_bytes)
+        if params["start"] is not None:
+            validate_audio_file_range(audio_path, params["start"], params["end"])
+        else:
+            validate_audio_file(audio_path)
+        with open(os.path.join(directory, params["cover_file"]), "wb") as f:
+            f.write(cover_bytes)
+        get_job_queue().enqueue(params, job_id=job_id)
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+
+@jobs_router.post(
+    "",
+    status_code=202,
+    responses={400: {"model": HTTPError, "description": "Invalid request"}}
+)
+async def create_job_endpoint(
+    audio_file: UploadFile = File(...),
+    image_file: UploadFile = File(...),
+    template: str = Form(PLAIN_TEMPLATE_ID),
+    animated: bool = Form(False),
+    start: Optional[int] = Form(None),
+    end: Optional[int] = Form(None),
+    fade_in: float = Form(0.0),
+    fade_out: float = Form(0.0)
+):
+    """
+    Ставит создание видео в очередь для воркеров (worker.py) и сразу
+    возвращает идентификатор задачи. Параметры те же, что у /create_video,
+    плюс необязательный отрезок start/end и плавные переходы fade_in/fade_out.
+
+    Returns:
+        dict: Идентификатор и статус задачи.
+    """
+    validate_template(template)
+    validate_animation(template, animated)
+    validate_fades(fade_in, fade_out, end - start if start is not None and end is not None else None)
+    image_content = await validate_image_content(image_file)
+    if (start is None) != (end is None):
+        raise HTTPException(status_code=400, detail="Параметры start и end передаются вместе")
+    if start is not None:
+        validate_audio_range(start, end)
+    # Аудио проверяется в пуле потоков уже в каталоге задачи (см. _enqueue_job)
+    audio_content = await audio_file.read()
+
+    job_id = secrets.token_hex(16)
+    params = {
+        "audio_file": "audio",
+        "cover_file": "cover",
+        "template": template,
+        "animated": animated,
+        "start": start,
+        "end": end,
+        "fade_in": fade_in,
+        "fade_out": fade_out,
+    }
+    await run_in_threadpool(_enqueue_job, job_id, audio_content, image_content, params)
+    return {"job_id": job_id, "status": "queued"}
+
+
+@jobs_router.get("/{job_id}", responses={404: {"model": HTTPError, "description": "Job not found"}})
+async def job_status_endpoint(job_id: str):
+    """
+    Статус задачи: queued, running, done или failed
+    (с текстом ошибки последней попытки).
+    """
+    return _job_status(await run_in_threadpool(_get_job, job_id))
+
+
+@jobs_router.get(
+    "/{job_id}/result",
+    response_model=None,
+    responses={
+        404: {"model": HTTPError, "description": "Job not found"},
+        409: {"description": "Job is not finished yet or failed"}
+    }
+)
+async def job_result_endpoint(job_id: str):
+    """
+    Готовое видео задачи. Пока задача не выполнена, отвечает 409 со статусом.
+    """
+    job = await run_in_threadpool(_get_job, job_id)
+    if job.status != JOB_DONE:
+        return JSONResponse(status_code=409, content=_job_status(job))
+    path = result_path(job.id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Результат задачи уже удален")
+    return FileResponse(path, media_type="video/mp4", filename=f"{job.id}.mp4")
+
+
+def _pending_jobs() -> int:
+    counts = get_job_queue().counts()
+    return sum(count for status, count in counts.items() if status not in (JOB_DONE, JOB_FAILED))
+
+
+jobs_pending = Gauge("media_jobs_pending", "Задачи в очереди и в работе у воркеров", function=_pending_jobs)
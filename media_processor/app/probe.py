@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from threading import Lock, get_ident
+from typing import NamedTuple, Optional
+
+import ffmpeg
+
+from . import config
+
+# Для ключа хэшируются только начало и конец файла
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+_memory_cache: "OrderedDict[str, ProbeInfo]" = OrderedDict()
+_memory_cache_lock = Lock()
+
+
+class ProbeInfo(NamedTuple):
+    """Метаданные медиафайла, нужные сервисам."""
+    duration: float
+    codec: Optional[str]
+    sample_rate: Optional[int]
+    channels: Optional[int]
+    bitrate: Optional[int]
+
+
+def _optional_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def probe_key(path: str) -> str:
+    """
+    Ключ кэша: размер файла и хэш первого и последнего мегабайта.
+
+    Args:
+        path: Путь к файлу.
+
+    Returns:
+        str: Ключ кэша.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        digest.update(f.read(_HASH_CHUNK_SIZE))
+        if size > _HASH_CHUNK_SIZE:
+            f.seek(max(_HASH_CHUNK_SIZE, size - _HASH_CHUNK_SIZE))
+            digest.update(f.read(_HASH_CHUNK_SIZE))
+    return f"{size}_{digest.hexdigest()}"
+
+
+def parse_probe(probe_result: dict) -> ProbeInfo:
+    """
+    Достает из ответа ffprobe длительность и параметры первой аудиодорожки.
+
+    Args:
+        probe_result: Результат ffmpeg.probe.
+
+    Returns:
+        ProbeInfo: Метаданные файла.
+    """
+    format_info = probe_result.get('format', {})
+    audio_stream = next(
+        (s for s in probe_result.get('streams', []) if s.get('codec_type') == 'audio'),
+        {}
+    )
+    return ProbeInfo(
+        duration=float(format_info['duration']),
+        codec=audio_stream.get('codec_name'),
+        sample_rate=_optional_int(audio_stream.get('sample_rate')),
+        channels=_optional_int(audio_stream.get('channels')),
+        bitrate=_optional_int(audio_stream.get('bit_rate') or format_info.get('bit_rate')),
+    )
+
+
+def _remember(key: str, info: ProbeInfo) -> None:
+    with _memory_cache_lock:
+        _memory_cache[key] = info
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > config.PROBE_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+
+def _read_disk_cache(key: str) -> Optional[ProbeInfo]:
+    path = os.path.join(config.PROBE_CACHE_DIR, f"{key}.json")
+    try:
+        with open(path, "r", encoding="utf8") as f:
+            info = ProbeInfo(**json.load(f))
+        # mtime — время последнего использования, по нему вытесняются записи
+        os.utime(path)
+        return info
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def _evict_disk_cache() -> None:
+    """Удаляет давно не использованные записи сверх PROBE_CACHE_MAX_FILES."""
+    entries = []
+    for name in os.listdir(config.PROBE_CACHE_DIR):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(config.PROBE_CACHE_DIR, name)
+        try:
+            entries.append((os.path.getmtime(path), path))
+        except OSError:
+            pass
+    if len(entries) <= config.PROBE_CACHE_MAX_FILES:
+        return
+    entries.sort()
+    for _, path in entries[:len(entries) - config.PROBE_CACHE_MAX_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _is_temporary(path: str) -> bool:
+    """Файл в рабочем каталоге задачи: удалится вместе с ним, на диск не кэшируется."""
+    root = os.path.realpath(config.WORKSPACE_ROOT)
+    return os.path.realpath(path).startswith(root + os.sep)
+
+
+def _write_disk_cache(key: str, info: ProbeInfo) -> None:
+    os.makedirs(config.PROBE_CACHE_DIR, exist_ok=True)
+    path = os.path.join(config.PROBE_CACHE_DIR, f"{key}.json")
+    tmp_path = f"{path}.{os.getpid()}.{get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf8") as f:
+            json.dump(info._asdict(), f)
+        os.replace(tmp_path, path)
+        _evict_disk_cache()
+    except OSError as e:
+        print(f"Не удалось сохранить кэш ffprobe: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def probe(path: str) -> ProbeInfo:
+    """
+    Возвращает метаданные файла. Сначала проверяется кэш в памяти, затем
+    кэш на диске, и только при промахе запускается ffprobe. Файлы рабочих
+    каталогов задач (промежуточные, удаляются после задачи) кэшируются
+    только в памяти.
+
+    Args:
+        path: Путь к медиафайлу.
+
+    Returns:
+        ProbeInfo: Метаданные файла.
+    """
+    key = probe_key(path)
+
+    with _memory_cache_lock:
+        info = _memory_cache.get(key)
+        if info is not None:
+            _memory_cache.move_to_end(key)
+            return info
+
+    persistent = not _is_temporary(path)
+    info = _read_disk_cache(key) if persistent else None
+    if info is None:
+        info = parse_probe(ffmpeg.probe(path))
+        if persistent:
+            _write_disk_cache(key, info)
+
+    _remember(key, info)
+    return info
+
+
+def clear_probe_cache() -> None:
+    """Очищает кэш метаданных в памяти."""
+    with _memory_cache_lock:
+        _memory_cache.clear()
@@ -0,0 +1,187 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from . import config
+
+PROFILE_SUFFIXES = (".prof", ".txt")
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+# В одном потоке может работать только один cProfile
+_thread_state = threading.local()
+
+
+class RequestProfile:
+    """Профиль одного запроса: cProfile по потокам и вывод ffmpeg -benchmark."""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.time()
+        self.profilers: list[cProfile.Profile] = []
+        self.ffmpeg_logs: list[tuple[list[str], str]] = []
+
+    def add_ffmpeg_log(self, args: list[str], stderr: bytes) -> None:
+        """Сохраняет аргументы и stderr запуска ffmpeg с -benchmark."""
+        self.ffmpeg_logs.append((args, (stderr or b"").decode("utf8", errors="replace")))
+
+
+def current_profile() -> Optional[RequestProfile]:
+    """Профиль текущего запроса или None, если запрос не профилируется."""
+    return _current_profile.get()
+
+
+@contextmanager
+def profile_thread():
+    """
+    Профилирует блок кода в текущем потоке, если запрос профилируется.
+    Нужен для кода, который выполняется вне потока event loop.
+    """
+    profile = current_profile()
+    if profile is None or getattr(_thread_state, "active", False):
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    _thread_state.active = True
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _thread_state.active = False
+        profile.profilers.append(profiler)
+
+
+def run_profiled(func, *args, **kwargs):
+    """
+    Вызывает func внутри profile_thread(). Используется для работы,
+    вынесенной в пул потоков (контекст запроса копируется в поток).
+    """
+    with profile_thread():
+        return func(*args, **kwargs)
+
+
+def should_profile(headers: dict) -> bool:
+    """
+    Решает, профилировать ли запрос.
+
+    Args:
+        headers: Заголовки запроса (ключи в нижнем регистре).
+    """
+    if config.PROFILING_MODE == "always":
+        return True
+    if config.PROFILING_MODE == "header":
+        return (
+            headers.get("x-profile") == "1"
+            and config.ADMIN_TOKEN is not None
+            and secrets.compare_digest(headers.get("x-admin-token", "").encode(), config.ADMIN_TOKEN.encode())
+        )
+    return False
+
+
+def _profile_id(profile: RequestProfile) -> str:
+    timestamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(profile.started))
+    path = re.sub(r"[^A-Za-z0-9]+", "_", profile.path).strip("_") or "root"
+    return f"{timestamp}_{profile.method}_{path}_{secrets.token_hex(4)}"
+
+
+def _render_report(profile: RequestProfile, stats: Optional[pstats.Stats], elapsed: float) -> str:
+    report = io.StringIO()
+    report.write(f"{profile.method} {profile.path}\n")
+    report.write(f"Время обработки: {elapsed:.3f} с\n\n")
+    if stats is not None:
+        stats.stream = report
+        stats.sort_stats("cumulative").print_stats(40)
+    for args, stderr in profile.ffmpeg_logs:
+        report.write("\n=== ffmpeg " + " ".join(args) + "\n")
+        # Из вывода -benchmark интересны только строки bench:
+        bench_lines = [line for line in stderr.splitlines() if line.startswith("bench:")]
+        report.write("\n".join(bench_lines or stderr.splitlines()[-20:]) + "\n")
+    return report.getvalue()
+
+
+def list_profiles() -> list[str]:
+    """Идентификаторы сохраненных профилей, от новых к старым."""
+    if not os.path.isdir(config.PROFILE_DIR):
+        return []
+    profile_ids = {
+        os.path.splitext(name)[0]
+        for name in os.listdir(config.PROFILE_DIR)
+        if name.endswith(PROFILE_SUFFIXES)
+    }
+    return sorted(profile_ids, reverse=True)
+
+
+def _remove_old_profiles() -> None:
+    for profile_id in list_profiles()[config.PROFILE_MAX_COUNT:]:
+        for suffix in PROFILE_SUFFIXES:
+            try:
+                os.remove(os.path.join(config.PROFILE_DIR, profile_id + suffix))
+            except OSError:
+                pass
+
+
+def save_profile(profile: RequestProfile, elapsed: float) -> str:
+    """
+    Сохраняет профиль (.prof для pstats/snakeviz и текстовый отчет .txt)
+    и удаляет самые старые профили сверх лимита.
+
+    Returns:
+        str: Идентификатор профиля.
+    """
+    os.makedirs(config.PROFILE_DIR, exist_ok=True)
+    profile_id = _profile_id(profile)
+    base_path = os.path.join(config.PROFILE_DIR, profile_id)
+
+    stats = pstats.Stats(*profile.profilers) if profile.profilers else None
+    if stats is not None:
+        stats.dump_stats(base_path + ".prof")
+    with open(base_path + ".txt", "w", encoding="utf8") as f:
+        f.write(_render_report(profile, stats, elapsed))
+
+    _remove_old_profiles()
+    return profile_id
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware, профилирующая выбранные запросы. Подключается только
+    при PROFILING_MODE != off, поэтому выключенное профилирование ничего не стоит.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin1").lower(): value.decode("latin1") for key, value in scope["headers"]}
+        if scope["path"].startswith("/admin") or not should_profile(headers):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = _current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            with profile_thread():
+                await self.app(scope, receive, send)
+        finally:
+            _current_profile.reset(token)
+            try:
+                profile_id = save_profile(profile, time.perf_counter() - started)
+                print(f"Профиль запроса сохранен: {profile_id}")
+            except OSError as e:
+                print(f"Не удалось сохранить профиль запроса: {e}")
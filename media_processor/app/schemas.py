@@ -1,4 +1,30 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
+from .templates import PLAIN_TEMPLATE_ID
+
 class HTTPError(BaseModel):
-    detail: str
\ No newline at end of file
+    detail: str
+
+class VideoByReferenceRequest(BaseModel):
+    track_id: str
+    start: int
+    end: int
+    cover_id: Optional[str] = None
+    template: str = PLAIN_TEMPLATE_ID
+    animated: bool = False
+    fade_in: float = 0.0
+    fade_out: float = 0.0
+
+
+class SharedVideoRequest(BaseModel):
+    audio_path: str
+    cover_path: str
+    output_path: Optional[str] = None
+    start: Optional[int] = None
+    end: Optional[int] = None
+    template: str = PLAIN_TEMPLATE_ID
+    animated: bool = False
+    fade_in: float = 0.0
+    fade_out: float = 0.0
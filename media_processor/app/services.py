@@ -2,31 +2,117 @@
 import io
 import os
 import ffmpeg
-import tempfile
-from typing import BinaryIO
-import uuid
-from PIL import Image
+from typing import BinaryIO, Optional, Union
 from pydub import AudioSegment
 
-async def trim_audio(audio_file: bytes, start_time: int, end_time: int) -> io.BytesIO:
+from . import config, ffmpeg_runner
+from .animation import link_rotation_loop
+from .cpu import encoder_threads
+from .budget import (
+    DEFAULT_STEP_RATIO, MUX_OVERHEAD_BYTES, MUX_OVERHEAD_RATIO, EncodePlan, corrected_crf, plan_loop_encode,
+    plan_static_encode, predicted_file_bytes, record_prediction, size_budget_exceeded,
+    size_budget_second_passes, video_budget_bytes
+)
+from .probe import probe
+from .profiling import current_profile
+from .workspace import JobWorkspace, job_workspace
+from .templates import PLAIN_TEMPLATE_ID, cover_hash, get_cover_frame
+
+# Частота кадров видео из неподвижной обложки
+STATIC_VIDEO_FPS = 25
+# Максимальная длина видео в секундах
+MAX_VIDEO_SECONDS = 55
+
+
+def audio_edge_fades(
+    duration: float,
+    fade_in: float = 0.0,
+    fade_out: float = 0.0,
+    cut_start: bool = False,
+    cut_end: bool = False
+) -> list[dict]:
+    """
+    Параметры фильтров afade для краев отрезка. На месте разреза
+    (cut_start/cut_end) добавляется короткое затухание AUDIO_DECLICK_SECONDS,
+    чтобы не было щелчка, даже если плавный переход не запрошен.
+
+    Args:
+        duration: Длина получаемого аудио в секундах.
+        fade_in: Длительность плавного нарастания.
+        fade_out: Длительность плавного затухания.
+        cut_start: Начало отрезка — разрез посреди трека.
+        cut_end: Конец отрезка — разрез посреди трека.
+
+    Returns:
+        list[dict]: Аргументы afade (пустой список — фильтры не нужны).
+    """
+    declick = config.AUDIO_DECLICK_SECONDS
+    fade_in = max(fade_in, declick if cut_start else 0.0)
+    fade_out = max(fade_out, declick if cut_end else 0.0)
+    # Переходы не длиннее половины отрезка, чтобы не перекрывались
+    fade_in = min(fade_in, duration / 2)
+    fade_out = min(fade_out, duration / 2)
+
+    filters = []
+    if fade_in > 0:
+        filters.append({'t': 'in', 'st': 0, 'd': round(fade_in, 3)})
+    if fade_out > 0:
+        filters.append({'t': 'out', 'st': round(duration - fade_out, 3), 'd': round(fade_out, 3)})
+    return filters
+
+
+def afade_filter_string(filters: list[dict]) -> str:
+    """
+    Цепочка фильтров afade в синтаксисе -af ffmpeg.
+
+    Args:
+        filters: Аргументы afade из audio_edge_fades.
+
+    Returns:
+        str: Например "afade=t=in:st=0:d=2,afade=t=out:st=28:d=2".
+    """
+    return ",".join(
+        "afade=" + ":".join(f"{key}={value}" for key, value in options.items())
+        for options in filters
+    )
+
+
+def trim_audio(
+    audio_file: Union[bytes, str],
+    start_time: int,
+    end_time: int,
+    fade_in: float = 0.0,
+    fade_out: float = 0.0
+) -> io.BytesIO:
     """
-    Обрезает аудиофайл до заданного временного отрезка.
+    Обрезает аудиофайл до заданного временного отрезка. Плавные переходы
+    и сглаживание разрезов накладываются фильтром afade в том же вызове
+    ffmpeg, который кодирует MP3, без отдельного прохода по PCM.
 
     Args:
-        audio_file: Байты аудиофайла.
+        audio_file: Байты аудиофайла или путь к нему.
         start_time: Начало отрезка в секундах.
         end_time: Конец отрезка в секундах.
+        fade_in: Длительность плавного нарастания в секундах.
+        fade_out: Длительность плавного затухания в секундах.
 
     Returns:
         io.BytesIO: Объект, содержащий обрезанный аудиофайл в формате MP3.
     """
     try:
-        audio = AudioSegment.from_file(io.BytesIO(audio_file))
+        source = audio_file if isinstance(audio_file, str) else io.BytesIO(audio_file)
+        audio = AudioSegment.from_file(source)
         start_ms = start_time * 1000
         end_ms = end_time * 1000
         trimmed_audio = audio[start_ms:end_ms]
+        filters = audio_edge_fades(
+            len(trimmed_audio) / 1000, fade_in, fade_out,
+            cut_start=start_ms > 0,
+            cut_end=end_ms < len(audio)
+        )
+        parameters = ["-af", afade_filter_string(filters)] if filters else None
         output_buffer = io.BytesIO()
-        trimmed_audio.export(output_buffer, format="mp3")
+        trimmed_audio.export(output_buffer, format="mp3", parameters=parameters)
         output_buffer.seek(0)
         return output_buffer
     except Exception as e:
@@ -34,145 +120,295 @@ async def trim_audio(audio_file: bytes, start_time: int, end_time: int) -> io.By
         return io.BytesIO()
 
 
-def crop_to_square(image_file: BinaryIO) -> io.BytesIO:
+def run_ffmpeg(stream, error_message: str) -> None:
     """
-    Обрезает изображение до квадратной формы по центру и по меньшей стороне.
+    Запускает ffmpeg через asyncio-подпроцесс (см. ffmpeg_runner).
+    Если запрос профилируется, добавляет -benchmark и сохраняет вывод в профиль.
 
     Args:
-        image_file: Байты файла изображения.
-
-    Returns:
-        io.BytesIO: Объект, содержащий обрезанное изображение в формате PNG.
+        stream: Собранная команда ffmpeg-python.
+        error_message: Сообщение, печатаемое при ошибке.
     """
+    profile = current_profile()
+    if profile is not None:
+        stream = stream.global_args('-benchmark')
     try:
-        img = Image.open(image_file)
-        width, height = img.size
-
-        # if width == height:
-        #     return image_file  # Изображение уже квадратное
-
-        min_side = min(width, height)
-        left = (width - min_side) // 2
-        top = (height - min_side) // 2
-        right = (width + min_side) // 2
-        bottom = (height + min_side) // 2
-
-        cropped_img = img.crop((left, top, right, bottom))
-        if min_side > 640:
-            cropped_img = cropped_img.resize((640, 640), Image.LANCZOS)
-        output_buffer = io.BytesIO()
-        cropped_img.save(output_buffer, format="PNG")
-        output_buffer.seek(0)
-        return output_buffer
-    except Exception as e:
-        print(f"Ошибка при обработке изображения: {e}")
-        return io.BytesIO()
+        result = ffmpeg_runner.run_ffmpeg_command_sync(stream.compile())
+    except ffmpeg_runner.FfmpegError as e:
+        print(error_message)
+        print(e.stderr_tail)
+        raise
+    if profile is not None:
+        profile.add_ffmpeg_log(stream.get_args(), result.stderr.encode("utf8"))
 
 
-def create_video_from_audio_and_cover_files(audio_file: BinaryIO, image_file: BinaryIO) -> bytes:
+def create_video_from_audio_and_cover_files(
+    audio_file: BinaryIO,
+    image_file: BinaryIO,
+    template_id: str = PLAIN_TEMPLATE_ID,
+    animated: bool = False,
+    fade_in: float = 0.0,
+    fade_out: float = 0.0
+) -> bytes:
     """
     Создание видео из аудио и обложки
 
     Args:
         audio_file: Загружаемый аудиофайл.
         image_file: Загружаемый файл с изображением.
+        template_id: Шаблон оформления обложки ("cover" — просто квадрат).
+        animated: Вращать пластинку. Петля одного оборота кодируется
+            один раз на обложку и шаблон и затем только копируется.
+        fade_in: Плавное нарастание звука в секундах.
+        fade_out: Плавное затухание звука в секундах.
 
     Returns:
         video_bytes: Видео в байтах.
     """
-    audio_suffix = ".aac"
-    audio_converted_suffix = ".aac"
-    image_suffix = ".png"
-    video_suffix = ".mp4"
+    # Все промежуточные файлы живут в отдельном рабочем каталоге задачи,
+    # который удаляется целиком (а при падении процесса — уборщиком)
+    with job_workspace() as workspace:
+        tmp_audio_name = workspace.write("audio_source", audio_file.read())
+        return render_video_in_workspace(
+            workspace, tmp_audio_name, image_file.read(), template_id, animated,
+            fade_in=fade_in, fade_out=fade_out
+        )
 
-    tmp_audio_name = os.path.join(tempfile.gettempdir(), f"tmp_audio_{uuid.uuid4()}{audio_suffix}")
-    tmp_audio_converted_name = os.path.join(tempfile.gettempdir(), f"tmp_audio_converted_{uuid.uuid4()}{audio_converted_suffix}")
-    tmp_image_name = os.path.join(tempfile.gettempdir(), f"tmp_image_{uuid.uuid4()}{image_suffix}")
-    tmp_video_name = os.path.join(tempfile.gettempdir(), f"tmp_video_{uuid.uuid4()}{video_suffix}")
 
-    try:
-        # Сохраняем исходные файлы
-        with open(tmp_audio_name, "wb") as f:
-            f.write(audio_file.read())
-
-        cropped_image_buffer = crop_to_square(image_file)
-        with open(tmp_image_name, "wb") as f:
-            f.write(cropped_image_buffer.read())
-
-        # Перекодируем аудио в AAC-LC с нормализацией частоты и каналов
-        audio_stream = ffmpeg.input(tmp_audio_name)
-        audio_out = ffmpeg.output(
-            audio_stream,
-            tmp_audio_converted_name,
-            acodec='aac',
-            ar='44100',
-            ac='2',
-            strict='experimental'
+def render_video_in_workspace(
+    workspace: JobWorkspace,
+    tmp_audio_name: str,
+    cover_bytes: bytes,
+    template_id: str = PLAIN_TEMPLATE_ID,
+    animated: bool = False,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    fade_in: float = 0.0,
+    fade_out: float = 0.0
+) -> bytes:
+    """
+    Создание видео из аудиофайла, уже записанного в рабочий каталог задачи.
+
+    Args:
+        workspace: Рабочий каталог задачи.
+        tmp_audio_name: Путь к исходному аудио (в рабочем каталоге или в кэше).
+        cover_bytes: Байты обложки.
+        template_id: Шаблон оформления обложки.
+        animated: Вращать пластинку.
+        start: Начало отрезка в секундах (None — с начала).
+        end: Конец отрезка в секундах (None — до конца).
+        fade_in: Плавное нарастание звука в секундах.
+        fade_out: Плавное затухание звука в секундах.
+
+    Returns:
+        video_bytes: Видео в байтах.
+    """
+    tmp_video_name = render_video_file(
+        workspace, tmp_audio_name, cover_bytes, template_id, animated, start, end, fade_in, fade_out
+    )
+
+    # Читаем результат и возвращаем
+    with open(tmp_video_name, "rb") as f:
+        video_bytes = f.read()
+
+    return video_bytes
+
+
+def render_video_file(
+    workspace: JobWorkspace,
+    tmp_audio_name: str,
+    cover_bytes: bytes,
+    template_id: str = PLAIN_TEMPLATE_ID,
+    animated: bool = False,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    fade_in: float = 0.0,
+    fade_out: float = 0.0
+) -> str:
+    """
+    Рендер видео в файл video.mp4 рабочего каталога задачи.
+
+    Args:
+        workspace: Рабочий каталог задачи.
+        tmp_audio_name: Путь к исходному аудио (в рабочем каталоге или в кэше).
+        cover_bytes: Байты обложки.
+        template_id: Шаблон оформления обложки.
+        animated: Вращать пластинку.
+        start: Начало отрезка в секундах (None — с начала).
+        end: Конец отрезка в секундах (None — до конца).
+        fade_in: Плавное нарастание звука в секундах.
+        fade_out: Плавное затухание звука в секундах.
+
+    Returns:
+        str: Путь к видео в рабочем каталоге.
+    """
+    tmp_audio_converted_name = workspace.file("audio.aac")
+    tmp_image_name = workspace.file("cover.png")
+    tmp_video_name = workspace.file("video.mp4")
+
+    if animated:
+        # Своя ссылка на петлю: кэш может вытеснить ее между проходами
+        loop_path = link_rotation_loop(workspace, cover_bytes, template_id)
+    else:
+        # Кадр обложки берется из кэша по хэшу обложки и шаблону
+        workspace.write("cover.png", get_cover_frame(cover_bytes, template_id))
+
+    # Отрезок вырезается при перекодировании, без отдельного прохода через MP3
+    input_args = {}
+    if start is not None:
+        input_args['ss'] = start
+    if end is not None:
+        input_args['t'] = end - (start or 0)
+
+    # Перекодируем аудио в AAC-LC с нормализацией частоты и каналов;
+    # плавные переходы и сглаживание разрезов — фильтры того же прохода
+    audio_stream = ffmpeg.input(tmp_audio_name, **input_args)
+    if fade_in or fade_out or start or end is not None:
+        if end is not None:
+            segment = end - (start or 0)
+        else:
+            segment = probe(tmp_audio_name).duration - (start or 0)
+        # Затухание заканчивается там, где обрезается видео
+        capped = segment > MAX_VIDEO_SECONDS
+        for options in audio_edge_fades(
+            min(segment, MAX_VIDEO_SECONDS), fade_in, fade_out,
+            cut_start=bool(start),
+            cut_end=end is not None or capped
+        ):
+            audio_stream = audio_stream.filter('afade', **options)
+    audio_out = ffmpeg.output(
+        audio_stream,
+        tmp_audio_converted_name,
+        acodec='aac',
+        ar='44100',
+        ac='2',
+        strict='experimental'
+    )
+    run_ffmpeg(audio_out, "Ошибка при перекодировании аудио:")
+    workspace.account()
+
+    audio_input_stream = ffmpeg.input(tmp_audio_converted_name)
+
+    # Добавляем аудио фильтр для синхронизации, если перекодировать аудио:
+    # audio_filtered = audio_input_stream.filter('aresample', async=1)
+    # Но тут мы копируем аудио (acodec='copy'), поэтому не фильтруем.
+    duration = probe(tmp_audio_converted_name).duration
+    duration = min(MAX_VIDEO_SECONDS, duration)
+
+    # Без бюджета размера видео кодируется с настройками по умолчанию
+    if config.VIDEO_SIZE_BUDGET_BYTES <= 0:
+        if animated:
+            _encode_loop_video(loop_path, audio_input_stream, tmp_video_name, duration)
+        else:
+            _encode_static_video(tmp_image_name, audio_input_stream, tmp_video_name, duration, config.VIDEO_CRF)
+        workspace.account()
+        return tmp_video_name
+
+    audio_bytes = os.path.getsize(tmp_audio_converted_name)
+    video_budget = video_budget_bytes(audio_bytes)
+    plan: Optional[EncodePlan] = None
+    bitrate = None
+    if animated:
+        loop_seconds = config.ANIMATION_FRAMES_PER_TURN / config.ANIMATION_FPS
+        predicted_video_bytes, bitrate = plan_loop_encode(
+            os.path.getsize(loop_path), loop_seconds, duration, video_budget
         )
-        try:
-            ffmpeg.run(audio_out, capture_stderr=True, quiet=False)
-        except ffmpeg.Error as e:
-            print("Ошибка при перекодировании аудио:")
-            print(e.stderr.decode('utf8'))
-            raise
-
-        # Входы для видео и аудио
-        image_stream = ffmpeg.input(tmp_image_name, loop=1, framerate=25)
-        # Масштабируем изображение к четным размерам
-        scaled_image_stream = image_stream.filter('scale', 'ceil(iw/2)*2', 'ceil(ih/2)*2')
-        audio_input_stream = ffmpeg.input(tmp_audio_converted_name)
-
-        # Добавляем аудио фильтр для синхронизации, если перекодировать аудио:
-        # audio_filtered = audio_input_stream.filter('aresample', async=1)
-        # Но тут мы копируем аудио (acodec='copy'), поэтому не фильтруем.
-        duration_info = ffmpeg.probe(tmp_audio_converted_name)
-        duration = float(duration_info['format']['duration'])
-        duration = min(55, duration)
-
-        output_stream = ffmpeg.output(
-            scaled_image_stream,
-            audio_input_stream,
-            tmp_video_name,
-            vcodec='libx264',
-            acodec='copy',       # копируем аудио
-            pix_fmt='yuv420p',
-            vsync='cfr',         # фиксированный FPS
-            t=duration,              # ограничиваем длину видео 55 сек (если надо)
-            movflags='+faststart' # ускоренный старт для веба
-        ).global_args('-shortest')  # Останавливаем по более короткой дорожке (аудио или видео)
-
-        try:
-            ffmpeg.run(output_stream, capture_stderr=True, quiet=False)
-        except ffmpeg.Error as e:
-            print("Ошибка при создании видео:")
-            print(e.stderr.decode('utf8'))
-            raise
-
-        # Читаем результат и возвращаем
-        with open(tmp_video_name, "rb") as f:
-            video_bytes = f.read()
-
-        return video_bytes
-
-    finally:
-        # Чистим временные файлы
-        for f in [tmp_audio_name, tmp_audio_converted_name, tmp_image_name, tmp_video_name]:
-            try:
-                os.remove(f)
-            except OSError:
-                pass
-
-
-# def test_crop():
-#    filename = "./examples/fire.png"
-#    buffer = None
-#    with open(filename, "rb") as f:
-#        buffer = f.read()
-#    print(len(buffer))
-#    new_buffer = crop_to_square(io.BytesIO(buffer))
-#    with open("./examples/new_fire.png", "wb") as f:
-#        f.write(new_buffer.getbuffer())
-#    print('ok')
-#
-#if __name__ == "__main__":
-#    test_crop()
+        _encode_loop_video(loop_path, audio_input_stream, tmp_video_name, duration, bitrate)
+    else:
+        plan = plan_static_encode(
+            tmp_image_name, duration, video_budget, STATIC_VIDEO_FPS,
+            cache_key=(cover_hash(cover_bytes), template_id)
+        )
+        crf = plan.crf if plan is not None else config.VIDEO_CRF
+        predicted_video_bytes = plan.predicted_bytes if plan is not None else None
+        _encode_static_video(tmp_image_name, audio_input_stream, tmp_video_name, duration, crf)
+    workspace.account()
+
+    actual_bytes = os.path.getsize(tmp_video_name)
+    if predicted_video_bytes is not None:
+        record_prediction(predicted_file_bytes(predicted_video_bytes, audio_bytes), actual_bytes)
+    if actual_bytes <= config.VIDEO_SIZE_BUDGET_BYTES:
+        return tmp_video_name
+
+    # Прогноз не сбылся: второй проход с поправкой на фактический размер
+    size_budget_second_passes.inc()
+    actual_video_bytes = max(1, int((actual_bytes - MUX_OVERHEAD_BYTES) / (1 + MUX_OVERHEAD_RATIO)) - audio_bytes)
+    os.remove(tmp_video_name)
+    if animated:
+        first_bitrate = bitrate or int(actual_video_bytes * 8 / duration)
+        second_bitrate = max(1, int(first_bitrate * video_budget / actual_video_bytes * 0.95))
+        _encode_loop_video(loop_path, audio_input_stream, tmp_video_name, duration, second_bitrate)
+    else:
+        if plan is None:
+            plan = EncodePlan(config.VIDEO_CRF, actual_video_bytes, DEFAULT_STEP_RATIO)
+        _encode_static_video(
+            tmp_image_name, audio_input_stream, tmp_video_name, duration,
+            corrected_crf(plan, actual_video_bytes, video_budget)
+        )
+    workspace.account()
+
+    if os.path.getsize(tmp_video_name) > config.VIDEO_SIZE_BUDGET_BYTES:
+        size_budget_exceeded.inc()
+        print(f"Видео не уложилось в бюджет {config.VIDEO_SIZE_BUDGET_BYTES} байт")
+    return tmp_video_name
+
+
+def _encode_static_video(image_path: str, audio_input_stream, output_path: str, duration: float, crf: int) -> None:
+    """Кодирует видео из неподвижной обложки с заданным CRF."""
+    # Входы для видео и аудио
+    image_stream = ffmpeg.input(image_path, loop=1, framerate=STATIC_VIDEO_FPS)
+    # Масштабируем изображение к четным размерам
+    scaled_image_stream = image_stream.filter('scale', 'ceil(iw/2)*2', 'ceil(ih/2)*2')
+
+    output_stream = ffmpeg.output(
+        scaled_image_stream,
+        audio_input_stream,
+        output_path,
+        vcodec='libx264',
+        threads=encoder_threads(),
+        acodec='copy',       # копируем аудио
+        pix_fmt='yuv420p',
+        crf=crf,
+        vsync='cfr',         # фиксированный FPS
+        t=duration,              # ограничиваем длину видео 55 сек (если надо)
+        movflags='+faststart' # ускоренный старт для веба
+    ).global_args('-shortest')  # Останавливаем по более короткой дорожке (аудио или видео)
+
+    run_ffmpeg(output_stream, "Ошибка при создании видео:")
+
+
+def _encode_loop_video(
+    loop_path: str,
+    audio_input_stream,
+    output_path: str,
+    duration: float,
+    bitrate: Optional[int] = None
+) -> None:
+    """
+    Собирает видео из петли анимации. Без bitrate петля копируется,
+    иначе перекодируется с ограничением битрейта.
+    """
+    loop_stream = ffmpeg.input(loop_path, stream_loop=-1)
+    if bitrate is None:
+        # Готовая петля повторяется без перекодирования видео
+        video_args = {'vcodec': 'copy'}
+    else:
+        video_args = {
+            'vcodec': 'libx264',
+            'threads': encoder_threads(),
+            'pix_fmt': 'yuv420p',
+            'video_bitrate': bitrate,
+            'maxrate': bitrate,
+            'bufsize': bitrate * 2,
+        }
+    output_stream = ffmpeg.output(
+        loop_stream['v'],
+        audio_input_stream,
+        output_path,
+        acodec='copy',
+        t=duration,
+        movflags='+faststart',
+        **video_args
+    ).global_args('-shortest')
+
+    run_ffmpeg(output_stream, "Ошибка при создании видео:")
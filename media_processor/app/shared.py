@@ -0,0 +1,82 @@
+import os
+import shutil
+from threading import get_ident
+
+from fastapi import HTTPException
+
+from . import config
+
+
+def _shared_root() -> str:
+    if not config.SHARED_DIR:
+        raise HTTPException(status_code=404, detail="Режим общего каталога выключен")
+    return os.path.realpath(config.SHARED_DIR)
+
+
+def _resolve(relative_path: str) -> str:
+    """
+    Абсолютный путь внутри общего каталога. Абсолютные пути, "..",
+    и символические ссылки, ведущие за пределы каталога, отклоняются.
+    """
+    root = _shared_root()
+    if not relative_path or "\x00" in relative_path or os.path.isabs(relative_path):
+        raise HTTPException(status_code=400, detail="Ожидается относительный путь внутри общего каталога")
+    path = os.path.realpath(os.path.join(root, relative_path))
+    if path == root or os.path.commonpath([root, path]) != root:
+        raise HTTPException(status_code=400, detail="Путь выходит за пределы общего каталога")
+    return path
+
+
+def resolve_shared_input(relative_path: str) -> str:
+    """
+    Проверяет путь к входному файлу в общем каталоге.
+
+    Args:
+        relative_path: Путь относительно общего каталога.
+
+    Returns:
+        str: Абсолютный путь к существующему файлу.
+    """
+    path = _resolve(relative_path)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Файл не найден: {relative_path}")
+    return path
+
+
+def resolve_shared_output(relative_path: str, extension: str) -> str:
+    """
+    Проверяет путь, по которому будет записан результат.
+
+    Args:
+        relative_path: Путь относительно общего каталога.
+        extension: Обязательное расширение файла (например, ".mp4").
+
+    Returns:
+        str: Абсолютный путь к будущему файлу.
+    """
+    path = _resolve(relative_path)
+    if not path.endswith(extension):
+        raise HTTPException(status_code=400, detail=f"Файл результата должен иметь расширение {extension}")
+    if not os.path.isdir(os.path.dirname(path)):
+        raise HTTPException(status_code=404, detail=f"Каталог не найден: {os.path.dirname(relative_path)}")
+    return path
+
+
+def publish_file(source_path: str, destination_path: str) -> None:
+    """
+    Перемещает готовый файл в общий каталог. Файл сначала копируется во
+    временное имя рядом с целевым и затем атомарно переименовывается,
+    поэтому читатель никогда не увидит недописанный результат.
+
+    Args:
+        source_path: Готовый файл (например, в рабочем каталоге задачи).
+        destination_path: Итоговый путь в общем каталоге.
+    """
+    directory, name = os.path.split(destination_path)
+    tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.{get_ident()}.tmp")
+    try:
+        shutil.move(source_path, tmp_path)
+        os.replace(tmp_path, destination_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
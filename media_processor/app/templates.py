@@ -0,0 +1,247 @@
+import hashlib
+import io
+from collections import OrderedDict
+from threading import Lock
+from typing import NamedTuple
+
+import numpy as np
+from PIL import Image
+
+from . import config
+from .images import decode_image
+
+# Шаблон без оформления: обложка просто обрезается до квадрата
+PLAIN_TEMPLATE_ID = "cover"
+VINYL_TEMPLATE_ID = "vinyl"
+TEMPLATE_IDS = (PLAIN_TEMPLATE_ID, VINYL_TEMPLATE_ID)
+
+# Пропорции пластинки относительно стороны кадра
+VINYL_LABEL_RATIO = 0.33
+VINYL_HOLE_RATIO = 0.025
+VINYL_BACKGROUND = (12, 12, 12)
+
+
+class VinylTemplate(NamedTuple):
+    """Предрассчитанные слои шаблона (все массивы float32)."""
+    template_id: str
+    size: int
+    base: np.ndarray          # (size, size, 3) пластинка с отверстием, без обложки
+    cover_box: tuple          # (top, left, side) квадрат, куда вписывается обложка
+    cover_alpha: np.ndarray   # (side, side, 1) маска обложки внутри cover_box
+    sheen_alpha: np.ndarray   # (size, size, 1) интенсивность блика
+
+
+_templates: dict[str, VinylTemplate] = {}
+_templates_lock = Lock()
+
+_frame_cache: "OrderedDict[tuple[str, str], bytes]" = OrderedDict()
+_frame_cache_lock = Lock()
+
+
+def _circle_alpha(distance: np.ndarray, radius: float) -> np.ndarray:
+    """Маска круга со сглаженным на один пиксель краем."""
+    return np.clip(radius - distance + 0.5, 0.0, 1.0)
+
+
+def build_vinyl_template(size: int) -> VinylTemplate:
+    """
+    Строит слои шаблона "виниловая пластинка": бороздки, маску обложки-яблока,
+    отверстие по центру и блик.
+
+    Args:
+        size: Сторона кадра в пикселях.
+
+    Returns:
+        VinylTemplate: Предрассчитанные слои.
+    """
+    center = (size - 1) / 2
+    yy, xx = np.mgrid[0:size, 0:size].astype(np.float32)
+    dx, dy = xx - center, yy - center
+    distance = np.hypot(dx, dy)
+    theta = np.arctan2(dy, dx)
+
+    disc_radius = size / 2 - 1
+    label_radius = size * VINYL_LABEL_RATIO
+    hole_radius = size * VINYL_HOLE_RATIO
+
+    disc = _circle_alpha(distance, disc_radius)
+    hole = _circle_alpha(distance, hole_radius)
+
+    # Бороздки: слабая периодическая модуляция яркости по радиусу
+    grooves = 22 + 7 * np.sin(distance * (2 * np.pi / 3.0)) ** 2
+    # Тонкий светлый ободок по краю пластинки
+    rim = np.clip(1 - np.abs(distance - (disc_radius - 3)) / 2, 0, 1) * 30
+    vinyl = (grooves + rim)[..., None] * np.ones(3, dtype=np.float32)
+
+    background = np.array(VINYL_BACKGROUND, dtype=np.float32)
+    record_alpha = (disc * (1 - hole))[..., None]
+    base = background + record_alpha * (vinyl - background)
+
+    side = int(np.ceil(label_radius * 2))
+    top = left = int(round(center - (side - 1) / 2))
+    label = _circle_alpha(distance, label_radius) * (1 - hole)
+    cover_alpha = label[top:top + side, left:left + side, None]
+
+    # Блик: два противоположных светлых сектора, как от лампы над проигрывателем
+    sheen = np.clip(np.cos(2 * (theta + np.pi / 4)), 0, 1) ** 6 * 0.16
+    sheen_alpha = (sheen * disc * (1 - hole))[..., None]
+
+    return VinylTemplate(
+        template_id=VINYL_TEMPLATE_ID,
+        size=size,
+        base=base.astype(np.float32),
+        cover_box=(top, left, side),
+        cover_alpha=cover_alpha.astype(np.float32),
+        sheen_alpha=sheen_alpha.astype(np.float32),
+    )
+
+
+def load_templates(size: int = config.FRAME_SIZE) -> None:
+    """
+    Предрассчитывает слои всех шаблонов. Вызывается один раз при старте.
+
+    Args:
+        size: Сторона кадра в пикселях.
+    """
+    template = build_vinyl_template(size)
+    with _templates_lock:
+        _templates[template.template_id] = template
+
+
+def get_template(template_id: str) -> VinylTemplate:
+    """
+    Возвращает предрассчитанный шаблон (строит его, если старт был пропущен).
+
+    Args:
+        template_id: Идентификатор шаблона.
+
+    Returns:
+        VinylTemplate: Слои шаблона.
+    """
+    if template_id not in _templates:
+        if template_id != VINYL_TEMPLATE_ID:
+            raise ValueError(f"Неизвестный шаблон: {template_id}")
+        load_templates()
+    return _templates[template_id]
+
+
+def crop_image_to_square(img: Image.Image, max_side: int = config.FRAME_SIZE) -> Image.Image:
+    """
+    Обрезает изображение до квадрата по центру и уменьшает до max_side.
+
+    Args:
+        img: Исходное изображение.
+        max_side: Максимальная сторона результата.
+
+    Returns:
+        Image.Image: Квадратное изображение.
+    """
+    width, height = img.size
+    min_side = min(width, height)
+    left = (width - min_side) // 2
+    top = (height - min_side) // 2
+    right = (width + min_side) // 2
+    bottom = (height + min_side) // 2
+
+    cropped_img = img.crop((left, top, right, bottom))
+    if min_side > max_side:
+        cropped_img = cropped_img.resize((max_side, max_side), Image.LANCZOS)
+    return cropped_img
+
+
+def composite_layers(cover: Image.Image, template: VinylTemplate, with_sheen: bool = True) -> np.ndarray:
+    """
+    Вписывает обложку в шаблон: смешивание с маской и наложение блика.
+
+    Args:
+        cover: Изображение обложки (любого размера).
+        template: Предрассчитанный шаблон.
+        with_sheen: Накладывать ли блик (для анимации блик накладывается отдельно).
+
+    Returns:
+        np.ndarray: Кадр (size, size, 3) типа float32 в диапазоне 0..255.
+    """
+    top, left, side = template.cover_box
+    square = crop_image_to_square(cover.convert("RGB"), max_side=side)
+    if square.size != (side, side):
+        square = square.resize((side, side), Image.LANCZOS)
+    cover_pixels = np.asarray(square, dtype=np.float32)
+
+    frame = template.base.copy()
+    region = frame[top:top + side, left:left + side]
+    region += template.cover_alpha * (cover_pixels - region)
+    if with_sheen:
+        apply_sheen(frame, template)
+    return frame
+
+
+def apply_sheen(frame: np.ndarray, template: VinylTemplate) -> np.ndarray:
+    """
+    Осветляет кадр по маске блика (на месте).
+
+    Args:
+        frame: Кадр float32 (size, size, 3).
+        template: Шаблон с маской блика.
+
+    Returns:
+        np.ndarray: Тот же кадр.
+    """
+    frame += template.sheen_alpha * (255.0 - frame)
+    return frame
+
+
+def _render_frame(cover_bytes: bytes, template_id: str) -> bytes:
+    """Строит кадр обложки для шаблона и кодирует его в PNG."""
+    img = decode_image(cover_bytes)
+    if template_id == PLAIN_TEMPLATE_ID:
+        frame_img = crop_image_to_square(img)
+    else:
+        frame = composite_layers(img, get_template(template_id))
+        frame_img = Image.fromarray(np.clip(frame, 0, 255).astype(np.uint8), "RGB")
+
+    output_buffer = io.BytesIO()
+    frame_img.save(output_buffer, format="PNG")
+    return output_buffer.getvalue()
+
+
+def cover_hash(cover_bytes: bytes) -> str:
+    """Хэш содержимого обложки, используемый как ключ кэшей."""
+    return hashlib.sha1(cover_bytes).hexdigest()
+
+
+def get_cover_frame(cover_bytes: bytes, template_id: str = PLAIN_TEMPLATE_ID) -> bytes:
+    """
+    Возвращает PNG-кадр обложки в заданном шаблоне. Результаты кэшируются
+    по хэшу обложки и идентификатору шаблона.
+
+    Args:
+        cover_bytes: Байты исходного изображения.
+        template_id: Идентификатор шаблона.
+
+    Returns:
+        bytes: PNG-изображение кадра.
+    """
+    if template_id not in TEMPLATE_IDS:
+        raise ValueError(f"Неизвестный шаблон: {template_id}")
+
+    key = (cover_hash(cover_bytes), template_id)
+    with _frame_cache_lock:
+        cached = _frame_cache.get(key)
+        if cached is not None:
+            _frame_cache.move_to_end(key)
+            return cached
+
+    frame_png = _render_frame(cover_bytes, template_id)
+
+    with _frame_cache_lock:
+        _frame_cache[key] = frame_png
+        _frame_cache.move_to_end(key)
+        while len(_frame_cache) > config.COVER_FRAME_CACHE_SIZE:
+            _frame_cache.popitem(last=False)
+    return frame_png
+
+
+def clear_frame_cache() -> None:
+    """Очищает кэш скомпонованных кадров."""
+    with _frame_cache_lock:
+        _frame_cache.clear()
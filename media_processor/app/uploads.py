@@ -0,0 +1,117 @@
+import os
+import re
+from threading import get_ident
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+from . import config
+from .templates import cover_hash
+
+# Идентификатор обложки — sha1 ее байтов
+COVER_ID_PATTERN = re.compile(r"^[0-9a-f]{40}$")
+
+
+def _cover_path(cover_id: str) -> str:
+    return os.path.join(config.COVER_STORE_DIR, f"{cover_id}.bin")
+
+
+def _evict_old_covers() -> None:
+    """Удаляет самые давно использованные обложки сверх лимита."""
+    cache_dir = config.COVER_STORE_DIR
+    covers = [
+        os.path.join(cache_dir, name)
+        for name in os.listdir(cache_dir)
+        if name.endswith('.bin')
+    ]
+    if len(covers) <= config.COVER_STORE_MAX_FILES:
+        return
+    covers.sort(key=os.path.getmtime)
+    for path in covers[:len(covers) - config.COVER_STORE_MAX_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def store_cover(cover_bytes: bytes) -> str:
+    """
+    Сохраняет обложку в хранилище под ее хэшем. Повторная загрузка
+    той же обложки только обновляет время последнего использования.
+
+    Args:
+        cover_bytes: Байты обложки.
+
+    Returns:
+        str: Идентификатор обложки.
+    """
+    cover_id = cover_hash(cover_bytes)
+    path = _cover_path(cover_id)
+    if os.path.exists(path):
+        os.utime(path)
+        return cover_id
+
+    os.makedirs(config.COVER_STORE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(cover_bytes)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _evict_old_covers()
+    return cover_id
+
+
+def load_cover(cover_id: str) -> Optional[bytes]:
+    """
+    Возвращает ранее загруженную обложку.
+
+    Args:
+        cover_id: Идентификатор обложки.
+
+    Returns:
+        Optional[bytes]: Байты обложки или None, если ее нет в хранилище.
+    """
+    if not COVER_ID_PATTERN.match(cover_id):
+        return None
+    path = _cover_path(cover_id)
+    try:
+        with open(path, "rb") as f:
+            cover_bytes = f.read()
+    except OSError:
+        return None
+    os.utime(path)
+    return cover_bytes
+
+
+def has_cover(cover_id: str) -> bool:
+    """
+    Проверка, что обложка есть в хранилище.
+
+    Args:
+        cover_id: Идентификатор обложки.
+    """
+    return bool(COVER_ID_PATTERN.match(cover_id)) and os.path.exists(_cover_path(cover_id))
+
+
+async def read_limited_body(request: Request, max_bytes: int) -> bytes:
+    """
+    Читает тело запроса целиком, прерывая чтение при превышении лимита.
+
+    Args:
+        request: Входящий запрос.
+        max_bytes: Максимальный размер тела.
+
+    Returns:
+        bytes: Тело запроса.
+    """
+    chunks = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise HTTPException(status_code=413, detail="Файл слишком большой")
+        chunks.append(chunk)
+    return b"".join(chunks)
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import re
+from threading import get_ident
+from typing import Optional
+
+import httpx
+
+from . import config
+from .metrics import Counter
+
+# Идентификаторы треков используются в URL и именах файлов кэша
+TRACK_ID_PATTERN = re.compile(r"^[A-Za-z0-9_:-]{1,64}$")
+
+_client: Optional[httpx.AsyncClient] = None
+_key_locks: dict[str, asyncio.Lock] = {}
+
+upstream_fetches = Counter(
+    "media_upstream_fetches_total", "Обращения к audio_receiver за аудио и обложками"
+)
+
+
+class UpstreamError(Exception):
+    """audio_receiver не отдал трек или обложку."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def get_upstream_client() -> httpx.AsyncClient:
+    """
+    Общий клиент с пулом соединений к audio_receiver
+    (создается при первом обращении).
+    """
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=config.AUDIO_RECEIVER_API_URL,
+            timeout=httpx.Timeout(config.UPSTREAM_TIMEOUT_SECONDS, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=config.UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=config.UPSTREAM_MAX_CONNECTIONS,
+            ),
+        )
+    return _client
+
+
+async def close_upstream_client() -> None:
+    """Закрывает пул соединений."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _evict_old_files() -> None:
+    """
+    Удаляет самые давно использованные файлы кэша, пока кэш не уложится
+    в лимиты по числу файлов и по суммарному размеру. Рендер работает
+    с копией файла в рабочем каталоге задачи, поэтому удаление из кэша
+    ему не мешает.
+    """
+    cache_dir = config.TRACK_CACHE_DIR
+    files = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.tmp'):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+    count = len(files)
+    total = sum(size for _, size, _ in files)
+    for _, size, path in files:
+        if count <= config.TRACK_CACHE_MAX_FILES and total <= config.TRACK_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        count -= 1
+        total -= size
+
+
+async def _fetch_cached(url: str, file_name: str, kind: str) -> str:
+    """
+    Возвращает путь к файлу из дискового кэша, а при промахе скачивает его
+    потоком во временный файл и атомарно переименовывает.
+
+    Args:
+        url: Путь на audio_receiver.
+        file_name: Имя файла в кэше.
+        kind: Тип ресурса для метрик ("audio" или "cover").
+
+    Returns:
+        str: Путь к файлу в кэше.
+    """
+    path = os.path.join(config.TRACK_CACHE_DIR, file_name)
+    # Один и тот же файл не скачивается параллельно двумя запросами
+    lock = _key_locks.setdefault(file_name, asyncio.Lock())
+    try:
+        async with lock:
+            if os.path.exists(path):
+                os.utime(path)
+                upstream_fetches.inc(kind=kind, result="cache_hit")
+                return path
+
+            os.makedirs(config.TRACK_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{get_ident()}.tmp"
+            try:
+                async with get_upstream_client().stream("GET", url) as response:
+                    if response.status_code != 200:
+                        upstream_fetches.inc(kind=kind, result="error")
+                        raise UpstreamError(
+                            404 if response.status_code == 404 else 502,
+                            f"audio_receiver вернул {response.status_code} для {url}"
+                        )
+                    with open(tmp_path, "wb") as f:
+                        async for chunk in response.aiter_bytes():
+                            f.write(chunk)
+                os.replace(tmp_path, path)
+            except httpx.HTTPError as e:
+                upstream_fetches.inc(kind=kind, result="error")
+                raise UpstreamError(502, f"audio_receiver недоступен: {e}")
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            upstream_fetches.inc(kind=kind, result="fetched")
+    finally:
+        if not lock.locked():
+            _key_locks.pop(file_name, None)
+
+    _evict_old_files()
+    return path
+
+
+async def fetch_track_audio(track_id: str) -> str:
+    """
+    Путь к аудиофайлу трека (скачивается из audio_receiver при промахе кэша).
+
+    Args:
+        track_id: Идентификатор трека.
+
+    Returns:
+        str: Путь к MP3 в кэше.
+    """
+    return await _fetch_cached(f"/track/{track_id}/stream", f"{track_id}.mp3", "audio")
+
+
+async def fetch_track_cover(track_id: str) -> bytes:
+    """
+    Обложка трека (скачивается из audio_receiver при промахе кэша).
+
+    Args:
+        track_id: Идентификатор трека.
+
+    Returns:
+        bytes: Байты обложки.
+    """
+    path = await _fetch_cached(f"/track/{track_id}/cover", f"{track_id}.cover", "cover")
+    with open(path, "rb") as f:
+        return f.read()
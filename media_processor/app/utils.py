@@ -1,8 +1,14 @@
-import io
-from fastapi import UploadFile, HTTPException
-from PIL import Image
-from pydub import AudioSegment
-from pydub.exceptions import CouldntDecodeError
+from typing import Optional
+
+import ffmpeg
+from fastapi import Request, UploadFile, HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from . import config
+from .images import ImageRejected, inspect_image
+from .probe import probe
+from .templates import TEMPLATE_IDS, VINYL_TEMPLATE_ID
+from .workspace import job_workspace
 
 async def validate_image_content(file: UploadFile):
     """
@@ -12,28 +18,47 @@ async def validate_image_content(file: UploadFile):
         file: Загружаемый файл с изображением.
     """
     content = await file.read()
-    try:
-        Image.open(io.BytesIO(content))
-    except Exception:
-        raise HTTPException(400, "Не удалось обработать файл как изображение")
+    validate_image_bytes(content)
     return content
 
+def validate_image_bytes(content: bytes):
+    """
+    Проверка, что байты являются изображением допустимого размера.
+    Читается только заголовок, пиксели не декодируются.
+
+    Args:
+        content: Байты изображения.
+    """
+    try:
+        inspect_image(content)
+    except ImageRejected as e:
+        raise HTTPException(e.status_code, str(e))
+
 async def validate_audio_content(file: UploadFile) -> bytes:
     """
-    Проверка аудио на корректность формата
+    Проверка аудио на корректность формата (ffprobe в пуле потоков)
 
     Args:
         file: Загружаемый аудиофайл.
     """
     content = await file.read()
-    try:
-        AudioSegment.from_file(io.BytesIO(content))
-    except CouldntDecodeError:
-        raise HTTPException(400, "Файл не является поддерживаемым аудиоформатом")
-    except Exception:
-        raise HTTPException(400, "Не удалось обработать аудиофайл")
+    await run_in_threadpool(validate_audio_bytes, content)
     return content
 
+def validate_audio_bytes(content: bytes) -> float:
+    """
+    Проверка аудио в байтах: файл записывается во временный рабочий
+    каталог и проверяется через ffprobe, без декодирования.
+
+    Args:
+        content: Аудиофайл в байтах.
+
+    Returns:
+        float: Длительность аудио в секундах.
+    """
+    with job_workspace() as workspace:
+        return validate_audio_file(workspace.write("audio_upload", content))
+
 def validate_audio_range(start: int, end: int):
     """
     Проверка логической корректности диапазона.
@@ -47,6 +72,24 @@ def validate_audio_range(start: int, end: int):
     if start >= end:
         raise HTTPException(status_code=400, detail="Параметр start должен быть меньше end")
 
+def validate_fades(fade_in: float, fade_out: float, length: Optional[float] = None):
+    """
+    Проверка длительностей плавного нарастания и затухания звука.
+
+    Args:
+        fade_in: Нарастание в секундах.
+        fade_out: Затухание в секундах.
+        length: Длина отрезка, если известна.
+    """
+    for value in (fade_in, fade_out):
+        if not 0 <= value <= config.MAX_FADE_SECONDS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Параметры fade_in и fade_out должны быть от 0 до {config.MAX_FADE_SECONDS:g} сек"
+            )
+    if length is not None and fade_in + fade_out > length:
+        raise HTTPException(status_code=400, detail="Плавные переходы длиннее отрезка")
+
 def validate_audio_duration(contents: bytes, start: int, end: int):
     """
     Проверка, что start и end не превышают длительность аудио.
@@ -57,13 +100,89 @@ def validate_audio_duration(contents: bytes, start: int, end: int):
         end: Конец обрезки.
     """
     try:
-        audio = AudioSegment.from_file(io.BytesIO(contents))
-        duration = audio.duration_seconds
-    except Exception:
+        duration = validate_audio_bytes(contents)
+    except HTTPException as e:
+        if e.status_code != 400:
+            raise
         raise HTTPException(status_code=400, detail="Не удалось определить длительность аудио")
 
+    _check_range_within_duration(duration, start, end)
+
+def validate_audio_file(path: str) -> float:
+    """
+    Проверка аудиофайла, уже записанного на диск, через ffprobe
+    (без декодирования всего файла).
+
+    Args:
+        path: Путь к аудиофайлу.
+
+    Returns:
+        float: Длительность аудио в секундах.
+    """
+    try:
+        info = probe(path)
+    except (ffmpeg.Error, KeyError, ValueError):
+        raise HTTPException(400, "Файл не является поддерживаемым аудиоформатом")
+    if info.codec is None:
+        raise HTTPException(400, "Файл не является поддерживаемым аудиоформатом")
+    return info.duration
+
+def validate_audio_file_range(path: str, start: int, end: int):
+    """
+    Проверка, что start и end не превышают длительность аудиофайла на диске.
+
+    Args:
+        path: Путь к аудиофайлу.
+        start: Начало обрезки.
+        end: Конец обрезки.
+    """
+    _check_range_within_duration(validate_audio_file(path), start, end)
+
+def _check_range_within_duration(duration: float, start: int, end: int):
     if start > duration or end > duration:
         raise HTTPException(
             status_code=400,
             detail=f"Параметры start и end не должны превышать длительность аудио ({duration:.2f} сек)"
-        )
\ No newline at end of file
+        )
+
+def validate_octet_stream(request: Request):
+    """
+    Проверка, что тело запроса передано как application/octet-stream.
+
+    Args:
+        request: Входящий запрос.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.split(";")[0].strip() != "application/octet-stream":
+        raise HTTPException(
+            status_code=415,
+            detail="Ожидается тело запроса с Content-Type: application/octet-stream"
+        )
+
+def validate_template(template: str):
+    """
+    Проверка, что запрошенный шаблон оформления существует.
+
+    Args:
+        template: Идентификатор шаблона.
+    """
+    if template not in TEMPLATE_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неизвестный шаблон. Доступные шаблоны: {', '.join(TEMPLATE_IDS)}"
+        )
+
+
+def validate_animation(template: str, animated: bool):
+    """
+    Проверка, что анимация запрошена для шаблона, который умеет вращаться.
+
+    Args:
+        template: Идентификатор шаблона.
+        animated: Запрошена ли анимация.
+    """
+    if animated and template != VINYL_TEMPLATE_ID:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Анимация доступна только для шаблона {VINYL_TEMPLATE_ID}"
+        )
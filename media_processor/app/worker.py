@@ -0,0 +1,194 @@
+import asyncio
+import os
+import shutil
+import socket
+import time
+from typing import Optional
+
+import anyio.to_thread
+from fastapi import HTTPException
+
+from . import config
+from .cpu import render_slots, set_process_concurrency
+from .images import ImageRejected
+from .job_queue import Job, JobQueue, get_job_queue, job_dir
+from .services import render_video_file
+from .shared import publish_file
+from .utils import validate_animation, validate_audio_file, validate_audio_file_range, validate_template
+from .workspace import job_workspace, reap_stale_workspaces, run_reaper
+
+RESULT_FILE_NAME = "result.mp4"
+
+
+class InvalidJobInput(Exception):
+    """Входные данные задачи некорректны."""
+
+
+# Ошибки во входных данных: повтор не поможет
+PERMANENT_ERRORS = (ImageRejected, InvalidJobInput)
+
+
+def result_path(job_id: str) -> str:
+    """Путь к готовому видео задачи."""
+    return os.path.join(job_dir(job_id), RESULT_FILE_NAME)
+
+
+def check_job_inputs(audio_path: str, params: dict) -> None:
+    """
+    Проверяет параметры и аудио задачи перед рендером.
+
+    Args:
+        audio_path: Путь к аудиофайлу задачи.
+        params: Параметры задачи.
+
+    Raises:
+        InvalidJobInput: Шаблон, анимация, аудио или отрезок некорректны.
+    """
+    try:
+        validate_template(params["template"])
+        validate_animation(params["template"], params["animated"])
+        if params.get("start") is not None:
+            validate_audio_file_range(audio_path, params["start"], params["end"])
+        else:
+            validate_audio_file(audio_path)
+    except HTTPException as e:
+        raise InvalidJobInput(e.detail) from e
+
+
+def render_job(job: Job) -> None:
+    """
+    Рендерит видео задачи из входных файлов в ее каталоге
+    и атомарно кладет результат туда же.
+
+    Args:
+        job: Задача из очереди.
+    """
+    directory = job_dir(job.id)
+    params = job.params
+    audio_path = os.path.join(directory, params["audio_file"])
+    check_job_inputs(audio_path, params)
+    with open(os.path.join(directory, params["cover_file"]), "rb") as f:
+        cover_bytes = f.read()
+
+    with job_workspace() as workspace:
+        video_path = render_video_file(
+            workspace,
+            audio_path,
+            cover_bytes,
+            template_id=params["template"],
+            animated=params["animated"],
+            start=params.get("start"),
+            end=params.get("end"),
+            fade_in=params.get("fade_in", 0.0),
+            fade_out=params.get("fade_out", 0.0)
+        )
+        publish_file(video_path, result_path(job.id))
+
+
+async def _keep_lease(queue: JobQueue, job: Job, worker_id: str) -> None:
+    """Продлевает аренду задачи, пока идет рендер."""
+    interval = config.JOB_VISIBILITY_TIMEOUT_SECONDS / 3
+    while True:
+        await asyncio.sleep(interval)
+        renewed = await anyio.to_thread.run_sync(
+            queue.heartbeat, job.id, worker_id, config.JOB_VISIBILITY_TIMEOUT_SECONDS
+        )
+        if not renewed:
+            print(f"Аренда задачи {job.id} перешла к другому воркеру")
+            return
+
+
+async def process_job(queue: JobQueue, job: Job, worker_id: str) -> None:
+    """
+    Выполняет задачу и сообщает очереди результат. Временные ошибки
+    возвращают задачу в очередь, ошибки во входных данных — нет.
+
+    Args:
+        queue: Очередь задач.
+        job: Задача, взятая в аренду.
+        worker_id: Идентификатор воркера.
+    """
+    lease = asyncio.create_task(_keep_lease(queue, job, worker_id))
+    try:
+        await anyio.to_thread.run_sync(render_job, job)
+    except PERMANENT_ERRORS as e:
+        await anyio.to_thread.run_sync(lambda: queue.fail(job.id, worker_id, str(e), retry=False))
+    except Exception as e:
+        print(f"Ошибка при выполнении задачи {job.id} (попытка {job.attempts}): {e!r}")
+        await anyio.to_thread.run_sync(lambda: queue.fail(job.id, worker_id, str(e) or repr(e)))
+    else:
+        if not await anyio.to_thread.run_sync(queue.complete, job.id, worker_id):
+            print(f"Задача {job.id} выполнена, но аренда уже перешла к другому воркеру")
+    finally:
+        lease.cancel()
+
+
+def purge_finished_jobs(queue: JobQueue) -> int:
+    """
+    Удаляет завершенные задачи старше JOB_RESULT_TTL_SECONDS вместе
+    с их каталогами.
+
+    Returns:
+        int: Число удаленных задач.
+    """
+    job_ids = queue.purge_finished(time.time() - config.JOB_RESULT_TTL_SECONDS)
+    for job_id in job_ids:
+        shutil.rmtree(job_dir(job_id), ignore_errors=True)
+    return len(job_ids)
+
+
+async def worker_loop(queue: JobQueue, worker_id: str, stop: asyncio.Event) -> None:
+    """Берет задачи из очереди по одной, пока не установлен stop."""
+    while not stop.is_set():
+        job = await anyio.to_thread.run_sync(queue.claim, worker_id, config.JOB_VISIBILITY_TIMEOUT_SECONDS)
+        if job is None:
+            try:
+                await asyncio.wait_for(stop.wait(), config.JOB_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await process_job(queue, job, worker_id)
+
+
+async def _purge_periodically(queue: JobQueue, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            await anyio.to_thread.run_sync(purge_finished_jobs, queue)
+        except Exception as e:
+            print(f"Ошибка при удалении старых задач: {e}")
+        try:
+            await asyncio.wait_for(stop.wait(), config.WORKSPACE_REAP_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_worker(stop: Optional[asyncio.Event] = None, concurrency: Optional[int] = None) -> None:
+    """
+    Запускает воркер: несколько циклов выборки задач (по числу слотов
+    рендера) и периодическое удаление старых задач. Завершается после
+    установки stop, дождавшись текущих задач.
+
+    Args:
+        stop: Событие остановки.
+        concurrency: Число одновременных рендеров (по умолчанию
+            WORKER_CONCURRENCY или по квоте CPU).
+    """
+    stop = stop or asyncio.Event()
+    concurrency = concurrency or config.WORKER_CONCURRENCY or render_slots()
+    # Потоки x264 делятся между циклами воркера, а не слотами API
+    set_process_concurrency(concurrency)
+    queue = get_job_queue()
+    os.makedirs(config.JOBS_DIR, exist_ok=True)
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"Воркер {prefix} запущен: {concurrency} одновременных рендеров")
+
+    # Рабочие каталоги локальны для хоста, поэтому воркер убирает их сам
+    await anyio.to_thread.run_sync(reap_stale_workspaces)
+    reaper = asyncio.create_task(run_reaper())
+    try:
+        await asyncio.gather(
+            _purge_periodically(queue, stop),
+            *(worker_loop(queue, f"{prefix}:{slot}", stop) for slot in range(concurrency))
+        )
+    finally:
+        reaper.cancel()
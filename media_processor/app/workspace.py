@@ -0,0 +1,262 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from threading import Lock
+from typing import AsyncIterator, Optional
+
+from . import config
+from .metrics import Counter, Gauge
+
+JOB_DIR_PREFIX = "job_"
+# Файлы, которые оставляла старая реализация в tempfile.gettempdir()
+LEGACY_TMP_PREFIXES = ("tmp_audio_", "tmp_image_", "tmp_video_")
+
+_active_usage: dict[str, int] = {}
+_active_usage_lock = Lock()
+
+
+class WorkspaceQuotaExceeded(Exception):
+    """Превышена квота рабочего каталога задачи или общая квота."""
+
+
+def _used_bytes() -> int:
+    with _active_usage_lock:
+        return sum(_active_usage.values())
+
+
+def _disk_free_bytes() -> int:
+    try:
+        return shutil.disk_usage(config.WORKSPACE_ROOT).free
+    except OSError:
+        return 0
+
+
+workspace_active_jobs = Gauge(
+    "media_workspace_active_jobs", "Число открытых рабочих каталогов",
+    function=lambda: len(_active_usage)
+)
+workspace_used_bytes = Gauge(
+    "media_workspace_used_bytes", "Байт занято открытыми рабочими каталогами",
+    function=_used_bytes
+)
+workspace_disk_free_bytes = Gauge(
+    "media_workspace_disk_free_bytes", "Свободно байт на разделе WORKSPACE_ROOT",
+    function=_disk_free_bytes
+)
+workspace_quota_rejections = Counter(
+    "media_workspace_quota_rejections_total", "Задачи, отклоненные из-за квоты"
+)
+workspace_reaped = Counter(
+    "media_workspace_reaped_total", "Удаленные брошенные каталоги и временные файлы"
+)
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                total += os.path.getsize(os.path.join(dir_path, file_name))
+            except OSError:
+                pass
+    return total
+
+
+class JobWorkspace:
+    """Рабочий каталог одной задачи с учетом занятого места."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.job_id = os.path.basename(path)
+
+    def file(self, name: str) -> str:
+        """Путь к файлу внутри рабочего каталога."""
+        return os.path.join(self.path, name)
+
+    def remaining(self) -> int:
+        """Сколько байт еще можно записать с учетом обеих квот."""
+        with _active_usage_lock:
+            used_by_job = _active_usage.get(self.job_id, 0)
+            used_total = sum(_active_usage.values())
+        return max(0, min(
+            config.WORKSPACE_JOB_QUOTA_BYTES - used_by_job,
+            config.WORKSPACE_TOTAL_QUOTA_BYTES - used_total,
+        ))
+
+    def _check(self, extra_bytes: int) -> None:
+        if extra_bytes > self.remaining():
+            workspace_quota_rejections.inc()
+            raise WorkspaceQuotaExceeded("Недостаточно места для обработки файла")
+
+    def write(self, name: str, data: bytes) -> str:
+        """
+        Записывает файл в рабочий каталог, предварительно проверив квоты.
+
+        Args:
+            name: Имя файла.
+            data: Содержимое.
+
+        Returns:
+            str: Путь к записанному файлу.
+        """
+        self._check(len(data))
+        path = self.file(name)
+        with open(path, "wb") as f:
+            f.write(data)
+        self.account()
+        return path
+
+    def link(self, name: str, source: str) -> str:
+        """
+        Помещает в рабочий каталог файл из кэша: жесткой ссылкой, а если
+        это невозможно (другая файловая система) — копией. Так вытеснение
+        файла из кэша не мешает задаче, которая его читает.
+
+        Args:
+            name: Имя файла.
+            source: Путь к исходному файлу.
+
+        Returns:
+            str: Путь к файлу в рабочем каталоге.
+        """
+        path = self.file(name)
+        try:
+            os.link(source, path)
+        except OSError:
+            self._check(os.path.getsize(source))
+            shutil.copyfile(source, path)
+        self.account()
+        return path
+
+    async def write_stream(self, name: str, chunks: AsyncIterator[bytes]) -> str:
+        """
+        Записывает поток (например, тело запроса) в файл по мере поступления,
+        не собирая его в памяти. Квоты проверяются на каждом фрагменте.
+
+        Args:
+            name: Имя файла.
+            chunks: Асинхронный итератор фрагментов.
+
+        Returns:
+            str: Путь к записанному файлу.
+        """
+        path = self.file(name)
+        written = 0
+        with open(path, "wb") as f:
+            async for chunk in chunks:
+                written += len(chunk)
+                self._check(written)
+                f.write(chunk)
+        self.account()
+        return path
+
+    def account(self) -> None:
+        """
+        Пересчитывает занятое место (например, после работы ffmpeg)
+        и проверяет квоты.
+        """
+        size = _directory_size(self.path)
+        with _active_usage_lock:
+            used_by_others = sum(
+                used for job_id, used in _active_usage.items() if job_id != self.job_id
+            )
+            _active_usage[self.job_id] = size
+        if (size > config.WORKSPACE_JOB_QUOTA_BYTES
+                or size + used_by_others > config.WORKSPACE_TOTAL_QUOTA_BYTES):
+            workspace_quota_rejections.inc()
+            raise WorkspaceQuotaExceeded("Недостаточно места для обработки файла")
+
+
+@contextmanager
+def job_workspace():
+    """
+    Создает отдельный рабочий каталог для задачи и удаляет его после.
+
+    Yields:
+        JobWorkspace: Рабочий каталог.
+    """
+    os.makedirs(config.WORKSPACE_ROOT, exist_ok=True)
+    path = os.path.join(config.WORKSPACE_ROOT, f"{JOB_DIR_PREFIX}{uuid.uuid4().hex}")
+    os.mkdir(path)
+    workspace = JobWorkspace(path)
+    with _active_usage_lock:
+        _active_usage[workspace.job_id] = 0
+    try:
+        yield workspace
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+        with _active_usage_lock:
+            _active_usage.pop(workspace.job_id, None)
+
+
+def _remove(path: str) -> bool:
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+def reap_stale_workspaces(max_age_seconds: Optional[int] = None) -> int:
+    """
+    Удаляет рабочие каталоги, брошенные упавшими процессами, и временные
+    файлы старой реализации в tempfile.gettempdir().
+
+    Args:
+        max_age_seconds: Минимальный возраст (по mtime) удаляемых объектов.
+
+    Returns:
+        int: Число удаленных каталогов и файлов.
+    """
+    if max_age_seconds is None:
+        max_age_seconds = config.WORKSPACE_STALE_SECONDS
+    deadline = time.time() - max_age_seconds
+
+    with _active_usage_lock:
+        active = set(_active_usage)
+
+    candidates = []
+    if os.path.isdir(config.WORKSPACE_ROOT):
+        candidates += [
+            os.path.join(config.WORKSPACE_ROOT, name)
+            for name in os.listdir(config.WORKSPACE_ROOT)
+            if name.startswith(JOB_DIR_PREFIX) and name not in active
+        ]
+    legacy_dir = tempfile.gettempdir()
+    candidates += [
+        os.path.join(legacy_dir, name)
+        for name in os.listdir(legacy_dir)
+        if name.startswith(LEGACY_TMP_PREFIXES)
+    ]
+
+    removed = 0
+    for path in candidates:
+        try:
+            if os.path.getmtime(path) > deadline:
+                continue
+        except OSError:
+            continue
+        if _remove(path):
+            removed += 1
+
+    if removed:
+        workspace_reaped.inc(removed)
+        print(f"Удалено брошенных рабочих каталогов и файлов: {removed}")
+    return removed
+
+
+async def run_reaper() -> None:
+    """Периодически удаляет брошенные рабочие каталоги."""
+    while True:
+        await asyncio.sleep(config.WORKSPACE_REAP_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(reap_stale_workspaces)
+        except Exception as e:
+            print(f"Ошибка при уборке рабочих каталогов: {e}")
@@ -0,0 +1,105 @@
+"""
+Стоимость плавных переходов звука.
+
+Переходы и сглаживание разрезов накладываются фильтром afade в том же
+вызове ffmpeg, который и так перекодирует аудио, поэтому время рендера
+и обрезки не должно заметно меняться. Для сравнения замеряется и
+прежний способ — fade_in/fade_out pydub после среза, то есть лишний
+проход по PCM в Python.
+
+Для каждого варианта печатается медиана времени по нескольким повторам.
+
+Запуск из каталога media_processor:
+    python -m benchmarks.audio_fades [--seconds 30] [--repeats 5]
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import sys
+import time
+
+from PIL import Image
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import render_video_in_workspace, trim_audio  # noqa: E402
+from app.workspace import job_workspace  # noqa: E402
+
+FADE_SECONDS = 2.0
+
+
+def _audio(seconds: int) -> bytes:
+    buffer = io.BytesIO()
+    Sine(440).to_audio_segment(duration=seconds * 1000).export(buffer, format="mp3")
+    return buffer.getvalue()
+
+
+def _cover() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (800, 800), "navy").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _median_seconds(function, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def _trim_with_pydub_fades(audio_bytes: bytes, start: int, end: int) -> bytes:
+    audio = AudioSegment.from_file(io.BytesIO(audio_bytes))
+    trimmed = audio[start * 1000:end * 1000].fade_in(int(FADE_SECONDS * 1000)).fade_out(int(FADE_SECONDS * 1000))
+    buffer = io.BytesIO()
+    trimmed.export(buffer, format="mp3")
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=int, default=30, help="длина исходного аудио")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    audio_bytes = _audio(args.seconds)
+    cover_bytes = _cover()
+    start, end = 2, args.seconds - 2
+
+    def render(fade: float):
+        with job_workspace() as workspace:
+            audio_path = workspace.write("audio_source", audio_bytes)
+            render_video_in_workspace(
+                workspace, audio_path, cover_bytes, start=start, end=end, fade_in=fade, fade_out=fade
+            )
+
+    def trim(fade: float):
+        asyncio.run(trim_audio(audio_bytes, start, end, fade_in=fade, fade_out=fade))
+
+    render(0.0)  # прогрев (кадр обложки попадает в кэш)
+
+    cases = [
+        ("рендер без переходов", lambda: render(0.0)),
+        ("рендер с afade", lambda: render(FADE_SECONDS)),
+        ("обрезка без переходов", lambda: trim(0.0)),
+        ("обрезка с afade", lambda: trim(FADE_SECONDS)),
+        ("обрезка с fade pydub", lambda: _trim_with_pydub_fades(audio_bytes, start, end)),
+    ]
+    print(f"Аудио {args.seconds} сек, отрезок {start}-{end}, переходы по {FADE_SECONDS:g} сек, повторов {args.repeats}")
+    results = {}
+    for name, function in cases:
+        results[name] = _median_seconds(function, args.repeats)
+        print(f"{name:<24} {results[name] * 1000:>8.1f} мс")
+
+    for base, faded in (("рендер без переходов", "рендер с afade"), ("обрезка без переходов", "обрезка с afade")):
+        overhead = (results[faded] / results[base] - 1) * 100
+        print(f"Накладные расходы afade ({base.split()[0]}): {overhead:+.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Подбор потоков x264 на рендер и числа одновременных рендеров.
+
+Синтетический корпус (обложки разной сложности и аудио разной длины)
+рендерится при каждом сочетании X264_THREADS x одновременных рендеров,
+для каждого сочетания печатается пропускная способность в рендерах
+в минуту. Отмечается сочетание, которое выбирается автоматически
+по квоте CPU контейнера (app.cpu).
+
+Запуск из каталога media_processor:
+    python -m benchmarks.render_concurrency [--threads 1,2,4] [--concurrency 1,2,4] [--renders 12]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import numpy as np
+from PIL import Image
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.cpu import auto_encoder_threads, auto_render_slots, available_cpus  # noqa: E402
+from app.services import render_video_in_workspace  # noqa: E402
+from app.workspace import job_workspace  # noqa: E402
+
+
+def _png(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def build_corpus() -> list[tuple[bytes, bytes]]:
+    """Пары (аудио, обложка): однотонная, градиент и шум, аудио 10 и 30 секунд."""
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, 800, dtype=np.uint8)
+    covers = [
+        _png(Image.new("RGB", (800, 800), "navy")),
+        _png(Image.fromarray(np.dstack([np.tile(gradient, (800, 1))] * 3))),
+        _png(Image.fromarray(rng.integers(0, 255, (800, 800, 3), dtype=np.uint8))),
+    ]
+    audios = []
+    for seconds in (10, 30):
+        buffer = io.BytesIO()
+        segment: AudioSegment = Sine(440).to_audio_segment(duration=seconds * 1000)
+        segment.export(buffer, format="mp3")
+        audios.append(buffer.getvalue())
+    return [(audio, cover) for audio in audios for cover in covers]
+
+
+def _render(item: tuple[bytes, bytes]) -> None:
+    audio_bytes, cover_bytes = item
+    with job_workspace() as workspace:
+        audio_path = workspace.write("audio_source", audio_bytes)
+        render_video_in_workspace(workspace, audio_path, cover_bytes)
+
+
+def measure(corpus: list, threads: int, concurrency: int, renders: int) -> float:
+    """Рендеров в минуту при заданных потоках x264 и числе одновременных рендеров."""
+    items = [corpus[i % len(corpus)] for i in range(renders)]
+    with patch("app.cpu.config.X264_THREADS", threads), \
+            ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started = time.perf_counter()
+        list(executor.map(_render, items))
+        elapsed = time.perf_counter() - started
+    return renders / elapsed * 60
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=_int_list, default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 2, 4])
+    parser.add_argument("--renders", type=int, default=12)
+    args = parser.parse_args()
+
+    cpus = available_cpus()
+    auto_slots = auto_render_slots(cpus)
+    auto_threads = auto_encoder_threads(cpus, auto_slots)
+    print(f"Доступно ядер: {cpus:g}; автоматически: {auto_slots} рендеров x {auto_threads} потоков")
+
+    corpus = build_corpus()
+    _render(corpus[0])  # прогрев
+
+    print(f"{'потоки':>7} {'рендеры':>8} {'рендеров/мин':>13}")
+    results = {}
+    for threads in args.threads:
+        for concurrency in args.concurrency:
+            rate = measure(corpus, threads, concurrency, args.renders)
+            results[(threads, concurrency)] = rate
+            mark = " (авто)" if (threads, concurrency) == (auto_threads, auto_slots) else ""
+            print(f"{threads:>7} {concurrency:>8} {rate:>13.1f}{mark}")
+
+    best = max(results, key=results.get)
+    print(f"Лучшее: {best[0]} потоков x {best[1]} рендеров — {results[best]:.1f} рендеров/мин")
+
+
+if __name__ == "__main__":
+    main()
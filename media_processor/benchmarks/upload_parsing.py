@@ -0,0 +1,86 @@
+"""
+Сравнение накладных расходов на прием тела запроса: multipart/form-data
+(как в /create_video и /trim_audio) против application/octet-stream
+(как в /create_video/raw и /trim_audio/raw).
+
+Рендер не запускается — измеряется только прием файла в рабочий каталог.
+Тело отправляется фрагментами по 64 КБ, как его отдает uvicorn.
+
+Запуск из каталога media_processor:
+    python -m benchmarks.upload_parsing
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI, File, Request, UploadFile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.workspace import job_workspace  # noqa: E402
+
+SIZES_MB = (1, 8, 32)
+REPEATS = 10
+CHUNK_SIZE = 64 * 1024
+
+bench_app = FastAPI()
+
+
+@bench_app.post("/multipart")
+async def multipart_endpoint(audio_file: UploadFile = File(...)):
+    with job_workspace() as workspace:
+        workspace.write("audio_source", await audio_file.read())
+    return {}
+
+
+@bench_app.post("/raw")
+async def raw_endpoint(request: Request):
+    with job_workspace() as workspace:
+        await workspace.write_stream("audio_source", request.stream())
+    return {}
+
+
+async def _chunked(body: bytes):
+    for offset in range(0, len(body), CHUNK_SIZE):
+        yield body[offset:offset + CHUNK_SIZE]
+
+
+async def _measure(client: httpx.AsyncClient, url: str, body: bytes, headers: dict) -> tuple[float, float]:
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    response = await client.post(url, content=_chunked(body), headers=headers)
+    response.raise_for_status()
+    return time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+
+async def main():
+    transport = httpx.ASGITransport(app=bench_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'размер':>8} {'режим':>10} {'wall, мс':>10} {'cpu, мс':>10}")
+        for size_mb in SIZES_MB:
+            payload = os.urandom(size_mb * 1024 * 1024)
+
+            # Тело multipart кодируется заранее, чтобы не мерить работу клиента
+            multipart_request = httpx.Request(
+                "POST", "http://bench/multipart",
+                files={"audio_file": ("audio.mp3", payload, "audio/mpeg")}
+            )
+            multipart_body = multipart_request.read()
+            cases = (
+                ("multipart", "/multipart", multipart_body,
+                 {"Content-Type": multipart_request.headers["Content-Type"]}),
+                ("raw", "/raw", payload, {"Content-Type": "application/octet-stream"}),
+            )
+            for name, url, body, headers in cases:
+                await _measure(client, url, body, headers)  # прогрев
+                samples = [await _measure(client, url, body, headers) for _ in range(REPEATS)]
+                wall = statistics.median(s[0] for s in samples) * 1000
+                cpu = statistics.median(s[1] for s in samples) * 1000
+                print(f"{size_mb:>6}МБ {name:>10} {wall:>10.1f} {cpu:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
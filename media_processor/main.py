@@ -1,10 +1,76 @@
-from fastapi import FastAPI
+import asyncio
+import os
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app import config
+from app.admin import admin_router
 from app.api import router
+from app.capacity import RenderQueueFull
+from app.ffmpeg_runner import FfmpegError
+from app.health import health_router
+from app.images import ImageRejected
+from app.jobs import jobs_router
+from app.animation import get_rotation_tables
+from app.profiling import ProfilingMiddleware
+from app.templates import load_templates
+from app.upstream import UpstreamError, close_upstream_client
+from app.workspace import WorkspaceQuotaExceeded, reap_stale_workspaces, run_reaper
 import uvicorn
 
 app = FastAPI()
 
 app.include_router(router)
+app.include_router(health_router)
+app.include_router(jobs_router)
+
+# При выключенном профилировании middleware и служебные endpoint'ы не подключаются
+if config.PROFILING_MODE != 'off':
+    app.add_middleware(ProfilingMiddleware)
+    app.include_router(admin_router)
+
+
+@app.exception_handler(WorkspaceQuotaExceeded)
+async def workspace_quota_exceeded_handler(request: Request, exc: WorkspaceQuotaExceeded):
+    return JSONResponse(status_code=507, content={"detail": str(exc)})
+
+
+@app.exception_handler(RenderQueueFull)
+async def render_queue_full_handler(request: Request, exc: RenderQueueFull):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
+
+@app.exception_handler(UpstreamError)
+async def upstream_error_handler(request: Request, exc: UpstreamError):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
+
+@app.exception_handler(ImageRejected)
+async def image_rejected_handler(request: Request, exc: ImageRejected):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
+
+@app.exception_handler(FfmpegError)
+async def ffmpeg_error_handler(request: Request, exc: FfmpegError):
+    # Таймаут — 504, остальные ошибки ffmpeg — 500; в ответе последние строки stderr
+    return JSONResponse(status_code=504 if exc.timed_out else 500, content=exc.to_dict())
+
+
+@app.on_event("startup")
+async def startup_event():
+    # Маски и слои шаблонов считаются один раз, а не на каждый запрос
+    load_templates()
+    get_rotation_tables()
+    os.makedirs(config.WORKSPACE_ROOT, exist_ok=True)
+    # Убираем то, что осталось от упавших процессов, и запускаем периодическую уборку
+    reap_stale_workspaces()
+    app.state.reaper_task = asyncio.create_task(run_reaper())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.reaper_task.cancel()
+    await close_upstream_client()
 
 if __name__ == '__main__':
     uvicorn.run("main:app", port=8080, reload=True)
@@ -7,17 +7,77 @@ from pydub import AudioSegment
 import numpy as np
 import httpx # For asynchronous client
 import os
+import struct
+import zlib
 
 # Строки ниже больше не нужны, так как мы используем PYTHONPATH в Docker
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from main import app # Import your FastAPI app
+from app.probe import clear_probe_cache
 
 @pytest.fixture(scope="session")
 def anyio_backend():
     return "asyncio"
 
+@pytest.fixture(autouse=True)
+def isolated_probe_cache(tmp_path, monkeypatch):
+    """Каждый тест работает с пустым кэшем ffprobe."""
+    monkeypatch.setattr("app.probe.config.PROBE_CACHE_DIR", str(tmp_path / "probe_cache"))
+    clear_probe_cache()
+    yield
+    clear_probe_cache()
+
+@pytest.fixture(autouse=True)
+def isolated_workspace_root(tmp_path, monkeypatch):
+    """Рабочие каталоги задач создаются во временной папке теста."""
+    root = tmp_path / "workspaces"
+    monkeypatch.setattr("app.workspace.config.WORKSPACE_ROOT", str(root))
+    return root
+
+@pytest.fixture(autouse=True)
+def isolated_cover_store(tmp_path, monkeypatch):
+    """Загруженные обложки хранятся во временной папке теста."""
+    store = tmp_path / "covers"
+    monkeypatch.setattr("app.uploads.config.COVER_STORE_DIR", str(store))
+    return store
+
+@pytest.fixture(autouse=True)
+def isolated_track_cache(tmp_path, monkeypatch):
+    """Скачанные из audio_receiver файлы кэшируются во временной папке теста."""
+    cache = tmp_path / "tracks"
+    monkeypatch.setattr("app.upstream.config.TRACK_CACHE_DIR", str(cache))
+    return cache
+
+@pytest.fixture(autouse=True)
+def isolated_job_queue(tmp_path, monkeypatch):
+    """Очередь задач и каталоги задач создаются во временной папке теста."""
+    jobs_dir = tmp_path / "render_jobs"
+    monkeypatch.setattr("app.job_queue.config.JOBS_DIR", str(jobs_dir))
+    monkeypatch.setattr("app.job_queue.config.JOBS_DB_PATH", str(jobs_dir / "queue.sqlite3"))
+    return jobs_dir
+
+@pytest.fixture
+def fake_audio_receiver(monkeypatch, dummy_mp3_audio_bytes_5s, dummy_png_image_bytes):
+    """
+    Подменяет клиент audio_receiver на MockTransport. Трек "1" есть,
+    остальные — 404. Возвращает список запрошенных путей.
+    """
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        if request.url.path == "/track/1/stream":
+            return httpx.Response(200, content=dummy_mp3_audio_bytes_5s)
+        if request.url.path == "/track/1/cover":
+            return httpx.Response(200, content=dummy_png_image_bytes)
+        return httpx.Response(404, json={"detail": "Трек не найден"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://audio_receiver")
+    monkeypatch.setattr("app.upstream._client", client)
+    return requested
+
 @pytest_asyncio.fixture(scope="module")
 async def async_client():
     # For ASGI apps, httpx uses a transport
@@ -39,6 +99,14 @@ def create_dummy_image(width=100, height=100, color="blue", extension="png") ->
     img_byte_arr.seek(0)
     return img_byte_arr
 
+def create_png_header_only(width: int, height: int) -> bytes:
+    """PNG без данных изображения: только заголовок с заданным разрешением."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IEND", b"")
+
 def create_dummy_audio(duration_ms=5000, channels=1, sample_rate=44100, extension="mp3") -> io.BytesIO:
     """Creates a dummy audio file in memory."""
     num_samples = int(duration_ms / 1000 * sample_rate)
@@ -0,0 +1,303 @@
+# tests/integration/test_api.py
+import os
+import pytest
+
+from tests.conftest import create_png_header_only
+
+
+@pytest.mark.asyncio
+async def test_create_video_unknown_template(async_client, dummy_mp3_audio_bytes_5s, dummy_png_image_bytes):
+    response = await async_client.post(
+        "/create_video",
+        files={
+            "audio_file": ("audio.mp3", dummy_mp3_audio_bytes_5s, "audio/mpeg"),
+            "image_file": ("cover.png", dummy_png_image_bytes, "image/png"),
+        },
+        data={"template": "unknown"},
+    )
+
+    assert response.status_code == 400
+    assert "Неизвестный шаблон" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_create_video_vinyl_template(async_client, dummy_mp3_audio_bytes_5s, dummy_png_image_bytes):
+    response = await async_client.post(
+        "/create_video",
+        files={
+            "audio_file": ("audio.mp3", dummy_mp3_audio_bytes_5s, "audio/mpeg"),
+            "image_file": ("cover.png", dummy_png_image_bytes, "image/png"),
+        },
+        data={"template": "vinyl"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "video/mp4"
+    assert b"moov" in response.content
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(async_client):
+    response = await async_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "# TYPE media_workspace_used_bytes gauge" in response.text
+
+
+@pytest.mark.asyncio
+async def test_raw_create_video(async_client, dummy_mp3_audio_bytes_5s, dummy_png_image_bytes):
+    octet_stream = {"Content-Type": "application/octet-stream"}
+    cover_response = await async_client.post("/covers", content=dummy_png_image_bytes, headers=octet_stream)
+    assert cover_response.status_code == 200
+    cover_id = cover_response.json()["cover_id"]
+
+    head_response = await async_client.head(f"/covers/{cover_id}")
+    assert head_response.status_code == 200
+
+    response = await async_client.post(
+        "/create_video/raw",
+        params={"cover_id": cover_id, "filename": "song.mp3"},
+        content=dummy_mp3_audio_bytes_5s,
+        headers=octet_stream,
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "video/mp4"
+    assert b"moov" in response.content
+
+
+@pytest.mark.asyncio
+async def test_raw_create_video_unknown_cover(async_client, dummy_mp3_audio_bytes_5s):
+    response = await async_client.post(
+        "/create_video/raw",
+        params={"cover_id": "0" * 40},
+        content=dummy_mp3_audio_bytes_5s,
+        headers={"Content-Type": "application/octet-stream"},
+    )
+
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_raw_trim_audio(async_client, dummy_mp3_audio_bytes_5s):
+    response = await async_client.post(
+        "/trim_audio/raw",
+        params={"start": 1, "end": 3, "filename": "song.mp3"},
+        content=dummy_mp3_audio_bytes_5s,
+        headers={"Content-Type": "application/octet-stream"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "audio/mpeg"
+    assert "cut_song_1_3.mp3" in response.headers["content-disposition"]
+
+
+@pytest.mark.asyncio
+async def test_raw_trim_audio_rejects_bad_input(async_client, dummy_mp3_audio_bytes_5s, non_audio_bytes):
+    octet_stream = {"Content-Type": "application/octet-stream"}
+
+    not_audio = await async_client.post(
+        "/trim_audio/raw", params={"start": 1, "end": 3}, content=non_audio_bytes, headers=octet_stream
+    )
+    too_long = await async_client.post(
+        "/trim_audio/raw", params={"start": 1, "end": 30}, content=dummy_mp3_audio_bytes_5s, headers=octet_stream
+    )
+    wrong_type = await async_client.post(
+        "/trim_audio/raw", params={"start": 1, "end": 3}, content=dummy_mp3_audio_bytes_5s,
+        headers={"Content-Type": "audio/mpeg"}
+    )
+
+    assert not_audio.status_code == 400
+    assert too_long.status_code == 400
+    assert wrong_type.status_code == 415
+
+
+@pytest.mark.asyncio
+async def test_raw_trim_audio_fades(async_client, dummy_mp3_audio_bytes_5s):
+    octet_stream = {"Content-Type": "application/octet-stream"}
+
+    faded = await async_client.post(
+        "/trim_audio/raw", params={"start": 1, "end": 4, "fade_in": 0.5, "fade_out": 1},
+        content=dummy_mp3_audio_bytes_5s, headers=octet_stream
+    )
+    longer_than_segment = await async_client.post(
+        "/trim_audio/raw", params={"start": 1, "end": 3, "fade_in": 1.5, "fade_out": 1},
+        content=dummy_mp3_audio_bytes_5s, headers=octet_stream
+    )
+    negative = await async_client.post(
+        "/trim_audio/raw", params={"start": 1, "end": 3, "fade_in": -1},
+        content=dummy_mp3_audio_bytes_5s, headers=octet_stream
+    )
+
+    assert faded.status_code == 200
+    assert len(faded.content) > 0
+    assert longer_than_segment.status_code == 400
+    assert negative.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_create_video_by_reference(async_client, fake_audio_receiver):
+    response = await async_client.post(
+        "/create_video/by_reference",
+        json={"track_id": "1", "start": 1, "end": 4, "template": "vinyl"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "video/mp4"
+    assert b"moov" in response.content
+    assert sorted(fake_audio_receiver) == ["/track/1/cover", "/track/1/stream"]
+
+
+@pytest.mark.asyncio
+async def test_create_video_by_reference_with_uploaded_cover(
+    async_client, fake_audio_receiver, dummy_jpg_image_bytes
+):
+    cover_response = await async_client.post(
+        "/covers", content=dummy_jpg_image_bytes, headers={"Content-Type": "application/octet-stream"}
+    )
+    cover_id = cover_response.json()["cover_id"]
+
+    response = await async_client.post(
+        "/create_video/by_reference",
+        json={"track_id": "1", "start": 0, "end": 3, "cover_id": cover_id},
+    )
+
+    assert response.status_code == 200
+    assert fake_audio_receiver == ["/track/1/stream"]
+
+
+@pytest.mark.asyncio
+async def test_create_video_by_reference_errors(async_client, fake_audio_receiver):
+    missing = await async_client.post(
+        "/create_video/by_reference", json={"track_id": "2", "start": 0, "end": 3}
+    )
+    bad_id = await async_client.post(
+        "/create_video/by_reference", json={"track_id": "../1", "start": 0, "end": 3}
+    )
+    too_long = await async_client.post(
+        "/create_video/by_reference", json={"track_id": "1", "start": 0, "end": 30}
+    )
+
+    assert missing.status_code == 404
+    assert bad_id.status_code == 400
+    assert too_long.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_create_video_shared(async_client, tmp_path, dummy_mp3_audio_bytes_5s, dummy_png_image_bytes, monkeypatch):
+    shared = tmp_path / "shared"
+    (shared / "job").mkdir(parents=True)
+    (shared / "job" / "audio.mp3").write_bytes(dummy_mp3_audio_bytes_5s)
+    (shared / "job" / "cover.png").write_bytes(dummy_png_image_bytes)
+    monkeypatch.setattr("app.shared.config.SHARED_DIR", str(shared))
+
+    response = await async_client.post(
+        "/create_video/shared",
+        json={"audio_path": "job/audio.mp3", "cover_path": "job/cover.png", "start": 1, "end": 3},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"output_path": "job/audio.mp4"}
+    assert b"moov" in (shared / "job" / "audio.mp4").read_bytes()
+
+
+@pytest.mark.asyncio
+async def test_create_video_shared_rejects_traversal(async_client, tmp_path, monkeypatch):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    monkeypatch.setattr("app.shared.config.SHARED_DIR", str(shared))
+
+    response = await async_client.post(
+        "/create_video/shared",
+        json={"audio_path": "../../etc/passwd", "cover_path": "cover.png"},
+    )
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_upload_cover_rejects_pixel_bomb(async_client):
+    response = await async_client.post(
+        "/covers", content=create_png_header_only(20000, 20000), headers={"Content-Type": "application/octet-stream"}
+    )
+
+    assert response.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_job_lifecycle(async_client, dummy_mp3_audio_bytes_5s, dummy_png_image_bytes):
+    from app.job_queue import get_job_queue
+    from app.worker import process_job
+
+    response = await async_client.post(
+        "/jobs",
+        files={
+            "audio_file": ("audio.mp3", dummy_mp3_audio_bytes_5s, "audio/mpeg"),
+            "image_file": ("cover.png", dummy_png_image_bytes, "image/png"),
+        },
+        data={"start": "1", "end": "3"},
+    )
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    status = await async_client.get(f"/jobs/{job_id}")
+    not_ready = await async_client.get(f"/jobs/{job_id}/result")
+    assert status.json()["status"] == "queued"
+    assert not_ready.status_code == 409
+
+    # Воркер забирает задачу из той же очереди
+    queue = get_job_queue()
+    await process_job(queue, queue.claim("worker", 60), "worker")
+
+    result = await async_client.get(f"/jobs/{job_id}/result")
+    assert result.status_code == 200
+    assert result.headers["content-type"] == "video/mp4"
+    assert b"ftyp" in result.content[:64]
+
+
+@pytest.mark.asyncio
+async def test_job_rejects_invalid_audio(async_client, non_audio_bytes, dummy_png_image_bytes):
+    from app.job_queue import get_job_queue
+
+    response = await async_client.post(
+        "/jobs",
+        files={
+            "audio_file": ("audio.mp3", non_audio_bytes, "audio/mpeg"),
+            "image_file": ("cover.png", dummy_png_image_bytes, "image/png"),
+        },
+    )
+
+    assert response.status_code == 400
+    assert get_job_queue().claim("worker", 60) is None
+
+
+@pytest.mark.asyncio
+async def test_job_invalid_input_not_retried(dummy_png_image_bytes, non_audio_bytes):
+    from app.job_queue import JOB_FAILED, get_job_queue, job_dir
+    from app.worker import process_job
+
+    # Задача, поставленная в обход API (например, другой версией сервиса)
+    queue = get_job_queue()
+    job_id = "f" * 32
+    os.makedirs(job_dir(job_id))
+    with open(os.path.join(job_dir(job_id), "audio"), "wb") as f:
+        f.write(non_audio_bytes)
+    with open(os.path.join(job_dir(job_id), "cover"), "wb") as f:
+        f.write(dummy_png_image_bytes)
+    queue.enqueue({"audio_file": "audio", "cover_file": "cover", "template": "cover", "animated": False}, job_id=job_id)
+
+    await process_job(queue, queue.claim("worker", 60), "worker")
+
+    job = queue.get(job_id)
+    assert job.status == JOB_FAILED
+    assert job.attempts == 1
+    assert "аудиоформат" in job.error
+
+
+@pytest.mark.asyncio
+async def test_unknown_job(async_client):
+    response = await async_client.get("/jobs/" + "0" * 32)
+    bad_id = await async_client.get("/jobs/..%2F..%2Fetc")
+
+    assert response.status_code == 404
+    assert bad_id.status_code == 404
@@ -0,0 +1,127 @@
+# tests/unit/test_animation.py
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import numpy as np
+from unittest.mock import patch
+
+from app import animation
+from app.animation import build_rotation_tables, iter_rotation_frames, get_rotation_loop, link_rotation_loop
+from app.workspace import job_workspace
+from app.templates import VINYL_TEMPLATE_ID, build_vinyl_template
+from tests.conftest import create_dummy_image
+
+
+@pytest.fixture
+def loop_cache_dir(tmp_path):
+    with patch("app.animation.config.ANIMATION_CACHE_DIR", str(tmp_path)):
+        yield tmp_path
+
+
+def test_rotation_tables_first_frame_is_identity():
+    tables = build_rotation_tables(32, 8)
+
+    assert tables.shape == (2, 32 * 32)
+    assert np.array_equal(tables[0], np.arange(32 * 32))
+
+
+def test_rotation_tables_require_multiple_of_four():
+    with pytest.raises(ValueError):
+        build_rotation_tables(32, 10)
+
+
+def test_rotation_frames_cover_full_turn():
+    size, frames_per_turn = 64, 8
+    template = build_vinyl_template(size)
+    record = np.random.randint(0, 255, (size, size, 3), dtype=np.uint8)
+
+    frames = list(iter_rotation_frames(record, template, frames_per_turn))
+
+    assert len(frames) == frames_per_turn
+    assert all(frame.shape == (size, size, 3) and frame.dtype == np.uint8 for frame in frames)
+    # Кадр через четверть оборота совпадает с повернутым на 90 градусов первым кадром
+    # (блик неподвижен, поэтому сравниваем без него)
+    no_sheen = template._replace(sheen_alpha=np.zeros_like(template.sheen_alpha))
+    frames = list(iter_rotation_frames(record, no_sheen, frames_per_turn))
+    assert np.array_equal(frames[2], np.rot90(frames[0], k=-1))
+
+
+@patch("app.animation.config.ANIMATION_FRAMES_PER_TURN", 8)
+def test_get_rotation_loop_encodes_once(loop_cache_dir):
+    cover_bytes = create_dummy_image().getvalue()
+
+    with patch("app.animation.encode_rotation_loop") as mock_encode:
+        mock_encode.side_effect = lambda cover, template, path: open(path, "wb").write(b"loop")
+        first = get_rotation_loop(cover_bytes, VINYL_TEMPLATE_ID)
+        second = get_rotation_loop(cover_bytes, VINYL_TEMPLATE_ID)
+
+    assert first == second
+    assert os.path.exists(first)
+    assert mock_encode.call_count == 1
+    assert animation._loop_locks == {}
+
+
+@patch("app.animation.config.ANIMATION_FRAMES_PER_TURN", 8)
+def test_get_rotation_loop_concurrent_encodes_once(loop_cache_dir):
+    cover_bytes = create_dummy_image().getvalue()
+    calls = []
+
+    def slow_encode(cover, template, path):
+        calls.append(path)
+        time.sleep(0.05)
+        with open(path, "wb") as f:
+            f.write(b"loop")
+
+    with patch("app.animation.encode_rotation_loop", side_effect=slow_encode):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            paths = list(pool.map(lambda _: get_rotation_loop(cover_bytes, VINYL_TEMPLATE_ID), range(4)))
+
+    assert len(set(paths)) == 1
+    assert len(calls) == 1
+    assert animation._loop_locks == {}
+
+
+@patch("app.animation.config.ANIMATION_CACHE_MAX_FILES", 1)
+def test_get_rotation_loop_evicts_old_loops(loop_cache_dir):
+    with patch("app.animation.encode_rotation_loop") as mock_encode:
+        mock_encode.side_effect = lambda cover, template, path: open(path, "wb").write(b"loop")
+        get_rotation_loop(create_dummy_image(color="red").getvalue(), VINYL_TEMPLATE_ID)
+        last = get_rotation_loop(create_dummy_image(color="green").getvalue(), VINYL_TEMPLATE_ID)
+
+    assert os.listdir(loop_cache_dir) == [os.path.basename(last)]
+
+
+def test_link_rotation_loop_survives_eviction(loop_cache_dir, isolated_workspace_root):
+    with patch("app.animation.encode_rotation_loop") as mock_encode, job_workspace() as workspace:
+        mock_encode.side_effect = lambda cover, template, path: open(path, "wb").write(b"loop")
+        path = link_rotation_loop(workspace, create_dummy_image().getvalue(), VINYL_TEMPLATE_ID)
+        for name in os.listdir(loop_cache_dir):
+            if name.endswith(".mp4"):
+                os.remove(os.path.join(loop_cache_dir, name))
+
+        assert os.path.dirname(path) == workspace.path
+        with open(path, "rb") as f:
+            assert f.read() == b"loop"
+
+
+def test_link_rotation_loop_reencodes_evicted_loop(loop_cache_dir, isolated_workspace_root):
+    cover_bytes = create_dummy_image().getvalue()
+    missing = os.path.join(str(loop_cache_dir), "evicted.mp4")
+    cached = os.path.join(str(loop_cache_dir), "cached.mp4")
+    with open(cached, "wb") as f:
+        f.write(b"loop")
+
+    with patch("app.animation.get_rotation_loop", side_effect=[missing, cached]), job_workspace() as workspace:
+        path = link_rotation_loop(workspace, cover_bytes, VINYL_TEMPLATE_ID)
+        with open(path, "rb") as f:
+            assert f.read() == b"loop"
+
+
+@patch("app.animation.config.ANIMATION_FRAMES_PER_TURN", 8)
+def test_encode_rotation_loop_integration(loop_cache_dir):
+    loop_path = get_rotation_loop(create_dummy_image().getvalue(), VINYL_TEMPLATE_ID)
+
+    with open(loop_path, "rb") as f:
+        data = f.read()
+    assert b"moov" in data
@@ -0,0 +1,95 @@
+# tests/unit/test_budget.py
+import io
+import os
+import pytest
+import numpy as np
+from PIL import Image
+from unittest.mock import patch
+
+from app import budget
+from app.budget import (
+    MAX_CRF, TrialResult, crf_for_target, plan_loop_encode, plan_static_encode, predict_video_bytes,
+    split_h264_frames
+)
+from app.services import render_video_in_workspace
+from app.workspace import job_workspace
+from tests.conftest import create_dummy_audio
+
+
+@pytest.fixture(autouse=True)
+def empty_trial_cache():
+    budget.clear_trial_cache()
+    yield
+    budget.clear_trial_cache()
+
+
+def _noisy_png() -> bytes:
+    rng = np.random.default_rng(1)
+    image = Image.fromarray(rng.integers(0, 255, (640, 640, 3), dtype=np.uint8))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_split_h264_frames():
+    sps = b"\x00\x00\x00\x01\x67" + b"s" * 5
+    idr = b"\x00\x00\x01\x65" + b"i" * 100
+    p_frames = b"".join(b"\x00\x00\x01\x41" + b"p" * 10 for _ in range(4))
+
+    result = split_h264_frames(sps + idr + p_frames)
+
+    # Нули перед 4-байтовым стартовым кодом относятся к предыдущему NAL
+    assert result.keyframe_bytes == 3 + 6 + 3 + 101
+    assert result.frame_bytes == 14
+
+
+def test_predict_video_bytes():
+    # 10 секунд при 25 fps: 250 кадров, один из них ключевой
+    assert predict_video_bytes(TrialResult(1000, 10.0), 10, 25) == 1000 + 249 * 10
+
+
+def test_crf_for_target():
+    assert crf_for_target(23, 100, 200, 0.5) == 23
+    assert crf_for_target(23, 400, 100, 0.5) == 35
+    assert crf_for_target(23, 400, 0, 0.5) == MAX_CRF
+    assert crf_for_target(23, 400, 100, 1.0) == MAX_CRF
+
+
+def test_plan_loop_encode():
+    # Петля 2 секунды по 100 КБ, видео 10 секунд — 500 КБ
+    assert plan_loop_encode(100_000, 2, 10, 600_000) == (500_000, None)
+    assert plan_loop_encode(100_000, 2, 10, 400_000) == (400_000, 320_000)
+
+
+def test_plan_static_encode_skips_trial_for_simple_cover(tmp_path):
+    image_path = str(tmp_path / "cover.png")
+    Image.new("RGB", (640, 640), "blue").save(image_path)
+
+    with patch("app.budget.trial_encode") as trial_encode:
+        assert plan_static_encode(image_path, 55, 1_000_000, 25) is None
+    trial_encode.assert_not_called()
+
+
+def test_plan_static_encode_fits_budget(tmp_path):
+    image_path = str(tmp_path / "cover.png")
+    with open(image_path, "wb") as f:
+        f.write(_noisy_png())
+
+    plan = plan_static_encode(image_path, 10, 300_000, 25, cache_key=("noisy", 0))
+
+    assert plan is not None
+    assert plan.crf > 23
+    assert plan.predicted_bytes <= 300_000
+
+
+@patch("app.config.VIDEO_SIZE_BUDGET_BYTES", 900_000)
+def test_render_respects_size_budget():
+    audio_bytes = create_dummy_audio(duration_ms=20000).getvalue()
+    predictions = budget.size_prediction_error.count
+
+    with job_workspace() as workspace:
+        audio_path = workspace.write("audio", audio_bytes)
+        video = render_video_in_workspace(workspace, audio_path, _noisy_png())
+
+    assert len(video) <= 900_000
+    assert budget.size_prediction_error.count == predictions + 1
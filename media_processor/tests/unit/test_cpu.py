@@ -0,0 +1,85 @@
+# tests/unit/test_cpu.py
+from unittest.mock import patch
+
+from app.cpu import (
+    auto_encoder_threads, auto_render_slots, available_cpus, cgroup_cpu_limit, encoder_threads, process_cpus,
+    render_slots, set_process_concurrency
+)
+
+
+def test_cgroup_v2_quota(tmp_path):
+    (tmp_path / "cpu.max").write_text("250000 100000\n")
+    assert cgroup_cpu_limit(str(tmp_path)) == 2.5
+
+
+def test_cgroup_v2_unlimited(tmp_path):
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert cgroup_cpu_limit(str(tmp_path)) is None
+
+
+def test_cgroup_v1_quota(tmp_path):
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("400000\n")
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    assert cgroup_cpu_limit(str(tmp_path)) == 4
+
+
+def test_cgroup_v1_unlimited(tmp_path):
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    assert cgroup_cpu_limit(str(tmp_path)) is None
+
+
+def test_available_cpus_respects_quota(tmp_path):
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    with patch("app.cpu.os.sched_getaffinity", return_value=set(range(16))):
+        assert available_cpus(str(tmp_path)) == 1.5
+    (tmp_path / "cpu.max").write_text("50000 100000\n")
+    assert available_cpus(str(tmp_path)) == 1.0
+
+
+def test_auto_configuration():
+    assert auto_render_slots(1) == 1
+    assert auto_render_slots(2.5) == 1
+    assert auto_render_slots(8) == 4
+    assert auto_encoder_threads(1, 1) == 1
+    assert auto_encoder_threads(8, 4) == 2
+    assert auto_encoder_threads(32, 2) == 4
+
+
+@patch("app.cpu.process_cpus", return_value=8.0)
+def test_explicit_settings_win(_):
+    with patch("app.cpu.config.MAX_CONCURRENT_RENDERS", 0), patch("app.cpu.config.X264_THREADS", 0):
+        assert render_slots() == 4
+        assert encoder_threads() == 2
+    with patch("app.cpu.config.MAX_CONCURRENT_RENDERS", 2), patch("app.cpu.config.X264_THREADS", 0):
+        assert encoder_threads() == 4
+    with patch("app.cpu.config.X264_THREADS", 3):
+        assert encoder_threads() == 3
+
+
+def test_cpu_quota_read_once():
+    process_cpus.cache_clear()
+    try:
+        with patch("app.cpu.available_cpus", return_value=6.0) as available, \
+                patch("app.cpu.config.MAX_CONCURRENT_RENDERS", 0), patch("app.cpu.config.X264_THREADS", 0):
+            for _ in range(3):
+                assert render_slots() == 3
+                assert encoder_threads() == 2
+        available.assert_called_once()
+    finally:
+        process_cpus.cache_clear()
+
+
+@patch("app.cpu.process_cpus", return_value=8.0)
+def test_process_concurrency_splits_threads(_):
+    """Воркер с WORKER_CONCURRENCY больше слотов API не превышает квоту CPU."""
+    try:
+        with patch("app.cpu.config.MAX_CONCURRENT_RENDERS", 2), patch("app.cpu.config.X264_THREADS", 0):
+            set_process_concurrency(8)
+            assert encoder_threads() == 1
+            set_process_concurrency(None)
+            assert encoder_threads() == 4
+    finally:
+        set_process_concurrency(None)
@@ -0,0 +1,114 @@
+# tests/unit/test_ffmpeg_runner.py
+import pytest
+from starlette.concurrency import run_in_threadpool
+from unittest.mock import patch
+
+from app.ffmpeg_runner import (
+    MAX_LINE_BYTES, FfmpegError, StderrRing, active_runs, parse_progress, run_ffmpeg_command,
+    run_ffmpeg_command_sync
+)
+
+TEST_SOURCE = ["-f", "lavfi", "-i", "testsrc=size=64x64:rate=25"]
+
+
+def test_parse_progress():
+    progress = parse_progress({"frame": "50", "out_time_us": "2000000", "speed": "3.5x", "progress": "end"})
+
+    assert progress.frame == 50
+    assert progress.out_time == 2.0
+    assert progress.speed == 3.5
+    assert progress.done
+
+
+def test_parse_progress_tolerates_missing_values():
+    progress = parse_progress({"out_time_us": "N/A", "speed": "N/A", "progress": "continue"})
+
+    assert progress.frame == 0
+    assert progress.out_time == 0.0
+    assert progress.speed is None
+    assert not progress.done
+
+
+def test_stderr_ring_is_bounded():
+    ring = StderrRing(max_lines=3)
+    for number in range(10):
+        ring.append(f"line {number}".encode())
+    ring.append(b"x" * (MAX_LINE_BYTES * 10))
+
+    assert ring.total_lines == 11
+    assert ring.text().splitlines()[:2] == ["line 8", "line 9"]
+    assert len(ring.lines[-1]) == MAX_LINE_BYTES + 3
+
+
+@pytest.mark.asyncio
+async def test_run_reports_progress():
+    updates = []
+    result = await run_ffmpeg_command(
+        ["ffmpeg", *TEST_SOURCE, "-t", "1", "-f", "null", "-"],
+        on_progress=updates.append
+    )
+
+    assert updates and updates[-1].done
+    assert updates[-1].out_time == pytest.approx(1.0, abs=0.1)
+    # Строки -progress не попадают в лог
+    assert "progress=" not in result.stderr
+    assert active_runs() == []
+
+
+@pytest.mark.asyncio
+async def test_run_pipes_stdin_and_stdout():
+    frame = bytes(16 * 16 * 3)
+    result = await run_ffmpeg_command(
+        ["ffmpeg", "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", "16x16", "-i", "pipe:",
+         "-f", "rawvideo", "-pix_fmt", "gray", "pipe:"],
+        capture_stdout=True,
+        stdin_chunks=[frame] * 5
+    )
+
+    assert len(result.stdout) == 16 * 16 * 5
+
+
+@pytest.mark.asyncio
+async def test_run_raises_structured_error(tmp_path):
+    with pytest.raises(FfmpegError) as error:
+        await run_ffmpeg_command(["ffmpeg", "-i", str(tmp_path / "missing.mp3"), "-f", "null", "-"])
+
+    assert error.value.returncode != 0
+    assert not error.value.timed_out
+    assert "missing.mp3" in error.value.stderr_tail
+    assert error.value.to_dict()["stderr_tail"]
+
+
+@pytest.mark.asyncio
+async def test_run_kills_process_on_timeout():
+    with pytest.raises(FfmpegError) as error:
+        await run_ffmpeg_command(["ffmpeg", "-re", *TEST_SOURCE, "-f", "null", "-"], timeout=0.5)
+
+    assert error.value.timed_out
+    assert error.value.to_dict()["timed_out"]
+    assert active_runs() == []
+
+
+@pytest.mark.asyncio
+@patch("app.ffmpeg_runner.config.FFMPEG_STDERR_TAIL_LINES", 5)
+async def test_chatty_output_keeps_only_tail():
+    result = await run_ffmpeg_command(
+        ["ffmpeg", "-loglevel", "debug", *TEST_SOURCE, "-t", "2", "-f", "null", "-"]
+    )
+
+    assert len(result.stderr.splitlines()) == 5
+
+
+def test_sync_wrapper_outside_event_loop():
+    result = run_ffmpeg_command_sync(["ffmpeg", *TEST_SOURCE, "-t", "0.2", "-f", "null", "-"])
+
+    assert result.elapsed > 0
+
+
+@pytest.mark.asyncio
+async def test_sync_wrapper_in_threadpool():
+    result = await run_in_threadpool(
+        run_ffmpeg_command_sync, ["ffmpeg", *TEST_SOURCE, "-t", "0.2", "-f", "null", "-"]
+    )
+
+    assert result.elapsed > 0
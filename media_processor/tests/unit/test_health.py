@@ -0,0 +1,104 @@
+# tests/unit/test_health.py
+import asyncio
+import pytest
+from unittest.mock import patch
+
+from app.capacity import RenderLimiter, RenderQueueFull
+
+
+@pytest.mark.asyncio
+async def test_render_limiter_counts_slots():
+    limiter = RenderLimiter(slots=2, queue_limit=1)
+
+    async with limiter.slot():
+        assert limiter.in_flight == 1
+        assert limiter.free_slots == 1
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_render_limiter_rejects_when_queue_full():
+    limiter = RenderLimiter(slots=1, queue_limit=1)
+    release = asyncio.Event()
+
+    async def render():
+        async with limiter.slot():
+            await release.wait()
+
+    running = asyncio.create_task(render())
+    queued = asyncio.create_task(render())
+    await asyncio.sleep(0)
+
+    assert limiter.in_flight == 1
+    assert limiter.waiting == 1
+    assert limiter.saturated
+    with pytest.raises(RenderQueueFull):
+        async with limiter.slot():
+            pass
+
+    release.set()
+    await asyncio.gather(running, queued)
+    assert not limiter.saturated
+
+
+@pytest.mark.asyncio
+async def test_liveness(async_client):
+    response = await async_client.get("/health/live")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "alive"}
+
+
+@pytest.mark.asyncio
+async def test_readiness_ready(async_client):
+    with patch("app.health.ffmpeg_available", return_value=True), \
+            patch("app.health.workspace_disk_free_bytes.value", return_value=10 ** 12):
+        response = await async_client.get("/health/ready")
+
+    body = response.json()
+    assert response.status_code == 200
+    assert body["status"] == "ready"
+    assert body["free_slots"] == body["total_slots"]
+    assert body["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_readiness_saturated(async_client):
+    limiter = RenderLimiter(slots=1, queue_limit=0)
+    limiter.in_flight = 1
+
+    with patch("app.health.render_limiter", limiter), \
+            patch("app.health.ffmpeg_available", return_value=True), \
+            patch("app.health.workspace_disk_free_bytes.value", return_value=10 ** 12):
+        response = await async_client.get("/health/ready")
+
+    assert response.status_code == 503
+    assert response.json()["problems"] == ["saturated"]
+
+
+@pytest.mark.asyncio
+async def test_readiness_low_disk_and_no_ffmpeg(async_client):
+    with patch("app.health.ffmpeg_available", return_value=False), \
+            patch("app.health.workspace_disk_free_bytes.value", return_value=0):
+        response = await async_client.get("/health/ready")
+
+    assert response.status_code == 503
+    assert response.json()["problems"] == ["low_disk", "ffmpeg_missing"]
+
+
+@pytest.mark.asyncio
+async def test_create_video_overloaded(async_client, dummy_mp3_audio_bytes_5s, dummy_png_image_bytes):
+    limiter = RenderLimiter(slots=1, queue_limit=0)
+    limiter.in_flight = 1
+
+    with patch("app.api.render_limiter", limiter):
+        response = await async_client.post(
+            "/create_video",
+            files={
+                "audio_file": ("audio.mp3", dummy_mp3_audio_bytes_5s, "audio/mpeg"),
+                "image_file": ("cover.png", dummy_png_image_bytes, "image/png"),
+            },
+        )
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
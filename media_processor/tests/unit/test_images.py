@@ -0,0 +1,68 @@
+# tests/unit/test_images.py
+import io
+import pytest
+from PIL import Image
+from unittest.mock import patch
+
+from app.images import ImageRejected, decode_image, inspect_image
+from app.templates import get_cover_frame
+from tests.conftest import create_dummy_image, create_png_header_only
+
+
+def test_inspect_image_reads_header(dummy_jpg_image_bytes):
+    info = inspect_image(dummy_jpg_image_bytes)
+
+    assert info.format == "JPEG"
+    assert (info.width, info.height) == (100, 100)
+
+
+def test_pixel_bomb_rejected_without_decoding():
+    bomb = create_png_header_only(20000, 20000)
+
+    with patch("app.images.Image.Image.load") as load:
+        with pytest.raises(ImageRejected) as error:
+            decode_image(bomb)
+    load.assert_not_called()
+    assert error.value.status_code == 413
+
+
+@patch("app.images.config.MAX_IMAGE_BYTES", 10)
+def test_byte_limit(dummy_png_image_bytes):
+    with pytest.raises(ImageRejected) as error:
+        inspect_image(dummy_png_image_bytes)
+    assert error.value.status_code == 413
+
+
+def test_non_image_rejected(non_image_bytes):
+    with pytest.raises(ImageRejected) as error:
+        inspect_image(non_image_bytes)
+    assert error.value.status_code == 400
+
+
+def test_large_jpeg_decoded_at_reduced_size():
+    jpeg = create_dummy_image(width=4000, height=3000, extension="jpeg").getvalue()
+
+    img = decode_image(jpeg, min_side=640)
+
+    # Масштаб DCT 1/4: меньшая сторона не меньше 640
+    assert img.size == (1000, 750)
+
+
+def test_large_png_reduced_after_decoding():
+    png = create_dummy_image(width=3000, height=2000, extension="png").getvalue()
+
+    img = decode_image(png, min_side=640)
+
+    assert img.size == (1000, 667)
+
+
+def test_small_image_kept_as_is(dummy_png_image_bytes):
+    assert decode_image(dummy_png_image_bytes, min_side=640).size == (100, 100)
+
+
+def test_cover_frame_from_large_jpeg():
+    jpeg = create_dummy_image(width=4000, height=3000, extension="jpeg").getvalue()
+
+    frame = Image.open(io.BytesIO(get_cover_frame(jpeg)))
+
+    assert frame.size == (640, 640)
@@ -0,0 +1,138 @@
+# tests/unit/test_job_queue.py
+import os
+import time
+import pytest
+from unittest.mock import patch
+
+from app.job_queue import JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, get_job_queue, job_dir
+from app.worker import process_job, purge_finished_jobs, result_path
+
+
+def test_claim_and_complete():
+    queue = get_job_queue()
+    job_id = queue.enqueue({"template": "cover"})
+
+    job = queue.claim("worker-a", 60)
+
+    assert job.id == job_id
+    assert job.status == JOB_RUNNING
+    assert job.attempts == 1
+    assert job.params == {"template": "cover"}
+    # Задача в аренде не выдается второй раз
+    assert queue.claim("worker-b", 60) is None
+
+    assert queue.complete(job_id, "worker-a")
+    assert queue.get(job_id).status == JOB_DONE
+
+
+def test_expired_lease_is_reclaimed():
+    queue = get_job_queue()
+    job_id = queue.enqueue({})
+    queue.claim("crashed-worker", 0.01)
+    time.sleep(0.02)
+
+    job = queue.claim("worker-b", 60)
+
+    assert job.id == job_id
+    assert job.attempts == 2
+    assert job.lease_owner == "worker-b"
+    # Упавший воркер больше не может ни продлить, ни завершить задачу
+    assert not queue.heartbeat(job_id, "crashed-worker", 60)
+    assert not queue.complete(job_id, "crashed-worker")
+    assert queue.heartbeat(job_id, "worker-b", 60)
+
+
+@patch("app.job_queue.config.JOB_MAX_ATTEMPTS", 1)
+def test_expired_lease_without_attempts_left_fails():
+    queue = get_job_queue()
+    job_id = queue.enqueue({})
+    queue.claim("crashed-worker", 0.01)
+    time.sleep(0.02)
+
+    assert queue.claim("worker-b", 60) is None
+    assert queue.get(job_id).status == JOB_FAILED
+
+
+@patch("app.job_queue.config.JOB_RETRY_DELAY_SECONDS", 0)
+def test_fail_retries_until_attempts_exhausted():
+    queue = get_job_queue()
+    job_id = queue.enqueue({})
+
+    for _ in range(2):
+        queue.claim("worker", 60)
+        assert queue.fail(job_id, "worker", "ffmpeg упал")
+        assert queue.get(job_id).status == JOB_QUEUED
+
+    queue.claim("worker", 60)
+    queue.fail(job_id, "worker", "ffmpeg упал")
+    job = queue.get(job_id)
+    assert job.status == JOB_FAILED
+    assert job.attempts == 3
+    assert job.error == "ffmpeg упал"
+
+
+def test_permanent_failure_is_not_retried():
+    queue = get_job_queue()
+    job_id = queue.enqueue({})
+    queue.claim("worker", 60)
+
+    queue.fail(job_id, "worker", "Неизвестный шаблон", retry=False)
+
+    assert queue.get(job_id).status == JOB_FAILED
+
+
+@pytest.mark.asyncio
+async def test_process_job_renders_result(dummy_mp3_audio_bytes_5s, dummy_png_image_bytes):
+    queue = get_job_queue()
+    job_id = "a" * 32
+    os.makedirs(job_dir(job_id))
+    with open(os.path.join(job_dir(job_id), "audio"), "wb") as f:
+        f.write(dummy_mp3_audio_bytes_5s)
+    with open(os.path.join(job_dir(job_id), "cover"), "wb") as f:
+        f.write(dummy_png_image_bytes)
+    queue.enqueue(
+        {"audio_file": "audio", "cover_file": "cover", "template": "cover", "animated": False,
+         "start": 1, "end": 3},
+        job_id=job_id
+    )
+
+    await process_job(queue, queue.claim("worker", 60), "worker")
+
+    assert queue.get(job_id).status == JOB_DONE
+    with open(result_path(job_id), "rb") as f:
+        assert b"ftyp" in f.read(64)
+
+
+@pytest.mark.asyncio
+async def test_process_job_with_bad_input_fails_without_retry(dummy_mp3_audio_bytes_5s):
+    queue = get_job_queue()
+    job_id = "b" * 32
+    os.makedirs(job_dir(job_id))
+    with open(os.path.join(job_dir(job_id), "audio"), "wb") as f:
+        f.write(dummy_mp3_audio_bytes_5s)
+    with open(os.path.join(job_dir(job_id), "cover"), "wb") as f:
+        f.write(b"not an image")
+    queue.enqueue(
+        {"audio_file": "audio", "cover_file": "cover", "template": "cover", "animated": False},
+        job_id=job_id
+    )
+
+    await process_job(queue, queue.claim("worker", 60), "worker")
+
+    job = queue.get(job_id)
+    assert job.status == JOB_FAILED
+    assert job.attempts == 1
+
+
+@patch("app.worker.config.JOB_RESULT_TTL_SECONDS", 0)
+def test_purge_finished_jobs():
+    queue = get_job_queue()
+    job_id = queue.enqueue({})
+    os.makedirs(job_dir(job_id))
+    queue.claim("worker", 60)
+    queue.complete(job_id, "worker")
+    time.sleep(0.01)
+
+    assert purge_finished_jobs(queue) == 1
+    assert queue.get(job_id) is None
+    assert not os.path.exists(job_dir(job_id))
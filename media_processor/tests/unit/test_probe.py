@@ -0,0 +1,119 @@
+# tests/unit/test_probe.py
+import os
+import pytest
+from unittest.mock import patch
+
+from app.probe import ProbeInfo, probe, probe_key, parse_probe, clear_probe_cache
+from tests.conftest import create_dummy_audio
+
+FAKE_PROBE_RESULT = {
+    'format': {'duration': '3.000000', 'bit_rate': '128000'},
+    'streams': [
+        {'codec_type': 'video', 'codec_name': 'png'},
+        {'codec_type': 'audio', 'codec_name': 'mp3', 'sample_rate': '44100', 'channels': 2, 'bit_rate': '96000'},
+    ],
+}
+
+
+@pytest.fixture
+def audio_path(tmp_path):
+    path = tmp_path / "audio.mp3"
+    path.write_bytes(create_dummy_audio(duration_ms=3000).getvalue())
+    return str(path)
+
+
+def test_parse_probe():
+    info = parse_probe(FAKE_PROBE_RESULT)
+
+    assert info == ProbeInfo(duration=3.0, codec='mp3', sample_rate=44100, channels=2, bitrate=96000)
+
+
+def test_parse_probe_without_audio_stream():
+    info = parse_probe({'format': {'duration': '1.5', 'bit_rate': '1000'}})
+
+    assert info.duration == 1.5
+    assert info.codec is None
+    assert info.bitrate == 1000
+
+
+def test_probe_key_depends_on_content(tmp_path):
+    first = tmp_path / "first.bin"
+    second = tmp_path / "second.bin"
+    first.write_bytes(b"a" * 3 * 1024 * 1024)
+    second.write_bytes(b"a" * (3 * 1024 * 1024 - 1) + b"b")
+
+    assert probe_key(str(first)) != probe_key(str(second))
+    assert probe_key(str(first)).startswith(f"{3 * 1024 * 1024}_")
+
+
+@patch('app.probe.ffmpeg.probe', return_value=FAKE_PROBE_RESULT)
+def test_probe_uses_memory_cache(mock_ffmpeg_probe, audio_path):
+    first = probe(audio_path)
+    second = probe(audio_path)
+
+    assert first == second
+    mock_ffmpeg_probe.assert_called_once_with(audio_path)
+
+
+@patch('app.probe.ffmpeg.probe', return_value=FAKE_PROBE_RESULT)
+def test_probe_uses_disk_cache(mock_ffmpeg_probe, audio_path):
+    probe(audio_path)
+    # Имитируем перезапуск процесса: память пуста, диск остался
+    clear_probe_cache()
+    info = probe(audio_path)
+
+    assert info.duration == 3.0
+    mock_ffmpeg_probe.assert_called_once()
+
+
+@patch('app.probe.ffmpeg.probe', return_value=FAKE_PROBE_RESULT)
+def test_probe_same_content_different_path(mock_ffmpeg_probe, audio_path, tmp_path):
+    copy_path = tmp_path / "copy.mp3"
+    with open(audio_path, "rb") as f:
+        copy_path.write_bytes(f.read())
+
+    probe(audio_path)
+    probe(str(copy_path))
+
+    mock_ffmpeg_probe.assert_called_once()
+
+
+@patch('app.probe.ffmpeg.probe', return_value=FAKE_PROBE_RESULT)
+def test_probe_workspace_file_not_persisted(mock_ffmpeg_probe, isolated_workspace_root, tmp_path):
+    job_dir = isolated_workspace_root / "job_1"
+    job_dir.mkdir(parents=True)
+    path = job_dir / "audio.aac"
+    path.write_bytes(create_dummy_audio(duration_ms=1000).getvalue())
+
+    probe(str(path))
+
+    assert not os.path.exists(tmp_path / "probe_cache") or not os.listdir(tmp_path / "probe_cache")
+    # В памяти запись есть
+    probe(str(path))
+    mock_ffmpeg_probe.assert_called_once()
+
+
+@patch('app.probe.ffmpeg.probe', return_value=FAKE_PROBE_RESULT)
+def test_probe_disk_cache_evicts_oldest(mock_ffmpeg_probe, tmp_path, monkeypatch):
+    monkeypatch.setattr("app.probe.config.PROBE_CACHE_MAX_FILES", 2)
+    cache_dir = tmp_path / "probe_cache"
+    keys = []
+    for i in range(3):
+        path = tmp_path / f"audio_{i}.bin"
+        path.write_bytes(bytes([i]) * 100)
+        probe(str(path))
+        keys.append(probe_key(str(path)))
+        # Разные mtime, чтобы порядок вытеснения был определен
+        entry = cache_dir / f"{keys[-1]}.json"
+        os.utime(entry, (1000 + i, 1000 + i))
+
+    assert sorted(os.listdir(cache_dir)) == sorted(f"{key}.json" for key in keys[1:])
+
+
+def test_probe_integration(audio_path):
+    info = probe(audio_path)
+
+    assert info.duration == pytest.approx(3.0, abs=0.1)
+    assert info.codec == 'mp3'
+    assert info.sample_rate == 44100
+    assert info.channels == 1
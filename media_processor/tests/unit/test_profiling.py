@@ -0,0 +1,119 @@
+# tests/unit/test_profiling.py
+import httpx
+import pytest
+from fastapi import FastAPI
+from unittest.mock import patch
+
+from app import profiling
+from app.admin import admin_router
+from app.profiling import ProfilingMiddleware, current_profile, list_profiles, should_profile
+
+ADMIN_HEADERS = {"X-Profile": "1", "X-Admin-Token": "secret"}
+
+
+@pytest.fixture
+def profiling_config(tmp_path):
+    with patch("app.profiling.config.PROFILE_DIR", str(tmp_path)), \
+            patch("app.profiling.config.PROFILING_MODE", "header"), \
+            patch("app.profiling.config.ADMIN_TOKEN", "secret"):
+        yield tmp_path
+
+
+@pytest.fixture
+def profiled_app(profiling_config):
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+    app.include_router(admin_router)
+
+    @app.get("/work")
+    async def work():
+        profile = current_profile()
+        if profile is not None:
+            profile.add_ffmpeg_log(["ffmpeg", "-benchmark"], b"frame=1\nbench: utime=0.010s stime=0.001s rtime=0.020s\n")
+        return {"profiled": profile is not None, "sum": sum(range(1000))}
+
+    return app
+
+
+@pytest.fixture
+async def profiled_client(profiled_app):
+    transport = httpx.ASGITransport(app=profiled_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+def test_should_profile_off():
+    with patch("app.profiling.config.PROFILING_MODE", "off"):
+        assert not should_profile({"x-profile": "1"})
+
+
+def test_should_profile_always():
+    with patch("app.profiling.config.PROFILING_MODE", "always"):
+        assert should_profile({})
+
+
+def test_should_profile_header_requires_token(profiling_config):
+    assert should_profile({"x-profile": "1", "x-admin-token": "secret"})
+    assert not should_profile({"x-profile": "1", "x-admin-token": "wrong"})
+    assert not should_profile({"x-admin-token": "secret"})
+
+
+async def test_request_without_header_is_not_profiled(profiled_client):
+    response = await profiled_client.get("/work")
+
+    assert response.json()["profiled"] is False
+    assert list_profiles() == []
+
+
+async def test_profiled_request_saves_report(profiled_client, profiling_config):
+    response = await profiled_client.get("/work", headers=ADMIN_HEADERS)
+
+    assert response.json()["profiled"] is True
+    [profile_id] = list_profiles()
+    assert "_GET_work_" in profile_id
+    report = (profiling_config / f"{profile_id}.txt").read_text(encoding="utf8")
+    assert "GET /work" in report
+    assert "bench: utime=0.010s" in report
+    assert (profiling_config / f"{profile_id}.prof").exists()
+
+
+async def test_profiles_are_bounded(profiled_client):
+    with patch("app.profiling.config.PROFILE_MAX_COUNT", 2):
+        for _ in range(3):
+            await profiled_client.get("/work", headers=ADMIN_HEADERS)
+
+    assert len(list_profiles()) == 2
+
+
+async def test_admin_endpoints(profiled_client):
+    await profiled_client.get("/work", headers=ADMIN_HEADERS)
+    [profile_id] = list_profiles()
+
+    forbidden = await profiled_client.get("/admin/profiles", headers={"X-Admin-Token": "wrong"})
+    listing = await profiled_client.get("/admin/profiles", headers={"X-Admin-Token": "secret"})
+    report = await profiled_client.get(f"/admin/profiles/{profile_id}.txt", headers={"X-Admin-Token": "secret"})
+    missing = await profiled_client.get("/admin/profiles/..%2Fetc.txt", headers={"X-Admin-Token": "secret"})
+
+    assert forbidden.status_code == 403
+    assert listing.json()["profiles"][0]["files"] == [f"{profile_id}.prof", f"{profile_id}.txt"]
+    assert report.status_code == 200
+    assert "GET /work" in report.text
+    assert missing.status_code == 404
+
+
+def test_run_ffmpeg_adds_benchmark_when_profiled():
+    from app.ffmpeg_runner import FfmpegResult
+    from app.services import run_ffmpeg
+    import ffmpeg
+
+    profile = profiling.RequestProfile("POST", "/create_video")
+    token = profiling._current_profile.set(profile)
+    try:
+        result = FfmpegResult(b"", "bench: utime=1s", 1.0)
+        with patch("app.services.ffmpeg_runner.run_ffmpeg_command_sync", return_value=result) as mock_run:
+            run_ffmpeg(ffmpeg.input("in.aac").output("out.aac"), "Ошибка")
+    finally:
+        profiling._current_profile.reset(token)
+
+    assert "-benchmark" in mock_run.call_args[0][0]
+    assert profile.ffmpeg_logs[0][1] == "bench: utime=1s"
@@ -1,27 +1,27 @@
 # tests/unit/test_services.py
 import pytest
 import io
-from PIL import Image
+import re
 from pydub import AudioSegment
 import os
-import uuid
-import tempfile 
 from unittest.mock import patch, ANY, call
 
 # Импортируем тестируемые функции
-from app.services import trim_audio, crop_to_square, create_video_from_audio_and_cover_files
+from app.services import (
+    trim_audio, create_video_from_audio_and_cover_files, audio_edge_fades, afade_filter_string,
+    run_ffmpeg
+)
 # Импортируем фикстуры и хелперы для создания тестовых данных
 from tests.conftest import create_dummy_audio, create_dummy_image, dummy_wav_audio_bytes_10s, dummy_mp3_audio_bytes_5s
 
 # --- Тесты для trim_audio ---
 
-@pytest.mark.asyncio
-async def test_trim_audio_valid(dummy_wav_audio_bytes_10s):
+def test_trim_audio_valid(dummy_wav_audio_bytes_10s):
     start_time_sec = 2
     end_time_sec = 5
     expected_duration_ms = (end_time_sec - start_time_sec) * 1000
 
-    trimmed_buffer = await trim_audio(dummy_wav_audio_bytes_10s, start_time_sec, end_time_sec)
+    trimmed_buffer = trim_audio(dummy_wav_audio_bytes_10s, start_time_sec, end_time_sec)
     trimmed_buffer.seek(0)
     
     # Убедимся, что буфер не пустой
@@ -33,74 +33,85 @@ async def test_trim_audio_valid(dummy_wav_audio_bytes_10s):
     assert abs(len(trimmed_segment) - expected_duration_ms) < 100 
     assert trimmed_segment.frame_rate > 0
 
-@pytest.mark.asyncio
-async def test_trim_audio_full_length(dummy_mp3_audio_bytes_5s):
+def test_trim_audio_full_length(dummy_mp3_audio_bytes_5s):
     audio_segment = AudioSegment.from_file(io.BytesIO(dummy_mp3_audio_bytes_5s))
     original_duration_ms = len(audio_segment)
 
-    trimmed_buffer = await trim_audio(dummy_mp3_audio_bytes_5s, 0, int(original_duration_ms / 1000))
+    trimmed_buffer = trim_audio(dummy_mp3_audio_bytes_5s, 0, int(original_duration_ms / 1000))
     trimmed_buffer.seek(0)
     
     trimmed_segment = AudioSegment.from_file(trimmed_buffer, format="mp3")
     assert abs(len(trimmed_segment) - original_duration_ms) < 100
 
-# --- Тесты для crop_to_square ---
+# --- Тесты для плавных переходов ---
 
-def test_crop_to_square_already_square():
-    image_bytes_io = create_dummy_image(width=100, height=100, extension="png")
-    
-    cropped_buffer = crop_to_square(image_bytes_io)
-    cropped_buffer.seek(0)
-    img = Image.open(cropped_buffer)
+def test_audio_edge_fades_declick_only_on_cuts():
+    with patch('app.services.config.AUDIO_DECLICK_SECONDS', 0.01):
+        assert audio_edge_fades(10.0) == []
+        assert audio_edge_fades(10.0, cut_start=True, cut_end=True) == [
+            {'t': 'in', 'st': 0, 'd': 0.01},
+            {'t': 'out', 'st': 9.99, 'd': 0.01},
+        ]
+        # Запрошенный переход длиннее сглаживания разреза
+        assert audio_edge_fades(10.0, fade_out=2.0, cut_end=True) == [{'t': 'out', 'st': 8.0, 'd': 2.0}]
 
-    assert img.width == 100
-    assert img.height == 100
-    assert img.format == "PNG" # Функция сохраняет в PNG
 
-def test_crop_to_square_landscape():
-    image_bytes_io = create_dummy_image(width=200, height=100, extension="jpeg")
-    
-    cropped_buffer = crop_to_square(image_bytes_io)
-    cropped_buffer.seek(0)
-    img = Image.open(cropped_buffer)
-    
-    assert img.width == 100
-    assert img.height == 100
-    assert img.format == "PNG"
+def test_audio_edge_fades_do_not_overlap():
+    assert audio_edge_fades(3.0, fade_in=5.0, fade_out=5.0) == [
+        {'t': 'in', 'st': 0, 'd': 1.5},
+        {'t': 'out', 'st': 1.5, 'd': 1.5},
+    ]
+
+
+def test_afade_filter_string():
+    filters = audio_edge_fades(30.0, fade_in=2.0, fade_out=2.0)
 
-def test_crop_to_square_portrait():
-    image_bytes_io = create_dummy_image(width=100, height=200, extension="png")
+    assert afade_filter_string(filters) == "afade=t=in:st=0:d=2.0,afade=t=out:st=28.0:d=2.0"
 
-    cropped_buffer = crop_to_square(image_bytes_io)
-    cropped_buffer.seek(0)
-    img = Image.open(cropped_buffer)
 
-    assert img.width == 100
-    assert img.height == 100
-    assert img.format == "PNG"
+def _rms(segment: AudioSegment, start_ms: int, end_ms: int) -> float:
+    return segment[start_ms:end_ms].rms
 
-def test_crop_to_square_resizes_large_image():
-    # Тестируем, что изображение > 640px будет уменьшено до 640x640
-    image_bytes_io = create_dummy_image(width=1000, height=800, extension="png")
 
-    cropped_buffer = crop_to_square(image_bytes_io)
-    cropped_buffer.seek(0)
-    img = Image.open(cropped_buffer)
+def test_trim_audio_with_fades(dummy_wav_audio_bytes_10s):
+    trimmed_buffer = trim_audio(dummy_wav_audio_bytes_10s, 2, 6, fade_in=1.0, fade_out=1.0)
 
-    assert img.width == 640
-    assert img.height == 640
-    assert img.format == "PNG"
+    trimmed_segment = AudioSegment.from_file(trimmed_buffer, format="mp3")
+    assert abs(len(trimmed_segment) - 4000) < 100
+    middle = _rms(trimmed_segment, 1500, 2500)
+    assert _rms(trimmed_segment, 0, 100) < middle * 0.2
+    assert _rms(trimmed_segment, len(trimmed_segment) - 100, len(trimmed_segment)) < middle * 0.2
+
+
+def test_create_video_fades_in_single_audio_encode():
+    audio_file_io = create_dummy_audio(duration_ms=4000, extension="mp3")
+    image_file_io = create_dummy_image(width=320, height=320, extension="png")
+
+    with patch('app.services.run_ffmpeg', side_effect=run_ffmpeg) as mock_run_ffmpeg:
+        video_bytes = create_video_from_audio_and_cover_files(
+            audio_file_io, image_file_io, fade_in=1.0, fade_out=1.0
+        )
+
+    # Переходы — часть единственного перекодирования аудио
+    commands = [c.args[0].get_args() for c in mock_run_ffmpeg.call_args_list]
+    audio_commands = [args for args in commands if args[-1].endswith('audio.aac')]
+    assert len(audio_commands) == 1
+    filter_args = audio_commands[0][audio_commands[0].index('-filter_complex') + 1]
+    assert 'afade=d=1.0:st=0:t=in' in filter_args
+    # Затухание заканчивается в конце исходного файла (MP3 чуть длиннее 4 сек)
+    assert re.search(r'afade=d=1\.0:st=3\.\d+:t=out', filter_args)
+
+    video_segment = AudioSegment.from_file(io.BytesIO(video_bytes), format="mp4")
+    middle = _rms(video_segment, 1500, 2500)
+    assert _rms(video_segment, 0, 100) < middle * 0.2
 
 # --- Тесты для create_video_from_audio_and_cover_files ---
 @patch('app.services.ffmpeg.probe')
-@patch('app.services.os.remove')
-@patch('app.services.ffmpeg.run')
-@patch('app.services.uuid.uuid4', side_effect=['uuid-audio', 'uuid-audio-conv', 'uuid-image', 'uuid-video'])
+@patch('app.services.ffmpeg_runner.run_ffmpeg_command_sync')
 def test_create_video_mocked(
-    mock_uuid,
     mock_ffmpeg_run,
-    mock_os_remove,
-    mock_ffmpeg_probe
+    mock_ffmpeg_probe,
+    isolated_workspace_root
 ):
     """Более "чистый" юнит-тест с моками, который не запускает ffmpeg."""
     audio_file_io = create_dummy_audio(duration_ms=3000)
@@ -108,13 +119,12 @@ def test_create_video_mocked(
 
     mock_ffmpeg_probe.return_value = {'format': {'duration': '3.00'}}
 
-    def create_fake_output_files_correctly(stream, **kwargs):
+    def create_fake_output_files_correctly(args, **kwargs):
         """
         Надежно находит имя выходного файла и имитирует его создание.
         """
-        # stream.get_args() возвращает всю команду в виде списка.
+        # Раннер получает всю команду в виде списка.
         # Имя выходного файла - это последний позиционный аргумент.
-        args = stream.get_args()
         
         # Ищем последний аргумент, который выглядит как путь к файлу
         # (не начинается с '-' и содержит расширение)
@@ -144,16 +154,14 @@ def test_create_video_mocked(
     assert video_bytes == b"fake_video_bytes_moov"
     assert mock_ffmpeg_run.call_count == 2
 
-    # Используем tempfile.gettempdir() без realpath чтобы соответствовать коду в services.py
-    temp_dir = tempfile.gettempdir()
-
-    # Проверяем что probe был вызван с файлом содержащим нужную часть пути
+    # Проверяем что probe был вызван с перекодированным аудио из рабочего каталога задачи
     mock_ffmpeg_probe.assert_called_once()
     probe_call_arg = mock_ffmpeg_probe.call_args[0][0]
-    assert 'tmp_audio_converted_uuid-audio-conv.aac' in probe_call_arg
+    assert probe_call_arg.startswith(str(isolated_workspace_root))
+    assert probe_call_arg.endswith('audio.aac')
 
-    # Проверяем что remove был вызван для временных файлов
-    assert mock_os_remove.call_count == 4
+    # Рабочий каталог задачи удален вместе со всеми временными файлами
+    assert os.listdir(isolated_workspace_root) == []
 
 
 def test_create_video_integration():
@@ -166,34 +174,10 @@ def test_create_video_integration():
     assert len(video_bytes) > 0
     assert b'ftypmp42' in video_bytes[:100] or b'moov' in video_bytes
 
-@pytest.mark.asyncio
-async def test_trim_audio_exception_handling(non_audio_bytes):
+def test_trim_audio_exception_handling(non_audio_bytes):
     """Тестирует обработку исключений внутри trim_audio."""
     # non_audio_bytes берется из фикстуры в conftest.py
-    trimmed_buffer = await trim_audio(non_audio_bytes, 0, 5)
+    trimmed_buffer = trim_audio(non_audio_bytes, 0, 5)
 
     # Проверяем, что возвращен пустой буфер (0 байт)
     assert trimmed_buffer.getbuffer().nbytes == 0
-
-
-def test_crop_to_square_small_image_no_resize():
-    """Тестирует, что небольшое изображение 
-    не будет увеличено, а только обрезано до квадрата.
-    """
-    # Создаем изображение 400x300. Меньшая сторона = 300 (< 640)
-    image_bytes_io = create_dummy_image(width=400, height=300, extension="png")
-    cropped_buffer = crop_to_square(image_bytes_io)
-    cropped_buffer.seek(0)
-    img = Image.open(cropped_buffer)
-    assert img.width == 300
-    assert img.height == 300
-    assert img.format == "PNG"
-
-
-def test_crop_to_square_exception_handling(non_image_bytes):
-    """Тестирует обработку исключений внутри crop_to_square."""
-    # Оборачиваем невалидные байты из conftest.py в BytesIO, т.к. функция ожидает BinaryIO
-    invalid_io = io.BytesIO(non_image_bytes)
-    cropped_buffer = crop_to_square(invalid_io)
-    # Проверяем, что возвращен пустой буфер (0 байт)
-    assert cropped_buffer.getbuffer().nbytes == 0
@@ -0,0 +1,77 @@
+# tests/unit/test_shared.py
+import os
+import pytest
+from fastapi import HTTPException
+from unittest.mock import patch
+
+from app.shared import publish_file, resolve_shared_input, resolve_shared_output
+
+
+@pytest.fixture
+def shared_dir(tmp_path):
+    root = tmp_path / "shared"
+    (root / "jobs").mkdir(parents=True)
+    (root / "jobs" / "audio.mp3").write_bytes(b"audio")
+    with patch("app.shared.config.SHARED_DIR", str(root)):
+        yield root
+
+
+def test_resolve_input(shared_dir):
+    assert resolve_shared_input("jobs/audio.mp3") == str(shared_dir / "jobs" / "audio.mp3")
+
+
+@pytest.mark.parametrize("path", [
+    "../secret.txt",
+    "jobs/../../secret.txt",
+    "/etc/passwd",
+    "",
+    ".",
+    "jobs/\x00audio.mp3",
+])
+def test_resolve_rejects_traversal(shared_dir, path):
+    with pytest.raises(HTTPException) as exc_info:
+        resolve_shared_input(path)
+    assert exc_info.value.status_code == 400
+
+
+def test_resolve_rejects_symlink_escape(shared_dir, tmp_path):
+    outside = tmp_path / "outside.mp3"
+    outside.write_bytes(b"secret")
+    os.symlink(outside, shared_dir / "jobs" / "link.mp3")
+
+    with pytest.raises(HTTPException) as exc_info:
+        resolve_shared_input("jobs/link.mp3")
+    assert exc_info.value.status_code == 400
+
+
+def test_resolve_missing_input(shared_dir):
+    with pytest.raises(HTTPException) as exc_info:
+        resolve_shared_input("jobs/missing.mp3")
+    assert exc_info.value.status_code == 404
+
+
+def test_resolve_output(shared_dir):
+    assert resolve_shared_output("jobs/video.mp4", ".mp4") == str(shared_dir / "jobs" / "video.mp4")
+    with pytest.raises(HTTPException):
+        resolve_shared_output("jobs/video.sh", ".mp4")
+    with pytest.raises(HTTPException):
+        resolve_shared_output("missing_dir/video.mp4", ".mp4")
+
+
+def test_shared_mode_disabled():
+    with patch("app.shared.config.SHARED_DIR", None):
+        with pytest.raises(HTTPException) as exc_info:
+            resolve_shared_input("jobs/audio.mp3")
+    assert exc_info.value.status_code == 404
+
+
+def test_publish_file(shared_dir, tmp_path):
+    source = tmp_path / "video.mp4"
+    source.write_bytes(b"video")
+    destination = shared_dir / "jobs" / "video.mp4"
+
+    publish_file(str(source), str(destination))
+
+    assert destination.read_bytes() == b"video"
+    assert not source.exists()
+    assert sorted(os.listdir(shared_dir / "jobs")) == ["audio.mp3", "video.mp4"]
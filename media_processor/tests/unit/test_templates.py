@@ -0,0 +1,121 @@
+# tests/unit/test_templates.py
+import io
+import pytest
+import numpy as np
+from PIL import Image
+from unittest.mock import patch
+
+from app import templates
+from app.templates import (
+    PLAIN_TEMPLATE_ID,
+    VINYL_TEMPLATE_ID,
+    build_vinyl_template,
+    composite_layers,
+    crop_image_to_square,
+    get_cover_frame,
+    clear_frame_cache,
+)
+from tests.conftest import create_dummy_image
+
+
+@pytest.fixture(autouse=True)
+def empty_frame_cache():
+    clear_frame_cache()
+    yield
+    clear_frame_cache()
+
+
+def test_vinyl_template_layers_shapes():
+    template = build_vinyl_template(200)
+    top, left, side = template.cover_box
+
+    assert template.base.shape == (200, 200, 3)
+    assert template.sheen_alpha.shape == (200, 200, 1)
+    assert template.cover_alpha.shape == (side, side, 1)
+    assert template.base.dtype == np.float32
+
+
+def test_vinyl_template_masks():
+    template = build_vinyl_template(200)
+    top, left, side = template.cover_box
+    center = side // 2
+
+    # В центре отверстие — обложка там не видна
+    assert template.cover_alpha[center, center, 0] == 0
+    # Чуть в стороне от центра — обложка видна полностью
+    assert template.cover_alpha[center, center + 20, 0] == 1
+    # Углы квадрата обложки лежат вне круга
+    assert template.cover_alpha[0, 0, 0] == 0
+    # За пределами пластинки блика нет
+    assert template.sheen_alpha[0, 0, 0] == 0
+
+
+def test_composite_layers_places_cover_inside_label():
+    template = build_vinyl_template(200)
+    cover = Image.new("RGB", (300, 150), color=(255, 0, 0))
+
+    frame = composite_layers(cover, template, with_sheen=False)
+
+    top, left, side = template.cover_box
+    label_pixel = frame[top + side // 2, left + side // 2 + 20]
+    corner_pixel = frame[0, 0]
+    assert frame.shape == (200, 200, 3)
+    assert label_pixel[0] == pytest.approx(255, abs=1)
+    assert label_pixel[1] == pytest.approx(0, abs=1)
+    assert tuple(corner_pixel) == templates.VINYL_BACKGROUND
+
+
+def test_get_cover_frame_vinyl_png():
+    cover_bytes = create_dummy_image(width=500, height=300).getvalue()
+
+    frame_png = get_cover_frame(cover_bytes, VINYL_TEMPLATE_ID)
+    img = Image.open(io.BytesIO(frame_png))
+
+    assert img.format == "PNG"
+    assert img.size == (templates.config.FRAME_SIZE, templates.config.FRAME_SIZE)
+
+
+def test_get_cover_frame_plain_crops_to_square():
+    cover_bytes = create_dummy_image(width=400, height=300).getvalue()
+
+    img = Image.open(io.BytesIO(get_cover_frame(cover_bytes, PLAIN_TEMPLATE_ID)))
+
+    assert img.size == (300, 300)
+
+
+@pytest.mark.parametrize("size, expected", [
+    ((200, 100), (100, 100)),
+    ((100, 200), (100, 100)),
+    ((400, 300), (300, 300)),
+    ((1000, 800), (640, 640)),
+])
+def test_crop_image_to_square(size, expected):
+    img = Image.new("RGB", size)
+
+    assert crop_image_to_square(img, max_side=640).size == expected
+
+
+def test_get_cover_frame_uses_cache():
+    cover_bytes = create_dummy_image().getvalue()
+
+    with patch("app.templates._render_frame", wraps=templates._render_frame) as mock_render:
+        first = get_cover_frame(cover_bytes, VINYL_TEMPLATE_ID)
+        second = get_cover_frame(cover_bytes, VINYL_TEMPLATE_ID)
+        get_cover_frame(cover_bytes, PLAIN_TEMPLATE_ID)
+
+    assert first == second
+    # Один раз для vinyl и один раз для cover
+    assert mock_render.call_count == 2
+
+
+def test_get_cover_frame_cache_is_bounded():
+    with patch("app.templates.config.COVER_FRAME_CACHE_SIZE", 2):
+        for color in ("red", "green", "blue"):
+            get_cover_frame(create_dummy_image(color=color).getvalue(), PLAIN_TEMPLATE_ID)
+
+    assert len(templates._frame_cache) == 2
+
+
+def test_get_cover_frame_unknown_template():
+    with pytest.raises(ValueError):
+        get_cover_frame(create_dummy_image().getvalue(), "unknown")
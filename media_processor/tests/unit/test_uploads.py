@@ -0,0 +1,59 @@
+# tests/unit/test_uploads.py
+import os
+import time
+import pytest
+from unittest.mock import patch
+
+from app.uploads import has_cover, load_cover, store_cover
+from app.workspace import WorkspaceQuotaExceeded, job_workspace
+
+
+async def _chunks(*parts):
+    for part in parts:
+        yield part
+
+
+def test_store_and_load_cover(dummy_png_image_bytes):
+    cover_id = store_cover(dummy_png_image_bytes)
+
+    assert len(cover_id) == 40
+    assert has_cover(cover_id)
+    assert load_cover(cover_id) == dummy_png_image_bytes
+    # Повторная загрузка дает тот же идентификатор
+    assert store_cover(dummy_png_image_bytes) == cover_id
+
+
+def test_load_cover_rejects_bad_ids():
+    assert load_cover("0" * 40) is None
+    assert load_cover("../../etc/passwd") is None
+    assert not has_cover("../../etc/passwd")
+
+
+@patch("app.uploads.config.COVER_STORE_MAX_FILES", 2)
+def test_cover_store_evicts_least_recently_used(isolated_cover_store):
+    first = store_cover(b"first")
+    second = store_cover(b"second")
+    old = time.time() - 100
+    os.utime(isolated_cover_store / f"{second}.bin", (old, old))
+
+    third = store_cover(b"third")
+
+    assert has_cover(first)
+    assert not has_cover(second)
+    assert has_cover(third)
+
+
+@pytest.mark.asyncio
+async def test_write_stream(isolated_workspace_root):
+    with job_workspace() as workspace:
+        path = await workspace.write_stream("audio", _chunks(b"ab", b"cd"))
+        with open(path, "rb") as f:
+            assert f.read() == b"abcd"
+
+
+@pytest.mark.asyncio
+@patch("app.workspace.config.WORKSPACE_JOB_QUOTA_BYTES", 3)
+async def test_write_stream_quota(isolated_workspace_root):
+    with job_workspace() as workspace:
+        with pytest.raises(WorkspaceQuotaExceeded):
+            await workspace.write_stream("audio", _chunks(b"ab", b"cd"))
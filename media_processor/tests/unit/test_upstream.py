@@ -0,0 +1,48 @@
+# tests/unit/test_upstream.py
+import os
+import pytest
+
+from app.upstream import UpstreamError, fetch_track_audio, fetch_track_cover
+
+
+@pytest.mark.asyncio
+async def test_fetch_track_audio_is_cached(fake_audio_receiver, isolated_track_cache, dummy_mp3_audio_bytes_5s):
+    first = await fetch_track_audio("1")
+    second = await fetch_track_audio("1")
+
+    assert first == second
+    assert os.path.dirname(first) == str(isolated_track_cache)
+    with open(first, "rb") as f:
+        assert f.read() == dummy_mp3_audio_bytes_5s
+    assert fake_audio_receiver == ["/track/1/stream"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_track_cover(fake_audio_receiver, dummy_png_image_bytes):
+    assert await fetch_track_cover("1") == dummy_png_image_bytes
+    assert await fetch_track_cover("1") == dummy_png_image_bytes
+    assert fake_audio_receiver == ["/track/1/cover"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_missing_track(fake_audio_receiver, isolated_track_cache):
+    with pytest.raises(UpstreamError) as exc_info:
+        await fetch_track_audio("2")
+
+    assert exc_info.value.status_code == 404
+    # Во временных файлах ничего не осталось
+    assert os.listdir(isolated_track_cache) == []
+
+
+@pytest.mark.asyncio
+async def test_track_cache_bounded_by_bytes(fake_audio_receiver, isolated_track_cache, monkeypatch, dummy_mp3_audio_bytes_5s):
+    # В кэш помещается только один трек; старый файл вытесняется
+    monkeypatch.setattr("app.upstream.config.TRACK_CACHE_MAX_BYTES", len(dummy_mp3_audio_bytes_5s))
+    isolated_track_cache.mkdir()
+    old = isolated_track_cache / "0.mp3"
+    old.write_bytes(b"x" * 10)
+    os.utime(old, (1000, 1000))
+
+    await fetch_track_audio("1")
+
+    assert os.listdir(isolated_track_cache) == ["1.mp3"]
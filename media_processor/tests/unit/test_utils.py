@@ -2,6 +2,7 @@
 import pytest
 from fastapi import HTTPException, UploadFile
 import io
+import re
 from unittest.mock import MagicMock, AsyncMock # <--- IMPORT AsyncMock
 
 from app.utils import (
@@ -95,14 +96,16 @@ def test_validate_audio_duration_start_exceeds(dummy_mp3_audio_bytes_5s):
         validate_audio_duration(dummy_mp3_audio_bytes_5s, start=6, end=7)
     assert exc_info.value.status_code == 400
     assert "Параметры start и end не должны превышать длительность аудио" in exc_info.value.detail
-    assert "(5.00 сек)" in exc_info.value.detail
+    # ffprobe читает длительность из контейнера: для mp3 она чуть больше 5 сек
+    assert re.search(r"\(5\.\d\d сек\)", exc_info.value.detail)
 
 def test_validate_audio_duration_end_exceeds(dummy_mp3_audio_bytes_5s):
     with pytest.raises(HTTPException) as exc_info:
         validate_audio_duration(dummy_mp3_audio_bytes_5s, start=1, end=7)
     assert exc_info.value.status_code == 400
     assert "Параметры start и end не должны превышать длительность аудио" in exc_info.value.detail
-    assert "(5.00 сек)" in exc_info.value.detail
+    # ffprobe читает длительность из контейнера: для mp3 она чуть больше 5 сек
+    assert re.search(r"\(5\.\d\d сек\)", exc_info.value.detail)
 
 def test_validate_audio_duration_bad_audio_content(non_audio_bytes):
     with pytest.raises(HTTPException) as exc_info:
@@ -0,0 +1,146 @@
+# tests/unit/test_workspace.py
+import os
+import shutil
+import time
+import pytest
+from unittest.mock import patch
+
+from app import workspace as workspace_module
+from app.metrics import render_metrics
+from app.workspace import WorkspaceQuotaExceeded, job_workspace, reap_stale_workspaces
+
+
+def _make_old(path, age_seconds=7200):
+    old = time.time() - age_seconds
+    os.utime(path, (old, old))
+
+
+def test_job_workspace_is_removed(isolated_workspace_root):
+    with job_workspace() as workspace:
+        path = workspace.write("audio", b"data")
+        assert os.path.exists(path)
+        assert os.path.dirname(path) == workspace.path
+        assert workspace_module._active_usage[workspace.job_id] == 4
+
+    assert not os.path.exists(workspace.path)
+    assert workspace.job_id not in workspace_module._active_usage
+
+
+def test_job_workspace_removed_on_error(isolated_workspace_root):
+    with pytest.raises(RuntimeError):
+        with job_workspace() as workspace:
+            workspace.write("audio", b"data")
+            raise RuntimeError("ffmpeg упал")
+
+    assert os.listdir(isolated_workspace_root) == []
+
+
+def test_link_survives_source_removal(isolated_workspace_root, tmp_path):
+    source = tmp_path / "cached.mp3"
+    source.write_bytes(b"audio")
+
+    with job_workspace() as workspace:
+        path = workspace.link("track.mp3", str(source))
+        os.remove(source)
+        with open(path, "rb") as f:
+            assert f.read() == b"audio"
+
+
+def test_link_falls_back_to_copy(isolated_workspace_root, tmp_path):
+    source = tmp_path / "cached.mp3"
+    source.write_bytes(b"audio")
+
+    with job_workspace() as workspace:
+        with patch("app.workspace.os.link", side_effect=OSError("EXDEV")):
+            path = workspace.link("track.mp3", str(source))
+        with open(path, "rb") as f:
+            assert f.read() == b"audio"
+
+
+@patch("app.workspace.config.WORKSPACE_JOB_QUOTA_BYTES", 10)
+def test_job_quota(isolated_workspace_root):
+    with job_workspace() as workspace:
+        workspace.write("small", b"12345")
+        with pytest.raises(WorkspaceQuotaExceeded):
+            workspace.write("big", b"123456")
+
+
+@patch("app.workspace.config.WORKSPACE_TOTAL_QUOTA_BYTES", 10)
+def test_total_quota(isolated_workspace_root):
+    with job_workspace() as first, job_workspace() as second:
+        first.write("audio", b"1234567")
+        with pytest.raises(WorkspaceQuotaExceeded):
+            second.write("audio", b"1234")
+
+
+@patch("app.workspace.config.WORKSPACE_JOB_QUOTA_BYTES", 10)
+def test_account_detects_external_writes(isolated_workspace_root):
+    with job_workspace() as workspace:
+        # Файл, записанный ffmpeg в обход write()
+        with open(workspace.file("video.mp4"), "wb") as f:
+            f.write(b"x" * 20)
+        with pytest.raises(WorkspaceQuotaExceeded):
+            workspace.account()
+
+
+def test_reaper_removes_stale_job_dirs(isolated_workspace_root, tmp_path):
+    os.makedirs(isolated_workspace_root)
+    stale = isolated_workspace_root / "job_stale"
+    fresh = isolated_workspace_root / "job_fresh"
+    other = isolated_workspace_root / "not_a_job"
+    for path in (stale, fresh, other):
+        path.mkdir()
+    (stale / "video.mp4").write_bytes(b"video")
+    _make_old(stale)
+    _make_old(other)
+
+    legacy_dir = tmp_path / "legacy"
+    legacy_dir.mkdir()
+    legacy_file = legacy_dir / "tmp_video_123.mp4"
+    legacy_file.write_bytes(b"video")
+    _make_old(legacy_file)
+
+    with patch("app.workspace.tempfile.gettempdir", return_value=str(legacy_dir)):
+        removed = reap_stale_workspaces(max_age_seconds=3600)
+
+    assert removed == 2
+    assert sorted(os.listdir(isolated_workspace_root)) == ["job_fresh", "not_a_job"]
+    assert not legacy_file.exists()
+
+
+def test_reaper_skips_active_workspaces(isolated_workspace_root):
+    with job_workspace() as workspace:
+        _make_old(workspace.path)
+        reap_stale_workspaces(max_age_seconds=0)
+        assert os.path.exists(workspace.path)
+
+
+def test_workspace_metrics(isolated_workspace_root):
+    with job_workspace() as workspace:
+        workspace.write("audio", b"data")
+        metrics = render_metrics()
+
+    assert "media_workspace_active_jobs 1" in metrics
+    assert "media_workspace_used_bytes 4" in metrics
+    assert "media_workspace_disk_free_bytes" in metrics
+
+
+def test_default_root_uses_large_tmpfs():
+    from app import config
+
+    usage = shutil._ntuple_diskusage(2 * 1024 ** 3, 0, 2 * 1024 ** 3)
+    with patch("app.config.os.path.isdir", return_value=True), \
+            patch("app.config.os.access", return_value=True), \
+            patch("app.config.shutil.disk_usage", return_value=usage):
+        assert config._default_workspace_root() == "/dev/shm/media_processor"
+
+
+def test_default_root_skips_small_tmpfs():
+    """64 МБ /dev/shm (Docker без shm_size) не вмещает квоты: каталоги на диске."""
+    from app import config
+
+    usage = shutil._ntuple_diskusage(64 * 1024 ** 2, 0, 64 * 1024 ** 2)
+    with patch("app.config.os.path.isdir", return_value=True), \
+            patch("app.config.os.access", return_value=True), \
+            patch("app.config.shutil.disk_usage", return_value=usage):
+        assert not config._default_workspace_root().startswith("/dev/shm")
@@ -0,0 +1,24 @@
+import asyncio
+import signal
+
+from app.animation import get_rotation_tables
+from app.templates import load_templates
+from app.worker import run_worker
+
+
+async def main():
+    # Маски и слои шаблонов считаются один раз, как и в API
+    load_templates()
+    get_rotation_tables()
+
+    # По SIGTERM воркер перестает брать новые задачи и дожидается текущих;
+    # если его все же убьют, задачи заберут другие воркеры после истечения аренды
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, stop.set)
+    await run_worker(stop)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
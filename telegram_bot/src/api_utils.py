@@ -1,5 +1,6 @@
 import os
 import logging
+import shutil
 import httpx
 from typing import NamedTuple
 import traceback
@@ -257,3 +258,120 @@ async def create_video(
             f"[{type(e).__name__}] Ошибка при обращении к API: {repr(e)}")
         logger.error(traceback.format_exc())
         return False
+
+
+async def create_video_by_reference(
+        track_id: str,
+        start: int,
+        end: int,
+        output_path: str
+) -> bool:
+    """
+    Создает видео по track_id: media_processor сам забирает аудио
+    и обложку из audio_receiver, бот передает только JSON
+    и получает готовое видео.
+
+    Args:
+        track_id (str): Идентификатор трека в audio_receiver.
+        start (int): Время начала отрезка в секундах.
+        end (int): Время окончания отрезка в секундах.
+        output_path (str): Путь для сохранения созданного видео.
+
+    Returns:
+        bool: True, если успешно, иначе False.
+    """
+
+    url = f'{conf.MEDIA_PROCESSOR_API_URL}/create_video/by_reference'
+
+    timeout_config = httpx.Timeout(120.0, connect=10.0)
+    payload = {'track_id': track_id, 'start': start, 'end': end}
+
+    try:
+        async with httpx.AsyncClient() as client:
+            async with client.stream(
+                'POST', url, json=payload, timeout=timeout_config
+            ) as response:
+                response.raise_for_status()
+
+                with open(output_path, 'wb') as output_file:
+                    async for chunk in response.aiter_bytes():
+                        output_file.write(chunk)
+
+        return True
+
+    except Exception as e:
+        logger.error(
+            f"[{type(e).__name__}] Ошибка при создании видео по track_id: "
+            f"{repr(e)}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return False
+
+
+def _to_shared_relative_path(path: str) -> str:
+    """
+    Путь относительно общего каталога. Файл вне каталога
+    (например, обложка по умолчанию) сначала копируется в него.
+    """
+    assert conf.SHARED_DIR is not None
+
+    relative_path = os.path.relpath(path, conf.SHARED_DIR)
+    if relative_path.startswith(os.pardir):
+        shared_copy = os.path.join(conf.SHARED_DIR, os.path.basename(path))
+        if not os.path.exists(shared_copy):
+            shutil.copyfile(path, shared_copy)
+        relative_path = os.path.basename(path)
+    return relative_path
+
+
+async def create_video_shared(
+        audio_path: str,
+        image_path: str,
+        start: int,
+        end: int,
+        output_path: str
+) -> bool:
+    """
+    Создает видео через общий каталог: media_processor читает аудио
+    и обложку и записывает видео в output_path сам, по HTTP передаются
+    только относительные пути.
+
+    Args:
+        audio_path (str): Путь к исходному аудиофайлу в общем каталоге.
+        image_path (str): Путь к изображению (обложка).
+        start (int): Время начала отрезка в секундах.
+        end (int): Время окончания отрезка в секундах.
+        output_path (str): Путь для видео в общем каталоге.
+
+    Returns:
+        bool: True, если успешно, иначе False.
+    """
+
+    url = f'{conf.MEDIA_PROCESSOR_API_URL}/create_video/shared'
+
+    timeout_config = httpx.Timeout(120.0, connect=10.0)
+
+    try:
+        payload = {
+            'audio_path': _to_shared_relative_path(audio_path),
+            'cover_path': _to_shared_relative_path(image_path),
+            'output_path': _to_shared_relative_path(output_path),
+            'start': start,
+            'end': end,
+        }
+
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                url,
+                json=payload,
+                timeout=timeout_config
+            )
+            response.raise_for_status()
+
+        return True
+
+    except Exception as e:
+        logger.error(
+            f"[{type(e).__name__}] Ошибка при создании видео "
+            f"через общий каталог: {repr(e)}")
+        return False
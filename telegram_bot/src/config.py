@@ -29,3 +29,8 @@ DATABASE_API_URL = os.getenv('DATABASE_API_URL')
 if not DATABASE_API_URL:
     raise ValueError('Необходимо установить переменную окружения '
                      'DATABASE_API_URL (URL для доступа к API)')
+
+# Общий с media_processor каталог (необязательно). Если задан, файлы не
+# передаются по HTTP: в запросе указываются пути относительно этого каталога,
+# поэтому DOWNLOAD_FOLDER должен находиться внутри него
+SHARED_DIR = os.getenv('SHARED_DIR')
@@ -1,7 +1,7 @@
 import logging
 import os
 
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.error import BadRequest, TelegramError
 from telegram.ext import (
     ContextTypes,
@@ -486,44 +486,19 @@ async def back_to_menu(
 
 
 # CHOOSING_OPTIONS
-async def create_video_message(
-        update: Update,
-        context: ContextTypes.DEFAULT_TYPE
-) -> int:
+async def create_video_from_files(
+        query: CallbackQuery,
+        user_data: dict,
+        track_id: str,
+        output_video_file_path: str,
+        processing_message: str
+) -> bool:
     """
-    Создает видео сообщение из ранее полученных данных.
+    Создает видео, прогоняя файлы через бота: скачивает трек,
+    обрезает его, скачивает обложку и отправляет всё в media_processor.
+    В режиме общего каталога (SHARED_DIR) media_processor получает только
+    пути к файлам и сам вырезает отрезок.
     """
-    assert update.callback_query is not None
-    assert update.effective_chat is not None
-    assert context.user_data is not None
-    assert conf.DOWNLOAD_FOLDER is not None
-
-    query = update.callback_query
-    await query.answer()
-
-    user = update.callback_query.from_user
-    await db_utils.log_interaction(
-        user_id=user.id,
-        username=user.username,
-        interaction_type='Создание видео'
-    )
-
-    video_note_processing_message = (
-        'Хорошо, создаю кружок...\n'
-        '⚙️'
-    )
-    await query.edit_message_text(
-        text=video_note_processing_message
-    )
-
-    bot = context.bot
-    chat_id = update.effective_chat.id
-    user_data = context.user_data
-
-    track_id = user_data[st.TRACK_ID]
-
-    ERROR_MESSAGE_TO_USER = 'Ошибка, при создании кружка 😢'
-
     # MP3 FILE DOWNLOADING.
 
     assert conf.DOWNLOAD_FOLDER is not None
@@ -537,42 +512,43 @@ async def create_video_message(
 
     logger.info(f'Файл загружен: {file_path}')
 
-    video_note_processing_message += '⚙️'
+    processing_message += '⚙️'
     await query.edit_message_text(
-        text=video_note_processing_message
+        text=processing_message
     )
 
     # AUDIO TRIMMING.
 
-    output_audio_file_path = f'{conf.DOWNLOAD_FOLDER}/trimmed_{track_id}.mp3'
-
-    logger.info(
-        'Prepairing for trimming audio: '
-        f'{user_data[st.TRACK_FILE_PATH]=} '
-        f'{int(user_data[st.DURATION_LEFT_BORDER])=} '
-        f'{int(user_data[st.DURATION_RIGHT_BORDER])=} '
-        f'{output_audio_file_path=}'
-    )
-
-    is_audio_trimmed = await api_utils.trim_audio(
-        file_path=user_data[st.TRACK_FILE_PATH],
-        start=int(user_data[st.DURATION_LEFT_BORDER]),
-        end=int(user_data[st.DURATION_RIGHT_BORDER]),
-        output_path=output_audio_file_path
-    )
-
-    if not is_audio_trimmed:
-        logger.warning(
-            'Не удалось обрезать аудио.'
+    if conf.SHARED_DIR:
+        # В режиме общего каталога отрезок вырезается при создании видео.
+        output_audio_file_path = user_data[st.TRACK_FILE_PATH]
+    else:
+        output_audio_file_path = f'{conf.DOWNLOAD_FOLDER}/trimmed_{track_id}.mp3'
+
+        logger.info(
+            'Prepairing for trimming audio: '
+            f'{user_data[st.TRACK_FILE_PATH]=} '
+            f'{int(user_data[st.DURATION_LEFT_BORDER])=} '
+            f'{int(user_data[st.DURATION_RIGHT_BORDER])=} '
+            f'{output_audio_file_path=}'
         )
-        await query.edit_message_text(
-            text=ERROR_MESSAGE_TO_USER
+
+        is_audio_trimmed = await api_utils.trim_audio(
+            file_path=user_data[st.TRACK_FILE_PATH],
+            start=int(user_data[st.DURATION_LEFT_BORDER]),
+            end=int(user_data[st.DURATION_RIGHT_BORDER]),
+            output_path=output_audio_file_path
         )
-        return ConversationHandler.END
 
-    video_note_processing_message += '⚙️'
+        if not is_audio_trimmed:
+            logger.warning(
+                'Не удалось обрезать аудио.'
+            )
+            return False
+
+    processing_message += '⚙️'
     await query.edit_message_text(
-        text=video_note_processing_message
+        text=processing_message
     )
 
     # COVER DOWNLOADING.
@@ -589,15 +565,13 @@ async def create_video_message(
         )
         cover_file_path = 'video_note_images/vinyl_default.jpg'
 
-    video_note_processing_message += '⚙️'
+    processing_message += '⚙️'
     await query.edit_message_text(
-        text=video_note_processing_message
+        text=processing_message
     )
 
     # VIDEO CREATION.
 
-    output_video_file_path = f'{conf.DOWNLOAD_FOLDER}/video_{track_id}.mp4'
-
     logger.info(
         'Prepairing for trimming audio: '
         f'{output_video_file_path=} '
@@ -605,14 +579,92 @@ async def create_video_message(
         f'{output_audio_file_path=}'
     )
 
-    is_video_created = await api_utils.create_video(
-        audio_path=output_audio_file_path,
-        image_path=cover_file_path,
-        output_path=output_video_file_path
-    )
+    if conf.SHARED_DIR:
+        is_video_created = await api_utils.create_video_shared(
+            audio_path=output_audio_file_path,
+            image_path=cover_file_path,
+            start=int(user_data[st.DURATION_LEFT_BORDER]),
+            end=int(user_data[st.DURATION_RIGHT_BORDER]),
+            output_path=output_video_file_path
+        )
+    else:
+        is_video_created = await api_utils.create_video(
+            audio_path=output_audio_file_path,
+            image_path=cover_file_path,
+            output_path=output_video_file_path
+        )
 
     logger.info(f'Список файлов: {os.listdir(path=conf.DOWNLOAD_FOLDER)}')
 
+    return is_video_created
+
+
+# CHOOSING_OPTIONS
+async def create_video_message(
+        update: Update,
+        context: ContextTypes.DEFAULT_TYPE
+) -> int:
+    """
+    Создает видео сообщение из ранее полученных данных.
+    """
+    assert update.callback_query is not None
+    assert update.effective_chat is not None
+    assert context.user_data is not None
+    assert conf.DOWNLOAD_FOLDER is not None
+
+    query = update.callback_query
+    await query.answer()
+
+    user = update.callback_query.from_user
+    await db_utils.log_interaction(
+        user_id=user.id,
+        username=user.username,
+        interaction_type='Создание видео'
+    )
+
+    video_note_processing_message = (
+        'Хорошо, создаю кружок...\n'
+        '⚙️'
+    )
+    await query.edit_message_text(
+        text=video_note_processing_message
+    )
+
+    bot = context.bot
+    chat_id = update.effective_chat.id
+    user_data = context.user_data
+
+    track_id = user_data[st.TRACK_ID]
+
+    ERROR_MESSAGE_TO_USER = 'Ошибка, при создании кружка 😢'
+
+    output_video_file_path = f'{conf.DOWNLOAD_FOLDER}/video_{track_id}.mp4'
+
+    is_video_created = False
+    if not user_data.get(st.TRACK_FILE_PATH):
+        # Трек из audio_receiver: media_processor сам забирает аудио
+        # и обложку, бот только получает готовое видео.
+        is_video_created = await api_utils.create_video_by_reference(
+            track_id=track_id,
+            start=int(user_data[st.DURATION_LEFT_BORDER]),
+            end=int(user_data[st.DURATION_RIGHT_BORDER]),
+            output_path=output_video_file_path
+        )
+        if not is_video_created:
+            logger.warning(
+                'Не удалось создать видео по track_id, '
+                'пробую через загрузку файлов.'
+            )
+
+    if not is_video_created:
+        is_video_created = await create_video_from_files(
+            query=query,
+            user_data=user_data,
+            track_id=track_id,
+            output_video_file_path=output_video_file_path,
+            processing_message=video_note_processing_message
+        )
+
     if not is_video_created:
         logger.error('Ошибка при создании видео-кружка.')
         await query.edit_message_text(
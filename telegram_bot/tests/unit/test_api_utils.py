@@ -12,6 +12,8 @@ from src.api_utils import (
     download_cover,
     trim_audio,
     create_video,
+    create_video_by_reference,
+    create_video_shared,
 )
 
 
@@ -331,6 +333,116 @@ class TestCreateVideo:
             assert result is False
 
 
+class TestCreateVideoByReference:
+
+    @patch("src.api_utils.httpx.AsyncClient")
+    async def test_success(self, mock_client_cls):
+        """Видео по track_id сохраняется потоком в файл."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, "video.mp4")
+
+            mock_resp = AsyncMock()
+            mock_resp.raise_for_status = MagicMock()
+
+            async def fake_aiter_bytes():
+                yield b"fake_"
+                yield b"video"
+
+            mock_resp.aiter_bytes = fake_aiter_bytes
+
+            mock_client = AsyncMock()
+            mock_client.stream = MagicMock(return_value=AsyncMock(
+                __aenter__=AsyncMock(return_value=mock_resp),
+                __aexit__=AsyncMock(return_value=False),
+            ))
+            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+            mock_client.__aexit__ = AsyncMock(return_value=False)
+            mock_client_cls.return_value = mock_client
+
+            result = await create_video_by_reference("123", 10, 70, output_path)
+            assert result is True
+            with open(output_path, "rb") as f:
+                assert f.read() == b"fake_video"
+
+            call_kwargs = mock_client.stream.call_args[1]
+            assert call_kwargs["json"] == {"track_id": "123", "start": 10, "end": 70}
+
+    @patch("src.api_utils.httpx.AsyncClient")
+    async def test_error_returns_false(self, mock_client_cls):
+        """Ошибка возвращает False и не оставляет частичный файл."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, "video.mp4")
+
+            mock_client = AsyncMock()
+            mock_client.stream = MagicMock(side_effect=httpx.ConnectError("Error"))
+            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+            mock_client.__aexit__ = AsyncMock(return_value=False)
+            mock_client_cls.return_value = mock_client
+
+            result = await create_video_by_reference("123", 10, 70, output_path)
+            assert result is False
+            assert not os.path.exists(output_path)
+
+
+class TestCreateVideoShared:
+
+    @patch("src.api_utils.httpx.AsyncClient")
+    async def test_success_sends_relative_paths(self, mock_client_cls):
+        """В запросе только пути относительно общего каталога."""
+        with tempfile.TemporaryDirectory() as shared_dir, \
+                tempfile.TemporaryDirectory() as other_dir:
+            os.makedirs(os.path.join(shared_dir, "downloads"))
+            audio_path = os.path.join(shared_dir, "downloads", "1.mp3")
+            output_path = os.path.join(shared_dir, "downloads", "video_1.mp4")
+            # Обложка по умолчанию лежит вне общего каталога
+            default_cover = os.path.join(other_dir, "vinyl_default.jpg")
+            with open(default_cover, "wb") as f:
+                f.write(b"fake_image")
+
+            mock_response = MagicMock()
+            mock_response.raise_for_status = MagicMock()
+
+            mock_client = AsyncMock()
+            mock_client.post = AsyncMock(return_value=mock_response)
+            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+            mock_client.__aexit__ = AsyncMock(return_value=False)
+            mock_client_cls.return_value = mock_client
+
+            with patch("src.config.SHARED_DIR", shared_dir):
+                result = await create_video_shared(
+                    audio_path, default_cover, 10, 70, output_path
+                )
+
+            assert result is True
+            assert mock_client.post.call_args[1]["json"] == {
+                "audio_path": os.path.join("downloads", "1.mp3"),
+                "cover_path": "vinyl_default.jpg",
+                "output_path": os.path.join("downloads", "video_1.mp4"),
+                "start": 10,
+                "end": 70,
+            }
+            assert os.path.exists(os.path.join(shared_dir, "vinyl_default.jpg"))
+
+    @patch("src.api_utils.httpx.AsyncClient")
+    async def test_error_returns_false(self, mock_client_cls):
+        """Ошибка возвращает False."""
+        with tempfile.TemporaryDirectory() as shared_dir:
+            mock_client = AsyncMock()
+            mock_client.post = AsyncMock(side_effect=Exception("Error"))
+            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
+            mock_client.__aexit__ = AsyncMock(return_value=False)
+            mock_client_cls.return_value = mock_client
+
+            with patch("src.config.SHARED_DIR", shared_dir):
+                result = await create_video_shared(
+                    os.path.join(shared_dir, "1.mp3"),
+                    os.path.join(shared_dir, "1.jpg"),
+                    10, 70,
+                    os.path.join(shared_dir, "video_1.mp4")
+                )
+            assert result is False
+
+
 class TestTrackInfoNamedTuple:
 
     def test_create_track_info(self):
@@ -456,6 +456,7 @@ class TestCreateVideoIntegration:
     """Интеграционные тесты для создания видео."""
 
     @pytest.mark.asyncio
+    @patch('src.api_utils.create_video_by_reference', return_value=False)
     @patch('src.api_utils.download_track_stream')
     @patch('src.api_utils.trim_audio')
     @patch('src.api_utils.download_cover')
@@ -476,10 +477,11 @@ class TestCreateVideoIntegration:
         mock_download_cover,
         mock_trim_audio,
         mock_download_stream,
+        mock_by_reference,
         mock_update_with_callback,
         mock_context
     ):
-        """Тест успешного создания видео-кружка."""
+        """Тест создания видео-кружка через загрузку файлов, если по track_id не вышло."""
 
         mock_download_stream.return_value = "/tmp/test_track.mp3"
         mock_trim_audio.return_value = True
@@ -518,6 +520,7 @@ class TestCreateVideoIntegration:
         context.bot.send_video_note.assert_called_once()
 
     @pytest.mark.asyncio
+    @patch('src.api_utils.create_video_by_reference', return_value=False)
     @patch('src.api_utils.download_track_stream')
     @patch('src.api_utils.trim_audio')
     @patch('os.remove')
@@ -526,6 +529,7 @@ class TestCreateVideoIntegration:
         mock_remove,
         mock_trim_audio,
         mock_download_stream,
+        mock_by_reference,
         mock_update_with_callback,
         mock_context
     ):
@@ -554,6 +558,7 @@ class TestCreateVideoIntegration:
             assert "Ошибка, при создании кружка" in call_args[1]['text']
 
     @pytest.mark.asyncio
+    @patch('src.api_utils.create_video_by_reference', return_value=False)
     @patch('src.api_utils.download_track_stream')
     @patch('src.api_utils.trim_audio')
     @patch('src.api_utils.download_cover')
@@ -570,6 +575,7 @@ class TestCreateVideoIntegration:
         mock_download_cover,
         mock_trim_audio,
         mock_download_stream,
+        mock_by_reference,
         mock_update_with_callback,
         mock_context
     ):
@@ -600,3 +606,94 @@ class TestCreateVideoIntegration:
             assert "Ошибка, при создании кружка" in call_args[0][0]
         elif call_args[1].get('text'):
             assert "Ошибка, при создании кружка" in call_args[1]['text']
+
+    @pytest.mark.asyncio
+    @patch('src.api_utils.create_video_by_reference', return_value=True)
+    @patch('src.api_utils.download_track_stream')
+    @patch('builtins.open')
+    @patch('os.path.exists')
+    @patch('os.listdir')
+    async def test_create_video_message_by_reference(
+        self,
+        mock_listdir,
+        mock_exists,
+        mock_open,
+        mock_download_stream,
+        mock_by_reference,
+        mock_update_with_callback,
+        mock_context
+    ):
+        """Трек из поиска: видео создается по track_id, файлы через бота не идут."""
+
+        mock_exists.return_value = True
+        mock_listdir.return_value = ["video_test_track.mp4"]
+
+        update = mock_update_with_callback
+        context = mock_context
+        context.user_data[st.TRACK_ID] = "test_track"
+        context.user_data[st.DURATION_LEFT_BORDER] = "10"
+        context.user_data[st.DURATION_RIGHT_BORDER] = "70"
+
+        result = await handlers.create_video_message(update, context)
+
+        from telegram.ext import ConversationHandler
+        assert result == ConversationHandler.END
+
+        mock_by_reference.assert_called_once_with(
+            track_id="test_track",
+            start=10,
+            end=70,
+            output_path=f'{conf.DOWNLOAD_FOLDER}/video_test_track.mp4'
+        )
+        mock_download_stream.assert_not_called()
+        context.bot.send_video_note.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch('src.config.SHARED_DIR', '/tmp')
+    @patch('src.api_utils.create_video_by_reference', return_value=False)
+    @patch('src.api_utils.download_track_stream')
+    @patch('src.api_utils.trim_audio')
+    @patch('src.api_utils.download_cover')
+    @patch('src.api_utils.create_video_shared', return_value=True)
+    @patch('builtins.open')
+    @patch('os.path.exists')
+    @patch('os.listdir')
+    @patch('os.remove')
+    async def test_create_video_message_shared_dir(
+        self,
+        mock_remove,
+        mock_listdir,
+        mock_exists,
+        mock_open,
+        mock_create_video_shared,
+        mock_download_cover,
+        mock_trim_audio,
+        mock_download_stream,
+        mock_by_reference,
+        mock_update_with_callback,
+        mock_context
+    ):
+        """В режиме общего каталога аудио не обрезается отдельным запросом."""
+
+        mock_download_stream.return_value = "/tmp/test_downloads/test_track.mp3"
+        mock_download_cover.return_value = "/tmp/test_downloads/test_track.jpg"
+        mock_exists.return_value = True
+        mock_listdir.return_value = ["video_test_track.mp4"]
+
+        update = mock_update_with_callback
+        context = mock_context
+        context.user_data[st.TRACK_ID] = "test_track"
+        context.user_data[st.DURATION_LEFT_BORDER] = "10"
+        context.user_data[st.DURATION_RIGHT_BORDER] = "70"
+
+        await handlers.create_video_message(update, context)
+
+        mock_trim_audio.assert_not_called()
+        mock_create_video_shared.assert_called_once_with(
+            audio_path="/tmp/test_downloads/test_track.mp3",
+            image_path="/tmp/test_downloads/test_track.jpg",
+            start=10,
+            end=70,
+            output_path='/tmp/test_downloads/video_test_track.mp4'
+        )
+        context.bot.send_video_note.assert_called_once()